@@ -0,0 +1,143 @@
+import re
+import threading
+import unicodedata
+
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+from libraries.utils import env
+from libraries.utils.orchestrator import iter_data_from_db
+
+# Active house numbers (status 3) with their WGS84 access point, one row per address text and postcode.
+DAR_ADDRESS_QUERY = """
+    SELECT hn.id AS husnummer_id,
+           split_part(hn.adgangsadressebetegnelse, ',', 1) AS adresse,
+           pn.postnr::bigint AS postnr,
+           apunkt.longitude,
+           apunkt.latitude
+      FROM datafordeler.dar_husnummer hn
+      JOIN datafordeler.dar_adressepunkt apunkt ON apunkt.id = hn.adgangspunkt_id
+      JOIN datafordeler.dar_postnummer pn ON pn.id = hn.postnummer_id
+     WHERE hn.status = '3'
+     ORDER BY hn.id
+"""
+
+_SEPARATORS = re.compile(r"[\s.,;:/]+")
+
+
+def normalize_address(address):
+    # Case, accents in composed form, punctuation and spacing are ignored; Danish letters are kept.
+    if not isinstance(address, str):
+        return ""
+    address = unicodedata.normalize("NFKC", address).casefold()
+    return _SEPARATORS.sub(" ", address).strip()
+
+
+def street_part(address):
+    # Station addresses carry house number ranges ("Vesterbrogade 1-3"); the first number is the address point.
+    return address.split("-", 1)[0] if isinstance(address, str) else address
+
+
+def trigrams(text):
+    # pg_trgm style: every word padded with two leading and one trailing space.
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _postcode(zipcode):
+    try:
+        return int(str(zipcode).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+class AddressGeocoder:
+    # Exact lookups hit a dict keyed by (postcode, normalized address); misses fall back to trigram
+    # similarity among the addresses of the same postcode. Trigram indexes are built per postcode on
+    # the first miss there, so a full DAR load only pays for the postcodes that actually need them.
+
+    def __init__(self, rows, min_similarity=0.5, cache_size=100_000):
+        self.min_similarity = min_similarity
+        self._exact = {}
+        self._entries = []
+        self._positions_by_postcode = defaultdict(list)
+        self._trigram_indexes = {}
+        self._index_lock = threading.Lock()
+        # Rows are expected in husnummer id order; the first row wins for duplicate address texts.
+        for row in rows:
+            postnr = _postcode(row["postnr"])
+            normalized = normalize_address(row["adresse"])
+            if postnr is None or not normalized or (postnr, normalized) in self._exact:
+                continue
+            entry = {
+                "husnummer_id": row["husnummer_id"],
+                "adresse": row["adresse"],
+                "postnr": postnr,
+                "longitude": row["longitude"],
+                "latitude": row["latitude"],
+            }
+            self._exact[(postnr, normalized)] = entry
+            self._positions_by_postcode[postnr].append(len(self._entries))
+            self._entries.append((entry, normalized))
+        self._cached_lookup = lru_cache(maxsize=cache_size)(self._lookup)
+
+    @classmethod
+    def from_database(cls, db_name=env.POSTGRES_DB, **kwargs):
+        # Streamed, so only the index (not the raw result set) is held in memory.
+        rows = (row for batch in iter_data_from_db(db_name=db_name, sql_query=DAR_ADDRESS_QUERY) for row in batch)
+        return cls(rows, **kwargs)
+
+    def __len__(self):
+        return len(self._exact)
+
+    def geocode(self, address, zipcode):
+        # Returns a copy of the matched address with "match" ("exact" or "fuzzy") and "similarity", or None.
+        result = self._cached_lookup(normalize_address(street_part(address)), _postcode(zipcode))
+        return dict(result) if result is not None else None
+
+    def geocode_many(self, addresses):
+        return [self.geocode(address, zipcode) for address, zipcode in addresses]
+
+    def cache_info(self):
+        return self._cached_lookup.cache_info()
+
+    def _lookup(self, normalized, postnr):
+        if not normalized or postnr is None:
+            return None
+        entry = self._exact.get((postnr, normalized))
+        if entry is not None:
+            return {**entry, "match": "exact", "similarity": 1.0}
+        return self._fuzzy(normalized, postnr)
+
+    def _trigram_index(self, postnr):
+        with self._index_lock:
+            if postnr not in self._trigram_indexes:
+                index, gram_counts = defaultdict(list), {}
+                for position in self._positions_by_postcode.get(postnr, ()):
+                    grams = trigrams(self._entries[position][1])
+                    gram_counts[position] = len(grams)
+                    for gram in grams:
+                        index[gram].append(position)
+                self._trigram_indexes[postnr] = (index, gram_counts)
+            return self._trigram_indexes[postnr]
+
+    def _fuzzy(self, normalized, postnr):
+        index, gram_counts = self._trigram_index(postnr)
+        query = trigrams(normalized)
+        if not index or not query:
+            return None
+        shared = Counter()
+        for gram in query:
+            shared.update(index.get(gram, ()))
+        best_position, best_similarity = None, 0.0
+        for position, count in shared.items():
+            similarity = count / (len(query) + gram_counts[position] - count)
+            # Ties go to the earliest row (lowest husnummer id), so results do not depend on set iteration order.
+            if similarity > best_similarity or (similarity == best_similarity and position < best_position):
+                best_position, best_similarity = position, similarity
+        if best_position is None or best_similarity < self.min_similarity:
+            return None
+        return {**self._entries[best_position][0], "match": "fuzzy", "similarity": round(best_similarity, 3)}
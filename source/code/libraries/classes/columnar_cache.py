@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from libraries.classes.row_batch import RowBatch
+
+_FORMAT_VERSION = 1
+_META_FILE = "meta.json"
+
+
+def _column_kind(values):
+    value_types = set(map(type, values)) - {type(None)}
+    if not value_types:
+        return "null"
+    if value_types == {str}:
+        return "str"
+    if value_types == {bool}:
+        return "bool"
+    if value_types == {float}:
+        return "float"
+    if value_types == {int} and all(-2**63 <= value < 2**63 for value in values if value is not None):
+        return "int"
+    # Mixed types, dicts and lists keep their exact Python values through a JSON round trip.
+    return "json"
+
+
+def _encode_column(values):
+    kind = _column_kind(values)
+    if kind == "null":
+        return kind, {}
+    if kind == "json":
+        # One JSON array per column, so reading it back is a single decode.
+        return kind, {"data": np.frombuffer(json.dumps(values).encode("utf-8"), dtype=np.uint8)}
+    nulls = np.fromiter((value is None for value in values), dtype=bool, count=len(values))
+    if kind == "str":
+        texts = ["" if value is None else value for value in values]
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, texts), dtype=np.int64, count=len(texts)), out=offsets[1:])
+        data = np.frombuffer("".join(texts).encode("utf-8"), dtype=np.uint8)
+        return kind, {"data": data, "offsets": offsets, "nulls": nulls}
+    dtype = {"bool": bool, "float": np.float64, "int": np.int64}[kind]
+    filler = {"bool": False, "float": 0.0, "int": 0}[kind]
+    data = np.array([filler if value is None else value for value in values], dtype=dtype)
+    return kind, {"data": data, "nulls": nulls}
+
+
+def _decode_column(kind, arrays, length):
+    if kind == "null":
+        return [None] * length
+    if kind == "json":
+        return json.loads(arrays["data"].tobytes().decode("utf-8"))
+    if kind == "str":
+        # Offsets count characters, so the blob is decoded once and sliced.
+        text = arrays["data"].tobytes().decode("utf-8")
+        bounds = arrays["offsets"].tolist()
+        values = [text[start:end] for start, end in zip(bounds, bounds[1:])]
+    else:
+        values = arrays["data"].tolist()
+    for index in np.flatnonzero(arrays["nulls"]).tolist():
+        values[index] = None
+    return values
+
+
+def _projection_digest(projection):
+    encoded = json.dumps([_FORMAT_VERSION, list(projection.items())], ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:12]
+
+
+class ColumnarCache:
+    # Projected columns of one source file, stored as uncompressed .npz parts without pickled objects.
+    # Entries live in <cache_dir>/<source name>/<projection digest>-<source digest>/.
+
+    def __init__(self, cache_dir, source_name, source_digest, projection):
+        projection_digest = _projection_digest(projection)
+        self.source_dir = os.path.join(os.fspath(cache_dir), source_name)
+        self.projection_digest = projection_digest
+        self.entry_dir = os.path.join(self.source_dir, f"{projection_digest}-{source_digest}")
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.entry_dir, _META_FILE))
+
+    def read(self):
+        with open(os.path.join(self.entry_dir, _META_FILE), "r", encoding="utf-8") as file:
+            meta = json.load(file)
+        for part in meta["parts"]:
+            with np.load(os.path.join(self.entry_dir, part["file"]), allow_pickle=False) as arrays:
+                columns = {}
+                for index, (name, kind) in enumerate(zip(meta["columns"], part["kinds"])):
+                    prefix = f"c{index}_"
+                    column_arrays = {key[len(prefix):]: arrays[key] for key in arrays.files if key.startswith(prefix)}
+                    columns[name] = _decode_column(kind, column_arrays, part["rows"])
+            yield RowBatch(columns, length=part["rows"])
+
+    def write(self, batches):
+        # Passes batches through while writing them; the entry only becomes visible once the input is exhausted.
+        temp_dir = f"{self.entry_dir}.tmp-{os.getpid()}"
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        os.makedirs(temp_dir)
+        meta = {"format": _FORMAT_VERSION, "columns": None, "parts": []}
+        try:
+            for batch in batches:
+                if meta["columns"] is None:
+                    meta["columns"] = batch.keys()
+                kinds, arrays = [], {}
+                for index, name in enumerate(meta["columns"]):
+                    kind, column_arrays = _encode_column(batch.column(name))
+                    kinds.append(kind)
+                    arrays.update({f"c{index}_{key}": value for key, value in column_arrays.items()})
+                file_name = f"part-{len(meta['parts']):05d}.npz"
+                np.savez(os.path.join(temp_dir, file_name), **arrays)
+                meta["parts"].append({"file": file_name, "rows": len(batch), "kinds": kinds})
+                yield batch
+            meta["columns"] = meta["columns"] or []
+            with open(os.path.join(temp_dir, _META_FILE), "w", encoding="utf-8") as file:
+                json.dump(meta, file, indent=2)
+                file.write("\n")
+            shutil.rmtree(self.entry_dir, ignore_errors=True)
+            os.replace(temp_dir, self.entry_dir)
+            self._prune()
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _prune(self):
+        # Older entries for the same projection belong to previous versions of the source file.
+        for name in os.listdir(self.source_dir):
+            path = os.path.join(self.source_dir, name)
+            if name.startswith(f"{self.projection_digest}-") and ".tmp-" not in name and path != self.entry_dir:
+                shutil.rmtree(path, ignore_errors=True)
@@ -1,20 +1,117 @@
-from sqlalchemy import create_engine
+import threading
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
+
+from libraries.classes.reflection_cache import ReflectionCache
+
+POOL_SETTINGS = ("pool_size", "max_overflow", "pool_timeout", "pool_recycle", "pool_pre_ping")
+
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.max_overflow_in_use = 0
+
+    def record_wait(self, seconds, overflow):
+        with self._lock:
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+            self.max_overflow_in_use = max(self.max_overflow_in_use, overflow)
+
+    def increment(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "wait_seconds": round(self.wait_seconds, 6),
+                "max_wait_seconds": round(self.max_wait_seconds, 6),
+                "max_overflow_in_use": self.max_overflow_in_use,
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    # Times how long callers block waiting for a pooled connection.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.stats.record_wait(time.perf_counter() - started, max(self.overflow(), 0))
+
 
 class DatabaseEngine:
     _instances = {}
+    _pool_settings = {}
+    _session_settings = {}
+    # Steps of a parallel module_sequence run may create the same engine concurrently.
+    _lock = threading.Lock()
+
     def __new__(cls, db, server, username, password, db_type='postgresql', port=None):
         key = (db, server, username, db_type, port)
-        if key not in cls._instances:
-            instance = super(DatabaseEngine, cls).__new__(cls)
-            instance.db = db
-            instance.server = server
-            instance.username = username
-            instance.password = password
-            instance.db_type = db_type
-            instance.port = port
-            instance.engine = instance._create_engine()
-            cls._instances[key] = instance
-        return cls._instances[key]
+        with cls._lock:
+            if key not in cls._instances:
+                instance = super(DatabaseEngine, cls).__new__(cls)
+                instance.db = db
+                instance.server = server
+                instance.username = username
+                instance.password = password
+                instance.db_type = db_type
+                instance.port = port
+                instance.stats = PoolStats()
+                instance.engine = instance._create_engine()
+                cls._instances[key] = instance
+            return cls._instances[key]
+
+    @classmethod
+    def configure(cls, session_settings=None, **pool_settings):
+        unknown = set(pool_settings) - set(POOL_SETTINGS)
+        if unknown:
+            raise ValueError(f"Unsupported pool settings: {sorted(unknown)}")
+        pool_settings = {key: value for key, value in pool_settings.items() if value is not None}
+        session_settings = session_settings or {}
+        if pool_settings == cls._pool_settings and session_settings == cls._session_settings:
+            return
+        with cls._lock:
+            cls._pool_settings = pool_settings
+            cls._session_settings = session_settings
+            # Engines built with the previous settings are replaced on next use.
+            for instance in cls._instances.values():
+                instance.engine.dispose()
+            cls._instances.clear()
+        ReflectionCache.invalidate()
+
+    @classmethod
+    def pool_stats(cls):
+        return {
+            f"{instance.db_type}://{instance.server}/{instance.db}": {
+                **instance.stats.as_dict(),
+                "pool_status": instance.engine.pool.status(),
+            }
+            for instance in cls._instances.values()
+        }
 
     def _create_engine(self):
         if self.db_type == 'postgresql':
@@ -24,10 +121,47 @@ class DatabaseEngine:
             port_part = f":{self.port}" if self.port else ""
             connection_string = f"mysql+pymysql://{self.username}:{self.password}@{self.server}{port_part}/{self.db}"
         elif self.db_type == 'sqlite':
-            connection_string = f"sqlite:///{self.db}"  
+            connection_string = f"sqlite:///{self.db}"
         else:
             raise ValueError(f"Unsupported db_type: {self.db_type}")
-        return create_engine(connection_string)
+        if self.db_type == 'sqlite':
+            engine = create_engine(connection_string)
+        else:
+            engine = create_engine(connection_string,
+                                   poolclass=InstrumentedQueuePool,
+                                   **self._pool_settings)
+            engine.pool.stats = self.stats
+        self._register_pool_events(engine)
+        return engine
+
+    def _register_pool_events(self, engine):
+        session_settings = dict(self._session_settings)
+        stats = self.stats
+
+        @event.listens_for(engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            stats.increment("connects")
+            if session_settings and self.db_type == 'postgresql':
+                cursor = dbapi_connection.cursor()
+                try:
+                    for name, value in session_settings.items():
+                        cursor.execute("SELECT set_config(%s, %s, false)", (name, str(value)))
+                finally:
+                    cursor.close()
+                # set_config opens a transaction on psycopg2; keep the settings but end it.
+                dbapi_connection.commit()
+
+        @event.listens_for(engine, "checkout")
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            stats.increment("checkouts")
+
+        @event.listens_for(engine, "checkin")
+        def on_checkin(dbapi_connection, connection_record):
+            stats.increment("checkins")
+
+        @event.listens_for(engine, "invalidate")
+        def on_invalidate(dbapi_connection, connection_record, exception):
+            stats.increment("invalidations")
 
     def get_engine(self):
         return self.engine
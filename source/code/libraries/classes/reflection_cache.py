@@ -0,0 +1,60 @@
+import threading
+
+from sqlalchemy import MetaData, Table, text
+
+
+class ReflectionCache:
+    _tables = {}
+    _schemas = {}
+    _lock = threading.RLock()
+
+    @classmethod
+    def has_schema(cls, engine, schema):
+        # Only existing schemas are cached; a miss is checked again, since a parallel step may create it.
+        key = (engine, schema)
+        with cls._lock:
+            if key in cls._schemas:
+                return cls._schemas[key]
+        with engine.connect() as connection:
+            result = connection.execute(text("""
+                            SELECT schema_name FROM information_schema.schemata WHERE schema_name = :schema
+                        """), {"schema": schema})
+            exists = result.fetchone() is not None
+        if exists:
+            with cls._lock:
+                cls._schemas[key] = True
+        return exists
+
+    @classmethod
+    def get_table(cls, engine, schema, table):
+        # Raises NoSuchTableError for missing tables; misses are not cached.
+        key = (engine, schema, table)
+        with cls._lock:
+            if key in cls._tables:
+                return cls._tables[key]
+        reflected = Table(table, MetaData(schema=schema), autoload_with=engine)
+        with cls._lock:
+            cls._tables[key] = reflected
+        return reflected
+
+    @classmethod
+    def invalidate(cls, engine=None, schema=None, table=None):
+        with cls._lock:
+            for key in list(cls._tables):
+                if cls._matches(key, engine, schema, table):
+                    del cls._tables[key]
+            if table is not None:
+                return
+            for key in list(cls._schemas):
+                if cls._matches(key, engine, schema, None):
+                    del cls._schemas[key]
+
+    @staticmethod
+    def _matches(key, engine, schema, table):
+        if engine is not None and key[0] is not engine:
+            return False
+        if schema is not None and key[1] != schema:
+            return False
+        if table is not None and len(key) > 2 and key[2] != table:
+            return False
+        return True
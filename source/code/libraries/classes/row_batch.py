@@ -0,0 +1,98 @@
+import json
+
+import pandas as pd
+
+_PLAIN_TYPES = {str, int, bool, type(None)}
+
+
+def _is_json_value(value):
+    if isinstance(value, dict):
+        return True
+    return isinstance(value, list) and all(isinstance(item, dict) for item in value)
+
+
+class RowBatch:
+    # One list per column, all of equal length.
+
+    def __init__(self, columns, length=None):
+        self.columns = dict(columns)
+        lengths = {len(values) for values in self.columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"RowBatch columns differ in length: {sorted(lengths)}")
+        self.length = lengths.pop() if lengths else (length or 0)
+
+    @classmethod
+    def from_records(cls, records, selected_keys_with_rename=None):
+        records = [row for row in records if isinstance(row, dict)]
+        if selected_keys_with_rename is None:
+            keys = records[0].keys() if records else []
+            selected_keys_with_rename = {key: key for key in keys}
+        return cls(
+            {new_key: [row.get(old_key) for row in records]
+             for old_key, new_key in selected_keys_with_rename.items()},
+            length=len(records),
+        )
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError("RowBatch only supports slicing; use records() for row access.")
+        start, stop, _ = index.indices(self.length)
+        return RowBatch({name: values[index] for name, values in self.columns.items()},
+                        length=max(stop - start, 0))
+
+    def keys(self):
+        return list(self.columns)
+
+    def column(self, name):
+        if name in self.columns:
+            return self.columns[name]
+        return [None] * self.length
+
+    def with_constant(self, name, value):
+        columns = dict(self.columns)
+        columns[name] = [value] * self.length
+        return RowBatch(columns, length=self.length)
+
+    def with_column(self, name, values):
+        columns = dict(self.columns)
+        columns[name] = list(values)
+        return RowBatch(columns, length=self.length)
+
+    def select(self, names):
+        return RowBatch({name: self.column(name) for name in names}, length=self.length)
+
+    def sort_by(self, names):
+        # None sorts last so mixed NULL/non-NULL keys stay comparable.
+        key_columns = [self.column(name) for name in names]
+        order = sorted(range(self.length),
+                       key=lambda i: tuple((values[i] is None, values[i]) for values in key_columns))
+        return RowBatch({name: [values[i] for i in order] for name, values in self.columns.items()},
+                        length=self.length)
+
+    def normalized(self):
+        # dict and list-of-dict cells become JSON text, NaN/NaT cells become None.
+        return RowBatch({name: self._normalize_column(values) for name, values in self.columns.items()},
+                        length=self.length)
+
+    @staticmethod
+    def _normalize_column(values):
+        value_types = set(map(type, values))
+        if value_types <= _PLAIN_TYPES:
+            return values
+        if dict in value_types or list in value_types:
+            values = [json.dumps(value) if _is_json_value(value) else value for value in values]
+        missing = pd.isna(pd.Series(values, dtype=object)).to_numpy()
+        if missing.any():
+            values = [None if is_missing else value for value, is_missing in zip(values, missing)]
+        return values
+
+    def rows(self, names=None):
+        names = self.keys() if names is None else names
+        return zip(*[self.column(name) for name in names])
+
+    def records(self):
+        names = self.keys()
+        return [dict(zip(names, row)) for row in self.rows(names)]
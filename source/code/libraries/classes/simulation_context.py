@@ -0,0 +1,64 @@
+from collections import defaultdict
+
+import numpy as np
+
+
+class SimulationContext:
+    # Reference data of one transaction simulation, indexed once so the generators never scan a list.
+    # The dict indexes serve the per-line helpers; the flat arrays serve the NumPy block generator.
+
+    def __init__(self, cards, cashiers, stations, products, campaigns):
+        self.card_ids_by_loyalty_id = defaultdict(list)
+        for card in cards:
+            self.card_ids_by_loyalty_id[card["loyalty_id"]].append(card["card_id"])
+
+        self.cashiers_by_id = {cashier["cashier_id"]: cashier for cashier in cashiers}
+        self.cashiers_by_station_type = defaultdict(list)
+        for cashier in cashiers:
+            self.cashiers_by_station_type[(cashier["pno"], cashier["type"])].append(cashier)
+
+        self.station_pnos_by_region = defaultdict(list)
+        for station in stations:
+            self.station_pnos_by_region[station["region"]].append(station["pno"])
+
+        self.products_by_id = {product["product_id"]: product for product in products}
+        self.products_by_type = defaultdict(list)
+        for product in products:
+            self.products_by_type[product["type"]].append(product)
+
+        # The first campaign listed for a product applies, as with the former linear search.
+        self.campaigns_by_product = {}
+        for campaign in campaigns:
+            self.campaigns_by_product.setdefault(campaign["product_id"], campaign)
+
+        self._build_cashier_groups()
+        self.region_pnos = {region: np.array(pnos, dtype=np.int64) for region, pnos in self.station_pnos_by_region.items()}
+
+    def _build_cashier_groups(self):
+        # Cashier ids grouped by (station, type) in one flat array; group g = station position * len(types) + type position.
+        self.cashier_types = sorted({cashier_type for _, cashier_type in self.cashiers_by_station_type})
+        self.station_pnos = np.array(sorted({pno for pno, _ in self.cashiers_by_station_type}), dtype=np.int64)
+        type_positions = {cashier_type: position for position, cashier_type in enumerate(self.cashier_types)}
+        station_positions = {pno: position for position, pno in enumerate(self.station_pnos.tolist())}
+        groups = {station_positions[pno] * len(self.cashier_types) + type_positions[cashier_type]: cashiers
+                  for (pno, cashier_type), cashiers in self.cashiers_by_station_type.items()}
+        self.cashier_group_sizes = np.zeros(len(self.station_pnos) * len(self.cashier_types), dtype=np.int64)
+        for group, cashiers in groups.items():
+            self.cashier_group_sizes[group] = len(cashiers)
+        self.cashier_group_starts = np.concatenate(([0], np.cumsum(self.cashier_group_sizes)[:-1])).astype(np.int64)
+        self.cashier_group_ids = np.empty(int(self.cashier_group_sizes.sum()), dtype=object)
+        for group, cashiers in groups.items():
+            start = self.cashier_group_starts[group]
+            self.cashier_group_ids[start:start + len(cashiers)] = [cashier["cashier_id"] for cashier in cashiers]
+
+    def cashier_type_position(self, cashier_type):
+        return self.cashier_types.index(cashier_type) if cashier_type in self.cashier_types else -1
+
+    def cashier_groups(self, pnos, type_positions):
+        # Group number per (pno, type position), or -1 when the station has no cashier of that type.
+        if not len(self.station_pnos):
+            return np.full(len(pnos), -1, dtype=np.int64)
+        station_positions = np.minimum(np.searchsorted(self.station_pnos, pnos), len(self.station_pnos) - 1)
+        known = (self.station_pnos[station_positions] == pnos) & (type_positions >= 0)
+        groups = np.where(known, station_positions * len(self.cashier_types) + type_positions, -1)
+        return np.where(known & (self.cashier_group_sizes[np.maximum(groups, 0)] > 0), groups, -1)
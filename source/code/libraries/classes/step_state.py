@@ -0,0 +1,186 @@
+import ast
+import hashlib
+import importlib.util
+import json
+import threading
+
+from sqlalchemy import text
+
+from libraries.classes.db_engine import DatabaseEngine
+from libraries.utils import env
+from libraries.utils.file_digest import DIGEST_INDEX_FILE, cached_file_digest, file_digest
+from libraries.utils.path_config import CACHE_DIR, FILES_DIR
+
+def _input_digests(patterns: list[str], base_dir) -> dict[str, str]:
+    # Patterns are resolved against resource/; a pattern without matches is recorded as missing.
+    # Digests are remembered by size and mtime, so unchanged multi-GB inputs are not rehashed on every run.
+    digests = {}
+    for pattern in patterns:
+        matches = sorted(path for path in base_dir.glob(pattern) if path.is_file())
+        if not matches:
+            digests[pattern] = "missing"
+        for path in matches:
+            digests[path.relative_to(base_dir).as_posix()] = cached_file_digest(path, CACHE_DIR / DIGEST_INDEX_FILE)
+    return digests
+
+
+def _module_file(module_name: str) -> str | None:
+    try:
+        spec = importlib.util.find_spec(module_name)
+    except (ImportError, ValueError):
+        return None
+    if spec is None or not spec.origin or not spec.has_location:
+        return None
+    return spec.origin
+
+
+def _imported_modules(module_name: str, module_file: str) -> set[str]:
+    # Candidate module names imported by one file; "from a.b import c" yields both a.b and a.b.c.
+    with open(module_file, "r", encoding="utf-8") as file:
+        tree = ast.parse(file.read(), filename=module_file)
+    package = module_name if module_file.endswith("__init__.py") else module_name.rpartition(".")[0]
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ""
+            if node.level:
+                parent = package.rsplit(".", node.level - 1)[0] if node.level > 1 else package
+                base = f"{parent}.{base}" if base else parent
+            names.add(base)
+            names.update(f"{base}.{alias.name}" for alias in node.names if alias.name != "*")
+    return names
+
+
+def _module_digests(module_name: str) -> dict[str, str]:
+    # The step module and every project-local module it imports, directly or indirectly, so a change
+    # to shared code (orchestrator, simulation helpers, ...) marks the step dirty as well.
+    root = module_name.split(".")[0]
+    digests, pending = {}, [module_name]
+    while pending:
+        name = pending.pop()
+        if name in digests:
+            continue
+        module_file = _module_file(name)
+        if module_file is None or not module_file.endswith(".py"):
+            continue
+        digests[name] = file_digest(module_file)
+        pending.extend(imported for imported in _imported_modules(name, module_file)
+                       if imported.split(".")[0] == root and imported not in digests)
+    return digests
+
+
+def step_fingerprint(module_config: dict,
+                     upstream_fingerprints: list[str],
+                     base_dir=FILES_DIR,
+                     table_markers: dict | None = None) -> str:
+    payload = {
+        "module": module_config["module"],
+        "module_digests": _module_digests(module_config["module"]),
+        "callable": module_config.get("callable", "main"),
+        "kwargs": module_config.get("kwargs", {}),
+        "inputs": _input_digests(module_config.get("inputs", []), base_dir),
+        "source_tables": table_markers or {},
+        "upstream": upstream_fingerprints,
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class StepStateStore:
+    def __init__(self, db_name=env.POSTGRES_DB, schema="public", table="pipeline_step_state"):
+        env.require_postgres_env()
+        self.qualified_table = f"{schema}.{table}"
+        self.engine = DatabaseEngine(
+            db=db_name,
+            server=env.POSTGRES_HOST,
+            username=env.POSTGRES_USERNAME,
+            password=env.POSTGRES_PASSWORD,
+            port=env.POSTGRES_PORT,
+        ).get_engine()
+        self._lock = threading.Lock()
+        self._completed = {}
+        self._results = {}
+
+    def load(self):
+        with self.engine.begin() as connection:
+            connection.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {self.qualified_table} (
+                    step_name TEXT PRIMARY KEY,
+                    module TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    completed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    wall_seconds DOUBLE PRECISION,
+                    rows_written BIGINT,
+                    result JSONB
+                )
+            """))
+            connection.execute(text(f"ALTER TABLE {self.qualified_table} ADD COLUMN IF NOT EXISTS result JSONB"))
+            rows = connection.execute(text(f"SELECT step_name, fingerprint, result FROM {self.qualified_table}")).fetchall()
+        with self._lock:
+            self._completed = {step_name: fingerprint for step_name, fingerprint, _ in rows}
+            self._results = {step_name: result for step_name, _, result in rows if result is not None}
+        return self
+
+    def table_markers(self, tables):
+        # Row count and, where the table has one, max(updatetime) of each declared source table. Tables that
+        # live outside this runtime (e.g. DAR for the stations step) are tracked this way instead of depends_on.
+        markers = {}
+        with self.engine.connect() as connection:
+            for table in tables:
+                schema, _, name = table.rpartition(".")
+                columns = connection.execute(text("""
+                    SELECT column_name FROM information_schema.columns
+                     WHERE table_schema = :schema AND table_name = :name
+                """), {"schema": schema or "public", "name": name}).scalars().all()
+                if not columns:
+                    markers[table] = "missing"
+                    continue
+                updated = "max(updatetime)" if "updatetime" in columns else "NULL"
+                row_count, last_update = connection.execute(text(f"SELECT count(*), {updated} FROM {table}")).one()
+                markers[table] = {"rows": row_count, "updatetime": last_update}
+        return markers
+
+    def is_completed(self, step_name, fingerprint):
+        with self._lock:
+            return self._completed.get(step_name) == fingerprint
+
+    def completed_result(self, step_name):
+        # The result the step returned when it last completed, so a skipped step still reports it.
+        with self._lock:
+            return self._results.get(step_name)
+
+    def invalidate(self, step_name):
+        # Called before a step runs, so a step that fails halfway is never mistaken for completed.
+        with self.engine.begin() as connection:
+            connection.execute(text(f"DELETE FROM {self.qualified_table} WHERE step_name = :step_name"),
+                               {"step_name": step_name})
+        with self._lock:
+            self._completed.pop(step_name, None)
+            self._results.pop(step_name, None)
+
+    def mark_completed(self, step_name, module, fingerprint, step_report):
+        with self.engine.begin() as connection:
+            connection.execute(text(f"""
+                INSERT INTO {self.qualified_table} (step_name, module, fingerprint, completed_at, wall_seconds, rows_written, result)
+                VALUES (:step_name, :module, :fingerprint, now(), :wall_seconds, :rows_written, CAST(:result AS JSONB))
+                ON CONFLICT (step_name) DO UPDATE SET
+                    module = EXCLUDED.module,
+                    fingerprint = EXCLUDED.fingerprint,
+                    completed_at = EXCLUDED.completed_at,
+                    wall_seconds = EXCLUDED.wall_seconds,
+                    rows_written = EXCLUDED.rows_written,
+                    result = EXCLUDED.result
+            """), {
+                "step_name": step_name,
+                "module": module,
+                "fingerprint": fingerprint,
+                "wall_seconds": step_report.get("wall_seconds"),
+                "rows_written": step_report.get("rows_written"),
+                "result": json.dumps(step_report["result"]) if step_report.get("result") is not None else None,
+            })
+        with self._lock:
+            self._completed[step_name] = fingerprint
+            if step_report.get("result") is not None:
+                self._results[step_name] = step_report["result"]
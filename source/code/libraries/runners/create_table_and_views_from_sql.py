@@ -1,18 +1,167 @@
+import hashlib
 import logging
+import re
+import time
 from pathlib import Path
 
 import psycopg2
 
 from libraries.utils import path_config
+from libraries.utils.reporting import refresh_reporting_table, reporting_tables_in
 
 logger = logging.getLogger(__name__)
 
+LEDGER_TABLE = "public.sql_migration_ledger"
 
-def main(runtime_vars: dict) -> None:
+# Header line naming the tables a migration alters; the file waits, unrecorded, until they all exist.
+REQUIRES_HEADER = re.compile(r"^--\s*requires:\s*(.+)$", re.IGNORECASE | re.MULTILINE)
+
+# Statements PostgreSQL refuses to run inside a transaction block.
+NON_TRANSACTIONAL_STATEMENT = re.compile(
+    r"^\s*(?:"
+    r"(?:CREATE|DROP)\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY"
+    r"|REINDEX\b[^;]*\b(?:CONCURRENTLY|DATABASE|SYSTEM)\b"
+    r"|ALTER\s+TABLE\b[^;]*\bDETACH\s+PARTITION\b[^;]*\bCONCURRENTLY"
+    r"|VACUUM\b"
+    r"|(?:CREATE|DROP)\s+(?:DATABASE|TABLESPACE)\b"
+    r"|ALTER\s+SYSTEM\b"
+    r")",
+    re.IGNORECASE,
+)
+
+
+def as_flag(value) -> bool:
+    # Runtime values resolved from env arrive as strings.
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes")
+    return bool(value)
+
+
+def sql_checksum(sql_text: str) -> str:
+    # Line endings are normalized so a Windows checkout does not look like a change.
+    return hashlib.sha256(sql_text.replace("\r\n", "\n").encode("utf-8")).hexdigest()
+
+
+def ensure_ledger(cursor) -> None:
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {LEDGER_TABLE} (
+            file_path TEXT PRIMARY KEY,
+            checksum TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            execution_ms DOUBLE PRECISION
+        )
+    """)
+
+
+def load_ledger(cursor) -> dict[str, str]:
+    cursor.execute("SELECT to_regclass(%s)", (LEDGER_TABLE,))
+    if cursor.fetchone()[0] is None:
+        return {}
+    cursor.execute(f"SELECT file_path, checksum FROM {LEDGER_TABLE}")
+    return dict(cursor.fetchall())
+
+
+def split_sql_statements(sql_text: str) -> list[str]:
+    # Splits on top-level semicolons; quoted strings, quoted identifiers, dollar-quoted bodies and comments
+    # are skipped over. Comments are dropped from the returned statements.
+    statements, current, pos = [], [], 0
+    while pos < len(sql_text):
+        char = sql_text[pos]
+        if sql_text.startswith("--", pos):
+            end = sql_text.find("\n", pos)
+            pos = len(sql_text) if end == -1 else end
+            continue
+        if sql_text.startswith("/*", pos):
+            end = sql_text.find("*/", pos + 2)
+            pos = len(sql_text) if end == -1 else end + 2
+            current.append(" ")
+            continue
+        if char in ("'", '"'):
+            end = pos + 1
+            while True:
+                end = sql_text.find(char, end)
+                if end == -1:
+                    end = len(sql_text)
+                    break
+                if sql_text.startswith(char * 2, end):
+                    end += 2
+                    continue
+                end += 1
+                break
+            current.append(sql_text[pos:end])
+            pos = end
+            continue
+        dollar_tag = re.match(r"\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$", sql_text[pos:]) if char == "$" else None
+        if dollar_tag:
+            tag = dollar_tag.group(0)
+            end = sql_text.find(tag, pos + len(tag))
+            end = len(sql_text) if end == -1 else end + len(tag)
+            current.append(sql_text[pos:end])
+            pos = end
+            continue
+        if char == ";":
+            statements.append("".join(current).strip())
+            current = []
+        else:
+            current.append(char)
+        pos += 1
+    statements.append("".join(current).strip())
+    return [statement for statement in statements if statement]
+
+
+def needs_autocommit(statements: list[str]) -> bool:
+    return any(NON_TRANSACTIONAL_STATEMENT.match(statement) for statement in statements)
+
+
+def read_sql_files(sql_queries: list[str]) -> list[tuple[str, str]]:
+    sql_files = []
+    for relative_sql_path in sql_queries:
+        sql_path = path_config.RUNTIME_DIR / relative_sql_path
+        if not sql_path.exists():
+            raise FileNotFoundError(f"SQL file not found: {sql_path}")
+
+        sql_text = sql_path.read_text(encoding="utf-8").strip()
+        if not sql_text:
+            logger.warning("Skipping empty SQL file: %s", sql_path)
+            continue
+        sql_files.append((relative_sql_path, sql_text))
+    return sql_files
+
+
+def required_tables(sql_text: str) -> list[str]:
+    return [name.strip() for match in REQUIRES_HEADER.finditer(sql_text)
+            for name in match.group(1).split(",") if name.strip()]
+
+
+def missing_tables(cursor, tables: list[str]) -> list[str]:
+    missing = []
+    for table in tables:
+        cursor.execute("SELECT to_regclass(%s)", (table,))
+        if cursor.fetchone()[0] is None:
+            missing.append(table)
+    return missing
+
+
+def pending_reason(relative_sql_path: str, checksum: str, ledger: dict[str, str], force) -> str | None:
+    if force is True or (isinstance(force, set) and relative_sql_path in force):
+        return "forced"
+    if relative_sql_path not in ledger:
+        return "new"
+    if ledger[relative_sql_path] != checksum:
+        return "changed"
+    return None
+
+
+def main(runtime_vars: dict) -> dict:
     client = runtime_vars["client"]
     if client["db_type"] != "postgresql":
         raise ValueError(f"Unsupported db_type: {client['db_type']}")
 
+    force = runtime_vars.get("force", False)
+    force = set(force) if isinstance(force, list) else as_flag(force)
+    dry_run = as_flag(runtime_vars.get("dry_run", False))
+    sql_files = read_sql_files(runtime_vars["sql_queries"])
+
     connection = psycopg2.connect(
         dbname=client["db_name"],
         user=client["username"],
@@ -20,21 +169,89 @@ def main(runtime_vars: dict) -> None:
         host=client["server"],
         port=client["port"],
     )
-    connection.autocommit = True
 
+    summary = {"applied": [], "pending": [], "unchanged": [], "deferred": []}
     try:
-        for relative_sql_path in runtime_vars["sql_queries"]:
-            sql_path = path_config.RUNTIME_DIR / relative_sql_path
-            if not sql_path.exists():
-                raise FileNotFoundError(f"SQL file not found: {sql_path}")
-
-            sql_text = sql_path.read_text(encoding="utf-8").strip()
-            if not sql_text:
-                logger.warning("Skipping empty SQL file: %s", sql_path)
+        with connection.cursor() as cursor:
+            if not dry_run:
+                ensure_ledger(cursor)
+            ledger = load_ledger(cursor)
+        connection.commit()
+
+        for relative_sql_path, sql_text in sql_files:
+            checksum = sql_checksum(sql_text)
+            reason = pending_reason(relative_sql_path, checksum, ledger, force)
+            if reason is None:
+                summary["unchanged"].append(relative_sql_path)
+                continue
+            if dry_run:
+                logger.info("Pending (%s): %s", reason, relative_sql_path)
+                summary["pending"].append({"file": relative_sql_path, "reason": reason})
+                continue
+
+            # A migration for a table that neither the table files nor a loader has created yet would be a
+            # no-op; recording it would keep it from ever running once the table appears.
+            with connection.cursor() as cursor:
+                missing = missing_tables(cursor, required_tables(sql_text))
+            connection.commit()
+            if missing:
+                logger.info("Deferring %s until %s exist(s).", relative_sql_path, ", ".join(missing))
+                summary["deferred"].append({"file": relative_sql_path, "missing": missing})
                 continue
 
-            logger.info("Executing SQL file: %s", sql_path)
+            logger.info("Executing SQL file (%s): %s", reason, relative_sql_path)
+            started = time.perf_counter()
+            statements = split_sql_statements(sql_text)
+            autocommit = needs_autocommit(statements)
+            if autocommit:
+                # CREATE INDEX CONCURRENTLY, VACUUM and the like cannot run in a transaction block, so the file
+                # runs statement by statement in autocommit mode; a failure leaves the earlier statements applied
+                # and the ledger entry unwritten, so such files must be safe to rerun (IF NOT EXISTS).
+                logger.info("Running %s in autocommit mode (non-transactional statements).", relative_sql_path)
+                connection.autocommit = True
+                try:
+                    with connection.cursor() as cursor:
+                        for statement in statements:
+                            cursor.execute(statement)
+                finally:
+                    connection.autocommit = False
+            # Otherwise the file and its ledger entry commit together, so a failed file is retried on the next run.
             with connection.cursor() as cursor:
-                cursor.execute(sql_text)
+                if not autocommit:
+                    cursor.execute(sql_text)
+                cursor.execute(f"""
+                    INSERT INTO {LEDGER_TABLE} (file_path, checksum, applied_at, execution_ms)
+                    VALUES (%s, %s, now(), %s)
+                    ON CONFLICT (file_path) DO UPDATE SET
+                        checksum = EXCLUDED.checksum,
+                        applied_at = EXCLUDED.applied_at,
+                        execution_ms = EXCLUDED.execution_ms
+                """, (relative_sql_path, checksum, round((time.perf_counter() - started) * 1000, 1)))
+            connection.commit()
+            summary["applied"].append(relative_sql_path)
+    except Exception:
+        connection.rollback()
+        raise
     finally:
         connection.close()
+
+    # Reporting tables are created empty and otherwise only filled by the loaders, which resume may skip.
+    # Tables whose DDL was just applied are rebuilt; the others are only backfilled while they are empty,
+    # so a run where the ledger reports nothing changed does not rebuild the reports.
+    if not dry_run:
+        applied_tables = reporting_tables_in(summary["applied"])
+        for table in reporting_tables_in([relative_sql_path for relative_sql_path, _ in sql_files]):
+            refresh_reporting_table(table,
+                                    only_if_empty=table not in applied_tables,
+                                    db_name=client["db_name"],
+                                    username=client["username"],
+                                    password=client["password"],
+                                    server=client["server"],
+                                    port=client["port"])
+
+    if dry_run:
+        logger.info("Dry run: %s pending, %s unchanged SQL file(s).", len(summary["pending"]), len(summary["unchanged"]))
+    else:
+        logger.info("Applied %s SQL file(s), skipped %s unchanged, deferred %s.",
+                    len(summary["applied"]), len(summary["unchanged"]), len(summary["deferred"]))
+    return summary
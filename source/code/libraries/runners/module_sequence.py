@@ -1,23 +1,220 @@
+import json
+import uuid
+import hashlib
 import logging
 import importlib
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from libraries.classes.db_engine import POOL_SETTINGS, DatabaseEngine
+from libraries.classes.step_state import StepStateStore, step_fingerprint
+from libraries.utils import env
+from libraries.utils.step_metrics import RunFailedError, measure_step
+
 logger = logging.getLogger(__name__)
 
+# Step results larger than this (encoded as JSON) are left out of the run report and the checkpoint.
+STEP_RESULT_MAX_CHARS = 1 << 16
+
+
+def configure_database_pool(client: dict) -> None:
+    pool_settings = {key: client[key] for key in POOL_SETTINGS if key in client}
+    session_settings = client.get("session_settings")
+    if pool_settings or session_settings:
+        DatabaseEngine.configure(session_settings=session_settings, **pool_settings)
+
+
+def step_name(module_config: dict) -> str:
+    return module_config.get("name", module_config["module"])
+
+
+def step_result(value) -> dict | None:
+    # Summaries a step returns (e.g. the downloader's per-entity status) are kept; row data returned by
+    # loaders and simulations is not.
+    if not isinstance(value, dict):
+        return None
+    try:
+        encoded = json.dumps(value, default=str)
+    except (TypeError, ValueError):
+        return None
+    return json.loads(encoded) if len(encoded) <= STEP_RESULT_MAX_CHARS else None
+
+
+def run_step(module_config: dict, step_reports: list[dict] | None = None) -> dict:
+    module_path = module_config["module"]
+    callable_name = module_config.get("callable", "main")
+    kwargs = module_config.get("kwargs", {})
+    name = step_name(module_config)
+
+    logger.info("Running: %s", name)
+    with measure_step(name) as step_report:
+        if step_reports is not None:
+            step_reports.append(step_report)
+        module = importlib.import_module(module_path)
+        callable_obj = getattr(module, callable_name)
+        result = step_result(callable_obj(**kwargs))
+        if result is not None:
+            step_report["result"] = result
+    logger.info("Completed: %s (%.1fs, %s rows written)", name, step_report["wall_seconds"], step_report["rows_written"])
+    return step_report
+
+
+def resume_enabled(runtime_vars: dict) -> bool:
+    if env.PIPELINE_RESUME is not None:
+        return env.PIPELINE_RESUME.strip().lower() in ("1", "true", "yes")
+    return bool(runtime_vars.get("resume", False))
+
+
+def run_resumable_step(module_config: dict,
+                       upstream: list[str],
+                       state: StepStateStore,
+                       fingerprints: dict[str, str],
+                       step_reports: list[dict]) -> None:
+    # Upstream fingerprints chain into this one, so a rerun upstream step marks every dependent step dirty.
+    name = step_name(module_config)
+    fingerprint = step_fingerprint(module_config,
+                                   [fingerprints[dependency] for dependency in upstream],
+                                   table_markers=state.table_markers(module_config.get("source_tables", [])))
+    if not module_config.get("resume", True):
+        # Steps that draw random data are never skipped. A fresh fingerprint per run also reruns their dependents.
+        fingerprint = hashlib.sha256(f"{fingerprint}:{uuid.uuid4()}".encode("utf-8")).hexdigest()
+    if state.is_completed(name, fingerprint):
+        logger.info("Skipping unchanged step: %s", name)
+        step_report = {"name": name, "status": "unchanged", "fingerprint": fingerprint}
+        if state.completed_result(name) is not None:
+            step_report["result"] = state.completed_result(name)
+        step_reports.append(step_report)
+    else:
+        state.invalidate(name)
+        step_report = run_step(module_config, step_reports)
+        state.mark_completed(name, module_config["module"], fingerprint, step_report)
+        step_report["fingerprint"] = fingerprint
+    fingerprints[name] = fingerprint
+
 
-def main(runtime_vars: dict) -> None:
+def build_step_graph(modules: list[dict]) -> dict[str, list[str]]:
+    graph = {}
+    for module_config in modules:
+        name = step_name(module_config)
+        if name in graph:
+            raise ValueError(f"Duplicate step name '{name}'; names must be unique when steps declare depends_on.")
+        graph[name] = list(module_config.get("depends_on", []))
+
+    for name, depends_on in graph.items():
+        unknown = [dependency for dependency in depends_on if dependency not in graph]
+        if unknown:
+            raise ValueError(f"Step '{name}' depends on unknown step(s): {unknown}")
+
+    # Kahn's algorithm; anything left unvisited sits on a cycle.
+    remaining = {name: len(depends_on) for name, depends_on in graph.items()}
+    ready = [name for name, count in remaining.items() if count == 0]
+    visited = 0
+    while ready:
+        current = ready.pop()
+        visited += 1
+        for name, depends_on in graph.items():
+            if current in depends_on:
+                remaining[name] -= 1
+                if remaining[name] == 0:
+                    ready.append(name)
+    if visited != len(graph):
+        cyclic = sorted(name for name, count in remaining.items() if count > 0)
+        raise ValueError(f"Step dependencies contain a cycle involving: {cyclic}")
+    return graph
+
+
+def run_step_graph(modules: list[dict], max_workers: int = 1, execute=run_step) -> None:
+    graph = build_step_graph(modules)
+    configs = {step_name(module_config): module_config for module_config in modules}
+    order = list(configs)
+    done, failed = set(), {}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+        while True:
+            if not failed:
+                for name in order:
+                    if name in done or name in running.values():
+                        continue
+                    if all(dependency in done for dependency in graph[name]):
+                        running[executor.submit(execute, configs[name])] = name
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    future.result()
+                    done.add(name)
+                except Exception as e:
+                    logger.exception("Step %s failed: %s", name, e)
+                    failed[name] = e
+
+    if failed:
+        skipped = [name for name in order if name not in done and name not in failed]
+        if skipped:
+            logger.error("Skipped %s step(s) after failure: %s", len(skipped), skipped)
+        raise next(iter(failed.values()))
+
+
+def order_step_reports(modules: list[dict], step_reports: list[dict]) -> list[dict]:
+    by_name = {step_report["name"]: step_report for step_report in step_reports}
+    return [by_name.get(step_name(module_config), {"name": step_name(module_config), "status": "skipped"})
+            for module_config in modules]
+
+
+def main(runtime_vars: dict) -> dict | None:
     modules = runtime_vars.get("modules", [])
     if not modules:
         logger.warning("No modules configured.")
-        return
+        return None
 
-    for module_config in modules:
-        module_path = module_config["module"]
-        callable_name = module_config.get("callable", "main")
-        kwargs = module_config.get("kwargs", {})
-        step_name = module_config.get("name", module_path)
+    configure_database_pool(runtime_vars.get("client", {}))
 
-        logger.info("Running: %s", step_name)
-        module = importlib.import_module(module_path)
-        callable_obj = getattr(module, callable_name)
-        callable_obj(**kwargs)
-        logger.info("Completed: %s", step_name)
+    report = {"started_at": datetime.now().isoformat(timespec="seconds"), "steps": []}
+    step_reports = report["steps"]
+    use_graph = any("depends_on" in module_config for module_config in modules)
+    state = StepStateStore().load() if resume_enabled(runtime_vars) else None
+    fingerprints = {}
+
+    def execute(module_config: dict) -> None:
+        if state is None:
+            run_step(module_config, step_reports)
+            return
+        if use_graph:
+            upstream = list(module_config.get("depends_on", []))
+        else:
+            # Sequential runs: every earlier step is upstream, so the run resumes at the first dirty step.
+            upstream = [step_name(config) for config in modules[:modules.index(module_config)]]
+        run_resumable_step(module_config, upstream, state, fingerprints, step_reports)
+
+    error = None
+    try:
+        with measure_step("run") as run_report:
+            if use_graph:
+                run_step_graph(modules, max_workers=runtime_vars.get("max_workers", 1), execute=execute)
+            else:
+                for module_config in modules:
+                    execute(module_config)
+    except Exception as e:
+        error = e
+
+    report.update({key: run_report[key] for key in ("status", "wall_seconds", "cpu_seconds", "peak_rss_mb")})
+    report["steps"] = order_step_reports(modules, report["steps"])
+    if use_graph and runtime_vars.get("max_workers", 1) > 1:
+        # CPU time and RSS are process-wide; per step they would include whatever ran alongside it.
+        report["resource_scope"] = "run"
+        for step_report in report["steps"]:
+            for key in ("cpu_seconds", "peak_rss_mb"):
+                if key in step_report:
+                    step_report[key] = None
+    else:
+        report["resource_scope"] = "step"
+    report["pool_stats"] = DatabaseEngine.pool_stats()
+
+    for engine_name, stats in report["pool_stats"].items():
+        logger.info("Connection pool %s: %s", engine_name, stats)
+    if error is not None:
+        raise RunFailedError(f"Run stopped after a failed step: {error}", report) from error
+    return report
@@ -1,21 +1,50 @@
+import json
 import logging
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 from pathlib import Path
+from time import sleep
 import requests
 import zipfile
 from tqdm import tqdm
 from libraries.utils.env import (
+    DATAFORDELER_BASE_URL,
     DATAFORDELER_PASSWORD,
     DATAFORDELER_USER,
     require_datafordeler_env,
 )
+from libraries.utils.file_digest import file_digest
 from libraries.utils.path_config import DATAFORDELER_JSON_DIR
 
 logger = logging.getLogger(__name__)
 
+DATAFORDELER_ENTITIES = [
+    {'LatestTotalForEntity': 'Husnummer', 'register': 'DAR', 'type': 'current'},
+    {'LatestTotalForEntity': 'Adresse', 'register': 'DAR', 'type': 'current'},
+    {'LatestTotalForEntity': 'Adressepunkt', 'register': 'DAR', 'type': 'current'},
+    {'LatestTotalForEntity': 'NavngivenVej', 'register': 'DAR', 'type': 'current'},
+    {'LatestTotalForEntity': 'Postnummer', 'register': 'DAR', 'type': 'current'},
+    {'LatestTotalForEntity': 'Kommuneinddeling', 'register': 'DAGI', 'type': 'current'},
+    {'LatestTotalForEntity': 'Landsdel', 'register': 'DAGI', 'type': 'current'},
+    {'LatestTotalForEntity': 'Postnummerinddeling', 'register': 'DAGI', 'type': 'current'},
+    {'LatestTotalForEntity': 'Regionsinddeling', 'register': 'DAGI', 'type': 'current'},
+    {'LatestTotalForEntity': 'Storkreds', 'register': 'DAGI', 'type': 'current'},
+]
+DOWNLOAD_CHUNK_BYTES = 1 << 20
+REQUEST_TIMEOUT = (30, 300)
+MANIFEST_FILENAME = ".download_manifest.json"
+
+
+class DownloadIntegrityError(Exception):
+    pass
+
+
 def get_api(LatestTotalForEntity: str,
             register: str = "DAR",
-            type: str = "current"):
+            type: str = "current",
+            headers: dict | None = None):
     require_datafordeler_env()
     params = {
         "Register": register,
@@ -25,75 +54,325 @@ def get_api(LatestTotalForEntity: str,
         "username": DATAFORDELER_USER,
         "password": DATAFORDELER_PASSWORD,
     }
-    return requests.get(f"https://api.datafordeler.dk/FileDownloads/GetFile",
-                 params=params, 
-                 stream=True)
+    return requests.get(f"{DATAFORDELER_BASE_URL.rstrip('/')}/FileDownloads/GetFile",
+                 params=params,
+                 headers=headers,
+                 stream=True,
+                 timeout=REQUEST_TIMEOUT)
+
+"""
+Downloads one entity ZIP into <zip_path>.part, resuming an existing partial file with an HTTP Range request.
+The ETag/Last-Modified of the partial download are kept in <zip_path>.part.json, so a .part file left by an
+earlier run is resumed with If-Range as well; a partial file without recorded validators is downloaded again.
+A server that ignores the Range header, or whose file changed (200 instead of 206), restarts the file. A 416 whose
+"bytes */<size>" equals the partial file's size means it is already complete; any other 416 restarts the file.
+The received size is checked against Content-Length/Content-Range before the .part file is renamed to zip_path.
+conditional_headers (If-None-Match/If-Modified-Since) are only sent for a fresh download; a 304 answer returns None.
+Otherwise returns the ETag and Last-Modified validators of the file.
+"""
+
+def fetch_zip(LatestTotalForEntity: str,
+              register: str,
+              type: str,
+              zip_path: str,
+              conditional_headers: dict | None = None,
+              retries: int = 3,
+              delay: int = 5) -> dict | None:
+    part_path = f"{zip_path}.part"
+    validators_path = f"{part_path}.json"
+    attempt = 0
+    validators = _load_part_validators(validators_path)
+    while True:
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if offset and not _if_range(validators):
+            logger.info("No validators recorded for the partial %s_%s download; restarting it.", register, LatestTotalForEntity)
+            os.remove(part_path)
+            offset = 0
+        if offset:
+            # The server answers 200 instead of 206 if the file changed since the partial download started.
+            headers = {"Range": f"bytes={offset}-", "If-Range": _if_range(validators)}
+        else:
+            headers = conditional_headers
+        try:
+            with get_api(LatestTotalForEntity=LatestTotalForEntity,
+                         register=register,
+                         type=type,
+                         headers=headers) as response:
+                if response.status_code == 304 and not offset:
+                    return None
+                if response.status_code == 416 and offset:
+                    # Only a "bytes */<size>" matching the partial file proves it complete; anything else restarts it.
+                    if _content_range_total(response) == offset:
+                        break
+                    logger.info("Partial %s_%s download does not match the server file; restarting it.",
+                                register, LatestTotalForEntity)
+                    os.remove(part_path)
+                    continue
+                response.raise_for_status()
+                if offset and response.status_code != 206:
+                    logger.info("Server ignored Range for %s_%s; restarting download.", register, LatestTotalForEntity)
+                    offset = 0
+                if not offset:
+                    validators = {
+                        "etag": response.headers.get("ETag"),
+                        "last_modified": response.headers.get("Last-Modified"),
+                    }
+                    _save_part_validators(validators_path, validators)
+                expected_size = _expected_size(response, offset)
+                with open(part_path, "ab" if offset else "wb", buffering=DOWNLOAD_CHUNK_BYTES) as file:
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
+                        file.write(chunk)
+            received_size = os.path.getsize(part_path)
+            if expected_size is not None and received_size != expected_size:
+                if received_size > expected_size:
+                    os.remove(part_path)
+                raise requests.exceptions.ChunkedEncodingError(
+                    f"Received {received_size} of {expected_size} bytes for {register}_{LatestTotalForEntity}")
+            break
+        except (requests.exceptions.ConnectionError,
+                requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.Timeout,
+                requests.exceptions.HTTPError) as e:
+            server_error = not isinstance(e, requests.exceptions.HTTPError) or e.response.status_code >= 500
+            if attempt >= retries or not server_error:
+                raise
+            attempt += 1
+            logger.warning("Download of %s_%s interrupted (%s); resuming in %s seconds (attempt %s of %s).",
+                           register, LatestTotalForEntity, e, delay, attempt, retries)
+            sleep(delay)
+    os.replace(part_path, zip_path)
+    if os.path.exists(validators_path):
+        os.remove(validators_path)
+    return validators
+
+
+def _if_range(validators: dict) -> str | None:
+    # If-Range needs a strong ETag; a weak one falls back to Last-Modified.
+    etag = validators.get("etag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return validators.get("last_modified")
+
+
+def _load_part_validators(validators_path: str) -> dict:
+    try:
+        with open(validators_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_part_validators(validators_path: str, validators: dict) -> None:
+    with open(validators_path, "w", encoding="utf-8") as file:
+        json.dump(validators, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+def _content_range_total(response) -> int | None:
+    # The complete size from "bytes 0-99/1234" (206) or "bytes */1234" (416); None when the server omits it.
+    content_range = response.headers.get("Content-Range", "")
+    total = content_range.rsplit("/", 1)[1] if "/" in content_range else ""
+    return int(total) if total.isdigit() else None
+
+
+def _expected_size(response, offset: int) -> int | None:
+    if response.status_code == 206:
+        return _content_range_total(response)
+    content_length = response.headers.get("Content-Length")
+    if content_length is None or response.headers.get("Content-Encoding"):
+        return None
+    return offset + int(content_length)
+
+
+def verify_zip(zip_path: str) -> None:
+    # testzip reads every member and checks its CRC-32.
+    with zipfile.ZipFile(zip_path, "r") as zip_ref:
+        bad_member = zip_ref.testzip()
+    if bad_member is not None:
+        raise DownloadIntegrityError(f"CRC check failed for {bad_member} in {zip_path}")
+
+
+def _file_stats(save_directory: str, file_names: list[str]) -> dict[str, dict]:
+    stats = {}
+    for file_name in file_names:
+        stat = os.stat(os.path.join(save_directory, file_name))
+        stats[file_name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return stats
+
+
+def _files_intact(save_directory: str, entry: dict) -> bool:
+    # Size and mtime are enough to notice a deleted or rewritten file without rehashing gigabytes of JSON.
+    files = entry.get("files") or {}
+    try:
+        return bool(files) and _file_stats(save_directory, list(files)) == files
+    except OSError:
+        return False
+
+
+def load_manifest(manifest_path: str) -> dict:
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        logger.warning("Ignoring unreadable download manifest: %s", manifest_path)
+        return {}
+
+
+def save_manifest(manifest_path: str, manifest: dict) -> None:
+    temp_path = f"{manifest_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+        file.write("\n")
+    os.replace(temp_path, manifest_path)
+
+
+def _conditional_headers(entry: dict) -> dict | None:
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers or None
+
+"""
+Downloads, verifies and extracts one entity. manifest_entry is the entity's entry from the previous run, if any;
+its validators make the request conditional while the files it produced are still on disk as recorded.
+With extract=False the verified archive is kept as <register>_<entity>.zip instead; the JSON loaders read
+<register>_<entity>_<n>.json straight from it (orchestrator.open_json_source), so no extracted copy is written.
+Returns the new manifest entry with status "unchanged" (304, or an identical archive) or "downloaded",
+or None if the download failed. Unchanged entities keep their JSON files untouched, so the input
+fingerprints of the steps that load them do not change and resumed runs skip those steps.
+"""
 
 def download_and_unzip(LatestTotalForEntity: str,
                        register: str,
-                       type: str, 
-                       save_directory: str | Path):
+                       type: str,
+                       save_directory: str | Path,
+                       manifest_entry: dict | None = None,
+                       extract: bool = True):
     try:
         save_directory = os.fspath(save_directory)
         os.makedirs(save_directory, exist_ok=True)
         zip_filename = f"{register}_{LatestTotalForEntity}_{type}"
         zip_path = os.path.join(save_directory, zip_filename)
-        response = get_api(LatestTotalForEntity=LatestTotalForEntity,
-                           register=register,
-                           type=type)
-        response.raise_for_status()
-        with open(zip_path, "wb") as file:
-            for chunk in response.iter_content(chunk_size=8192):
-                file.write(chunk)
+        archive_filename = f"{register}_{LatestTotalForEntity}.zip"
+        previous = manifest_entry or {}
+        if not _files_intact(save_directory, previous) or previous.get("extracted", True) != extract:
+            previous = {}
+        checked_at = datetime.now().isoformat(timespec="seconds")
+        validators = fetch_zip(LatestTotalForEntity=LatestTotalForEntity,
+                               register=register,
+                               type=type,
+                               zip_path=zip_path,
+                               conditional_headers=_conditional_headers(previous))
+        if validators is None:
+            return {**previous, "status": "unchanged", "checked_at": checked_at}
+        try:
+            verify_zip(zip_path)
+        except (zipfile.BadZipFile, DownloadIntegrityError):
+            # A corrupt archive cannot be resumed; drop it so the next run downloads from scratch.
+            os.remove(zip_path)
+            raise
+        sha256 = file_digest(zip_path)
+        entry = {**validators, "sha256": sha256, "checked_at": checked_at, "extracted": extract}
+        if previous and previous.get("sha256") == sha256:
+            # Servers without ETag/Last-Modified support still send the full file; an identical archive is not re-extracted.
+            os.remove(zip_path)
+            return {**previous, **entry, "status": "unchanged"}
+        if not extract:
+            os.replace(zip_path, os.path.join(save_directory, archive_filename))
+            # Extracted files from an earlier run would shadow the archive in open_json_source.
+            for stale_path in Path(save_directory).glob(f"{register}_{LatestTotalForEntity}_[0-9]*.json"):
+                stale_path.unlink()
+            return {**entry,
+                    "status": "downloaded",
+                    "changed_at": checked_at,
+                    "files": _file_stats(save_directory, [archive_filename])}
+        # Each entity extracts into its own folder, so parallel downloads cannot collide on member names.
+        extract_directory = os.path.join(save_directory, f".{zip_filename}")
         with zipfile.ZipFile(zip_path, "r") as zip_ref:
-            zip_ref.extractall(save_directory)
+            zip_ref.extractall(extract_directory)
             extracted_files = zip_ref.namelist()
         os.remove(zip_path)
         renamed_json_files = []
         json_index = 1
         for extracted_file in extracted_files:
-            extracted_path = os.path.join(save_directory, extracted_file)
+            extracted_path = os.path.join(extract_directory, extracted_file)
             if extracted_file.endswith(".json"):
                 new_json_filename = f"{register}_{LatestTotalForEntity}_{json_index}.json"
                 new_json_path = os.path.join(save_directory, new_json_filename)
                 if os.path.exists(new_json_path):
                     os.remove(new_json_path)
                 os.rename(extracted_path, new_json_path)
-                renamed_json_files.append(new_json_path)
+                renamed_json_files.append(new_json_filename)
                 json_index += 1
+        shutil.rmtree(extract_directory, ignore_errors=True)
+        archive_path = os.path.join(save_directory, archive_filename)
+        if os.path.exists(archive_path):
+            os.remove(archive_path)
         if renamed_json_files:
-            return renamed_json_files  
+            return {**entry,
+                    "status": "downloaded",
+                    "changed_at": checked_at,
+                    "files": _file_stats(save_directory, renamed_json_files)}
     except requests.exceptions.RequestException as e:
         logger.exception("Download error: %s", e)
     except zipfile.BadZipFile:
         logger.exception("The downloaded file is not a valid ZIP file.")
+    except DownloadIntegrityError as e:
+        logger.exception("Integrity check failed: %s", e)
     except Exception as e:
         logger.exception("Unexpected error: %s", e)
     return None
 
-def download_files(output_dir: str):
-    file_dict = [ {'LatestTotalForEntity': 'Husnummer', 'register': 'DAR', 'type': 'current'},
-                  {'LatestTotalForEntity': 'Adresse', 'register': 'DAR', 'type': 'current'},
-                  {'LatestTotalForEntity': 'Adressepunkt', 'register': 'DAR', 'type': 'current'},
-                  {'LatestTotalForEntity': 'NavngivenVej', 'register': 'DAR', 'type': 'current'},
-                  {'LatestTotalForEntity': 'Postnummer', 'register': 'DAR', 'type': 'current'},
-                  {'LatestTotalForEntity': 'Kommuneinddeling', 'register': 'DAGI', 'type': 'current'},
-                  {'LatestTotalForEntity': 'Landsdel', 'register': 'DAGI', 'type': 'current'},
-                  {'LatestTotalForEntity': 'Postnummerinddeling', 'register': 'DAGI', 'type': 'current'},
-                  {'LatestTotalForEntity': 'Regionsinddeling', 'register': 'DAGI', 'type': 'current'},
-                  {'LatestTotalForEntity': 'Storkreds', 'register': 'DAGI', 'type': 'current'},
-                ]
-    Number_of_tables = len(file_dict)
-    for filename in tqdm(file_dict):
-        download_and_unzip(LatestTotalForEntity=filename['LatestTotalForEntity'],
-                            register=filename['register'],
-                            type=filename['type'],
-                            save_directory=output_dir)
-    return Number_of_tables
-
-def main(output_dir: str | Path = DATAFORDELER_JSON_DIR):
-    return download_files(output_dir)
+"""
+Downloads all Datafordeler entities with at most max_parallel downloads in flight.
+Interrupted downloads keep their .part file and resume from it on retry or on the next run.
+Validators and content hashes are kept in MANIFEST_FILENAME inside output_dir; force=True ignores them.
+extract=False keeps the archives instead of extracting them (see download_and_unzip).
+Returns {"<register>_<entity>": "downloaded" | "unchanged"}. The manifest is saved before raising,
+so entities that succeeded are not downloaded again; the raise keeps loaders from running on a partial refresh.
+"""
+
+def download_files(output_dir: str | Path, max_parallel: int = 3, force: bool = False, extract: bool = True):
+    output_dir = os.fspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_FILENAME)
+    manifest = {} if force else load_manifest(manifest_path)
+    Number_of_tables = len(DATAFORDELER_ENTITIES)
+    statuses, failed = {}, []
+    with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        futures = {}
+        for entity in DATAFORDELER_ENTITIES:
+            key = f"{entity['register']}_{entity['LatestTotalForEntity']}_{entity['type']}"
+            future = executor.submit(download_and_unzip,
+                                     LatestTotalForEntity=entity['LatestTotalForEntity'],
+                                     register=entity['register'],
+                                     type=entity['type'],
+                                     save_directory=output_dir,
+                                     manifest_entry=manifest.get(key),
+                                     extract=extract)
+            futures[future] = (key, f"{entity['register']}_{entity['LatestTotalForEntity']}")
+        for future in tqdm(as_completed(futures), total=Number_of_tables):
+            key, label = futures[future]
+            entry = future.result()
+            if entry is None:
+                failed.append(label)
+                continue
+            statuses[label] = entry.pop("status")
+            manifest[key] = entry
+    save_manifest(manifest_path, manifest)
+    unchanged = sorted(label for label, status in statuses.items() if status == "unchanged")
+    logger.info("Datafordeler: %s downloaded, %s unchanged%s.",
+                len(statuses) - len(unchanged), len(unchanged), f" ({', '.join(unchanged)})" if unchanged else "")
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {Number_of_tables} Datafordeler download(s) failed: {sorted(failed)}")
+    return dict(sorted(statuses.items()))
+
+def main(output_dir: str | Path = DATAFORDELER_JSON_DIR, max_parallel: int = 3, force: bool = False, extract: bool = True):
+    return download_files(output_dir, max_parallel=max_parallel, force=force, extract=extract)
 
 if __name__ == "__main__":
     main()
- 
@@ -5,18 +5,17 @@ from libraries.utils import orchestrator
 
 logger = logging.getLogger(__name__)
 
-def build_station_pool() -> list[dict]:
+def build_station_pool() -> list[int]:
     db_name = 'circlek'
     sql_stmt = 'SELECT pno FROM public.stations'
-    stations = orchestrator.get_data_from_db(db_name=db_name, sql_query=sql_stmt)
-    return stations
+    stations = orchestrator.get_data_from_db(db_name=db_name, sql_query=sql_stmt, result_format="columns")
+    return stations["pno"].tolist()
 
 def generate_cashier() -> list[dict]:
     stations = build_station_pool()
     cashiers = []
 
-    for station in stations:
-        pno = station["pno"]
+    for pno in stations:
         cashier_index = 1  # reset for each station
 
         def add_cashiers(count, cashier_type):
@@ -1,16 +1,16 @@
+import gc
+import os
 import logging
-import random
-import uuid
-from datetime import timedelta, datetime
+import numpy as np
+from datetime import date, datetime
+from libraries.classes.simulation_context import SimulationContext
 from libraries.utils import orchestrator, simulations_helper_functions
 from collections import defaultdict
 from tqdm import tqdm
 
 logger = logging.getLogger(__name__)
 
-def get_customers() -> list[dict]:
-    db_name='circlek'
-    sql_stmt = '''SELECT cust.loyalty_id,
+CUSTOMERS_QUERY = '''SELECT cust.loyalty_id,
                             cust.primary_station,
                             sta.region,
                             cust.segmentationgroup,
@@ -23,10 +23,19 @@ def get_customers() -> list[dict]:
                     FROM public.loyality_customers cust
                     LEFT JOIN public.segmentationsgroups seggroup ON seggroup.id = cust.segmentationgroup
                     LEFT JOIN public.stations_view sta ON sta.pno = cust.primary_station'''
+
+def get_customers() -> list[dict]:
+    db_name='circlek'
     customers = orchestrator.get_data_from_db(db_name=db_name,
-                                        sql_query=sql_stmt)
+                                        sql_query=CUSTOMERS_QUERY)
     return customers
 
+def iter_customer_blocks(batch_size: int = 10000):
+    db_name='circlek'
+    yield from orchestrator.iter_data_from_db(db_name=db_name,
+                                              sql_query=CUSTOMERS_QUERY,
+                                              itersize=batch_size)
+
 def get_cards() -> list[dict]:
     db_name='circlek'
     sql_stmt = 'SELECT * FROM public.cards'
@@ -48,129 +57,164 @@ def get_campaigns() -> list[dict]:
                                         sql_query=sql_stmt)
     return campaigns
 
-def get_cashiers_by_station() -> dict[int, list[dict]]:
+def get_cashiers() -> list[dict]:
     db_name = 'circlek'
     sql_stmt = 'SELECT * FROM public.cashier'
     cashiers = orchestrator.get_data_from_db(db_name=db_name, sql_query=sql_stmt)
-    cashiers_by_station = defaultdict(list)
-    for c in cashiers:
-        pno = c["pno"]
-        cashiers_by_station[pno].append(c)
-    return cashiers_by_station
+    return cashiers
 
-def get_station_pool_by_region() -> dict[str, list[dict]]:
+def get_stations() -> list[dict]:
     db_name = 'circlek'
     sql_stmt = 'SELECT * FROM public.stations_view'
     stations = orchestrator.get_data_from_db(db_name=db_name, sql_query=sql_stmt)
-    station_pool_by_region = defaultdict(list)
-    for c in stations:
-        region = c["region"]
-        station_pool_by_region[region].append(c)
-    return station_pool_by_region
-
-def generate_transactions_for_customer(customer, cards, cashiers_by_station, station_pool_by_region):
-    transactions = []
-    card_ids = [card['card_id'] for card in cards if card['loyalty_id'] == customer['loyalty_id']]
-    region = customer['region']
-    primary_pno = customer['primary_station']
-    signup_date = customer['signed_up'].date()
-
-    # Estimate number of transactions for this user
-    months_since_signup = (datetime.now().date().year - signup_date.year) * 12 + (datetime.now().date().month - signup_date.month)
-    txn_count = int(round(random.gauss(customer["avg_txn_per_month"], 1.5) * months_since_signup))
-    txn_count = max(txn_count, 1)
-
-    for _ in range(txn_count):
-        transaction_id = str(uuid.uuid4())
-
-        # --- TIME ---
-        base_day = signup_date + timedelta(days=random.randint(0, (datetime.now().date() - signup_date).days))
-        weekday_weights = customer["weekday_weights"]
-        txn_date = orchestrator.get_random_date_with_weekday_bias(base_day, weekday_weights)
-        txn_time = orchestrator.generate_multimodal_time_on_date(txn_date, customer["peak_hours"], customer["hour_weights"])
-
-        # --- CARD ---
-        card_id = random.choice(card_ids)
-
-        # --- CASHIER & TYPE ---
-        cashier_type = random.choices(
-            list(customer["product_types"].keys()),
-            weights=list(customer["product_types"].values())
-        )[0]
-
-        if random.random() < 0.5:
-            possible_cashiers = cashiers_by_station.get(primary_pno, [])
-        else:
-            region_stations = station_pool_by_region.get(region, [])
-            alt_station = random.choice(region_stations)
-            possible_cashiers = cashiers_by_station.get(alt_station["pno"], [])
-
-        cashier_options = [c for c in possible_cashiers if c["type"] == cashier_type]
-        if not cashier_options:
-            continue  # Skip if no matching cashier type
-
-        cashier = random.choice(cashier_options)
-
-        # --- Build transaction ---
-        txn = {
-            "transaction_id": transaction_id,
-            "timestamp": txn_time.isoformat(),
-            "cashier_id": cashier["cashier_id"],
-            "card_id": card_id,
-            "context": None
-        }
-        transactions.append(txn)
-
-        # --- Conditional extra transaction logic ---
-        # Rule: EV Commuter -> buys in shop before charging
-        if customer["segmentationgroup"] == 1 and cashier_type == "cashier":
-            if random.random() < customer["product_types"].get("electric", 0):
-                electric_cashiers = [c for c in possible_cashiers if c["type"] == "electric"]
-                if electric_cashiers:
-                    electric_cashier = random.choice(electric_cashiers)
-                    offset = timedelta(minutes=random.randint(5, 30))
-                    new_txn_time = txn_time + offset
-                    new_txn = {
-                        "transaction_id": str(uuid.uuid4()),
-                        "timestamp": new_txn_time.isoformat(),
-                        "cashier_id": electric_cashier["cashier_id"],
-                        "card_id": card_id,
-                        "context": {
-                            "context": "bought in shop before",
-                            "former_transaction_id": transaction_id
-                        }
-                    }
-                    transactions.append(new_txn)
-
-        # Rule: Gas or service -> shop after
-        if cashier_type in ["gas", "service"]:
-            if random.random() < customer["product_types"].get("cashier", 0):
-                cashier_cashiers = [c for c in possible_cashiers if c["type"] == "cashier"]
-                if cashier_cashiers:
-                    cashier_after = random.choice(cashier_cashiers)
-                    offset = timedelta(minutes=random.randint(1, 5))
-                    new_txn_time = txn_time + offset
-                    new_txn = {
-                        "transaction_id": str(uuid.uuid4()),
-                        "timestamp": new_txn_time.isoformat(),
-                        "cashier_id": cashier_after["cashier_id"],
-                        "card_id": card_id,
-                        "context": {
-                            "context": "bought in shop after",
-                            "former_transaction_id": transaction_id
-                        }
-                    }
-                    transactions.append(new_txn)
-
-    return transactions
-
-def simulate_transactions() -> tuple[list[dict], list[dict], list[dict]]:
-    customers = get_customers()
-    cards = get_cards()
-    cashiers_by_station = get_cashiers_by_station()
-    station_pool_by_region = get_station_pool_by_region()
-    products = get_products()
-    campaigns = get_campaigns()
+    return stations
+
+def build_simulation_context() -> SimulationContext:
+    return SimulationContext(cards=get_cards(),
+                             cashiers=get_cashiers(),
+                             stations=get_stations(),
+                             products=get_products(),
+                             campaigns=get_campaigns())
+
+def _pad(rows: list[list], fill=0) -> np.ndarray:
+    width = max(map(len, rows))
+    return np.array([list(row) + [fill] * (width - len(row)) for row in rows], dtype=np.float64)
+
+def _uniform_pick(starts: np.ndarray, sizes: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    # Position of a uniformly chosen element within each [start, start + size) range; size must be positive.
+    return starts + np.floor(rng.random(len(starts)) * sizes).astype(np.int64)
+
+def _uuid4_strings(count: int) -> list[str]:
+    # Version 4 UUIDs from os.urandom like uuid.uuid4(), formatted in one pass over a fixed-width byte array.
+    # They do not come from the seeded generator: a rerun with the same seed must not reuse the keys it upserted.
+    raw = np.frombuffer(os.urandom(16 * count), dtype=np.uint8).reshape(count, 16).copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    hex_digits = np.frombuffer(raw.tobytes().hex().encode("ascii"), dtype="S1").reshape(count, 32)
+    formatted = np.full((count, 36), b"-", dtype="S1")
+    formatted[:, [i for i in range(36) if i not in (8, 13, 18, 23)]] = hex_digits
+    text = formatted.tobytes().decode("ascii")
+    return [text[i:i + 36] for i in range(0, len(text), 36)]
+
+"""
+Generates the transactions of a block of customers at once. Every random quantity of the per-customer loop
+(transaction counts, dates with weekday bias, peak-hour times, card, cashier type, home or regional station,
+cashier and the follow-up transactions) is drawn as one NumPy array for the whole block, with the same
+distributions as the scalar version. Draws without a matching cashier are dropped, as before.
+Returns the transactions in customer order (follow-ups right after their transaction) and the loyalty id per transaction.
+"""
+
+def generate_transactions_for_customers(customers: list[dict],
+                                        context: SimulationContext,
+                                        rng: np.random.Generator,
+                                        today: date | None = None) -> tuple[list[dict], list[str]]:
+    # Customers without a segmentation group or without cards have nothing to draw from.
+    customers = [customer for customer in customers
+                 if customer["avg_txn_per_month"] is not None and context.card_ids_by_loyalty_id.get(customer["loyalty_id"])]
+    if not customers:
+        return [], []
+    today = np.datetime64(today or datetime.now().date(), "D")
+
+    # --- Per customer ---
+    signup = np.array([customer["signed_up"].date() for customer in customers], dtype="datetime64[D]")
+    months_since_signup = (today.astype("datetime64[M]") - signup.astype("datetime64[M]")).astype(np.int64)
+    days_since_signup = np.maximum((today - signup).astype(np.int64), 0)
+    avg_txn_per_month = np.array([customer["avg_txn_per_month"] for customer in customers], dtype=np.float64)
+    weekday_weights = _pad([customer["weekday_weights"] or [1] * 7 for customer in customers])
+    peak_hours = _pad([customer["peak_hours"] for customer in customers])
+    hour_weights = _pad([customer["hour_weights"] or [1] * len(customer["peak_hours"]) for customer in customers])
+    product_types = list(dict.fromkeys(key for customer in customers for key in customer["product_types"]))
+    product_weights = np.array([[customer["product_types"].get(key, 0) for key in product_types]
+                                for customer in customers], dtype=np.float64)
+    product_cashier_type = np.array([context.cashier_type_position(key) for key in product_types], dtype=np.int64)
+    p_electric = np.array([customer["product_types"].get("electric", 0) for customer in customers], dtype=np.float64)
+    p_cashier = np.array([customer["product_types"].get("cashier", 0) for customer in customers], dtype=np.float64)
+    is_ev_commuter = np.array([customer["segmentationgroup"] == 1 for customer in customers])
+    primary_pno = np.array([customer["primary_station"] if customer["primary_station"] is not None else -1
+                            for customer in customers], dtype=np.int64)
+    loyalty_ids = np.array([customer["loyalty_id"] for customer in customers], dtype=object)
+
+    card_lists = [context.card_ids_by_loyalty_id[customer["loyalty_id"]] for customer in customers]
+    card_ids = np.array([card_id for card_list in card_lists for card_id in card_list], dtype=object)
+    card_sizes = np.array([len(card_list) for card_list in card_lists], dtype=np.int64)
+    card_starts = np.concatenate(([0], np.cumsum(card_sizes)[:-1])).astype(np.int64)
+
+    region_pools = [context.region_pnos.get(customer["region"], np.empty(0, dtype=np.int64)) for customer in customers]
+    region_pnos = np.concatenate([np.empty(0, dtype=np.int64), *region_pools])
+    region_sizes = np.array([len(pool) for pool in region_pools], dtype=np.int64)
+    region_starts = np.concatenate(([0], np.cumsum(region_sizes)[:-1])).astype(np.int64)
+
+    # --- Per transaction ---
+    txn_count = np.rint(rng.normal(avg_txn_per_month, 1.5) * months_since_signup).astype(np.int64)
+    txn_count = np.maximum(txn_count, 1)
+    owner = np.repeat(np.arange(len(customers)), txn_count)
+    base_day = signup[owner] + rng.integers(0, days_since_signup[owner] + 1).astype("timedelta64[D]")
+    txn_date = orchestrator.random_dates_with_weekday_bias(base_day, weekday_weights, owner, rng)
+    txn_time = orchestrator.multimodal_times_on_dates(txn_date, peak_hours, hour_weights, owner, rng)
+    card_id = card_ids[_uniform_pick(card_starts[owner], card_sizes[owner], rng)]
+    cashier_type = product_cashier_type[orchestrator.weighted_choice_rows(product_weights, owner, rng)]
+
+    # Home station half of the time, otherwise any station in the customer's region.
+    at_home = rng.random(len(owner)) < 0.5
+    alt_position = _uniform_pick(region_starts[owner], region_sizes[owner], rng)
+    has_region = region_sizes[owner] > 0
+    alt_pno = np.full(len(owner), -1, dtype=np.int64)
+    alt_pno[has_region] = region_pnos[alt_position[has_region]]
+    pno = np.where(at_home, primary_pno[owner], alt_pno)
+    group = context.cashier_groups(pno, cashier_type)
+    kept = np.flatnonzero(group >= 0)
+    owner, pno, group, cashier_type = owner[kept], pno[kept], group[kept], cashier_type[kept]
+    txn_time, card_id = txn_time[kept], card_id[kept]
+    cashier_id = context.cashier_group_ids[_uniform_pick(context.cashier_group_starts[group],
+                                                         context.cashier_group_sizes[group], rng)]
+
+    # --- Follow-up transactions ---
+    # EV commuters charge after shopping; gas and service customers shop afterwards.
+    follow_up_roll = rng.random(len(owner))
+    electric = context.cashier_type_position("electric")
+    shop = context.cashier_type_position("cashier")
+    ev_follow_up = is_ev_commuter[owner] & (cashier_type == shop) & (follow_up_roll < p_electric[owner])
+    gas_or_service = np.isin(cashier_type, [context.cashier_type_position(name) for name in ("gas", "service")])
+    shop_follow_up = gas_or_service & (follow_up_roll < p_cashier[owner])
+    follow_up_type = np.where(ev_follow_up, electric, np.where(shop_follow_up, shop, -1))
+    follow_up_group = context.cashier_groups(pno, follow_up_type)
+    follow_up = np.flatnonzero(follow_up_group >= 0)
+    follow_up_cashier_id = context.cashier_group_ids[_uniform_pick(context.cashier_group_starts[follow_up_group[follow_up]],
+                                                                   context.cashier_group_sizes[follow_up_group[follow_up]], rng)]
+    follow_up_minutes = np.where(ev_follow_up[follow_up],
+                                 rng.integers(5, 31, size=len(follow_up)),
+                                 rng.integers(1, 6, size=len(follow_up)))
+    follow_up_time = txn_time[follow_up] + (follow_up_minutes * 60).astype("timedelta64[s]")
+    follow_up_context = np.where(ev_follow_up[follow_up], "bought in shop before", "bought in shop after")
+
+    # --- Build rows ---
+    # Each follow-up goes right after the transaction it belongs to.
+    order = np.argsort(np.concatenate((np.arange(len(owner)) * 2, follow_up * 2 + 1)), kind="stable").tolist()
+    transaction_ids = _uuid4_strings(len(owner) + len(follow_up))
+    contexts = [None] * len(owner) + [{"context": context, "former_transaction_id": transaction_ids[index]}
+                                      for context, index in zip(follow_up_context.tolist(), follow_up.tolist())]
+    timestamps = np.datetime_as_string(np.concatenate((txn_time, follow_up_time)), unit="s").tolist()
+    cashier_ids = np.concatenate((cashier_id, follow_up_cashier_id)).tolist()
+    card_ids = np.concatenate((card_id, card_id[follow_up])).tolist()
+    owners = np.concatenate((owner, owner[follow_up]))
+    # The rows hold no reference cycles; pausing the cyclic collector avoids repeated full scans of the
+    # millions of rows already built.
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        transactions = [
+            {"transaction_id": transaction_ids[index], "timestamp": timestamps[index], "cashier_id": cashier_ids[index],
+             "card_id": card_ids[index], "context": contexts[index]}
+            for index in order
+        ]
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return transactions, loyalty_ids[owners[order]].tolist()
+
+def simulate_transactions(seed: int | None = None, batch_size: int = 10000) -> tuple[list[dict], list[dict], list[dict]]:
+    context = build_simulation_context()
+    rng = np.random.default_rng(seed)
 
     transactions = []
     transaction_lines = []
@@ -181,59 +225,58 @@ def simulate_transactions() -> tuple[list[dict], list[dict], list[dict]]:
     campaign_counts = defaultdict(int)
     campaign_reward_queue = defaultdict(int)
 
-    for customer in tqdm(customers):
-        customer_txns = generate_transactions_for_customer(
-            customer,
-            cards,
-            cashiers_by_station,
-            station_pool_by_region
+    progress = tqdm(unit="customers")
+    for customer_block in iter_customer_blocks(batch_size=batch_size):
+        block_txns, block_loyalty_ids = generate_transactions_for_customers(
+            customer_block,
+            context,
+            rng
         )
+        progress.update(len(customer_block))
 
-        transactions.extend(customer_txns)
+        transactions.extend(block_txns)
 
-        for txn in customer_txns:
-            cashier_id = txn["cashier_id"]
-            pno = int(cashier_id.split("-")[0])
-            cashier_list = cashiers_by_station.get(pno, [])
-            cashier = next((c for c in cashier_list if c["cashier_id"] == cashier_id), None)
+        for txn, loyalty_id in zip(block_txns, block_loyalty_ids):
+            cashier = context.cashiers_by_id.get(txn["cashier_id"])
 
             if not cashier:
                 continue  # skip if cashier is not found (shouldn't happen)
 
             cashier_type = cashier["type"]
-            loyalty_id = customer["loyalty_id"]
 
             # Dispatch by type
             if cashier_type == "gas":
-                line = simulations_helper_functions.generate_gas_transaction_line(txn, products)
+                line = simulations_helper_functions.generate_gas_transaction_line(txn, context, rng)
                 transaction_lines.append(line)
 
             elif cashier_type == "electric":
-                line = simulations_helper_functions.generate_electric_transaction_line(txn, products)
+                line = simulations_helper_functions.generate_electric_transaction_line(txn, context, rng)
                 transaction_lines.append(line)
 
             elif cashier_type == "service":
                 line = simulations_helper_functions.generate_service_transaction_line(
-                    txn, products, loyalty_id,
+                    txn, context, loyalty_id,
                     service_counter,
-                    campaign_transactions
+                    campaign_transactions,
+                    rng
                 )
                 transaction_lines.append(line)
 
             elif cashier_type == "cashier":
                 lines = simulations_helper_functions.generate_cashier_transaction_lines(
-                    txn, products, loyalty_id,
-                    campaigns,
+                    txn, context, loyalty_id,
                     campaign_counts,
                     campaign_reward_queue,
-                    campaign_transactions
+                    campaign_transactions,
+                    rng
                 )
                 transaction_lines.extend(lines)
 
+    progress.close()
     return transactions, transaction_lines, campaign_transactions
 
-def main():
-    return simulate_transactions()
+def main(seed=None):
+    return simulate_transactions(seed=seed)
 
 if __name__ == "__main__":
     transaction, transaction_lines, campaign_transactions = main()
@@ -1,8 +1,8 @@
 import logging
 
-from libraries.utils.orchestrator import load_json_file, select_columns, update_insert_dw, ensure_table_structure
+from libraries.utils.orchestrator import load_projected_batch, update_insert_dw, ensure_table_structure
 from libraries.utils.db_types import BIGINT, TEXT, TIMESTAMP, BOOLEAN
-from libraries.utils.path_config import DATAFORDELER_JSON_DIR
+from libraries.utils.path_config import DATAFORDELER_CACHE_DIR, DATAFORDELER_JSON_DIR
 
 logger = logging.getLogger(__name__)
 
@@ -31,11 +31,11 @@ def convert_upsert(create_table_if_not_exist=False):
         'datafordelerOpdateringstid': 'datafordeler_opdateringstid'
     }
 
-    data = load_json_file(file_path, 
-                          file_name)
-    data = select_columns(data_list=data, 
-                                 selected_keys_with_rename=columns_to_keep,
-                                 with_update_and_created_time=True)
+    data = load_projected_batch(file_path,
+                                file_name,
+                                selected_keys_with_rename=columns_to_keep,
+                                with_update_and_created_time=True,
+                                cache_dir=DATAFORDELER_CACHE_DIR)
     
     db_name='circlek'
     schema_name='datafordeler'
@@ -73,15 +73,17 @@ def convert_upsert(create_table_if_not_exist=False):
     
     pk = [col for col, config in fields_dict.items() if isinstance(config, dict) and config.get("primary_key", False)]
     update_fields = [col for col in fields_dict if col not in pk]
-    update_insert_dw(db_name=db_name,
-                     schema=schema_name,
-                     table=table_name,
-                     new_data=data,
-                     pk=pk,
-                     update_fields= update_fields,
-                     not_included_in_update_fields=['createdtime'])
+    counts = update_insert_dw(db_name=db_name,
+                              schema=schema_name,
+                              table=table_name,
+                              new_data=data,
+                              pk=pk,
+                              update_fields= update_fields,
+                              not_included_in_update_fields=['createdtime'],
+                              skip_unchanged=True)
     number_of_rows_upserted = len(data)
-    logger.info("Data from %s has been inserted/updated in %s.%s.", file_name, schema_name, table_name)
+    logger.info("Data from %s has been inserted/updated in %s.%s: %s inserted, %s updated, %s unchanged.",
+                file_name, schema_name, table_name, counts["inserted"], counts["updated"], counts["unchanged"])
     return number_of_rows_upserted
 
 def main(create_table_if_not_exist=False):
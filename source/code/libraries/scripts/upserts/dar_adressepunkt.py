@@ -1,13 +1,18 @@
 import logging
 
-from libraries.utils.orchestrator import load_json_file, select_columns, update_insert_dw, ensure_table_structure
-from libraries.utils.db_types import TEXT, TIMESTAMP
-from tqdm import tqdm
-from libraries.utils.path_config import DATAFORDELER_JSON_DIR
+from libraries.utils.orchestrator import iter_projected_batches, stream_update_insert_dw, ensure_table_structure
+from libraries.utils.coordinates import wkt_utm32_to_lon_lat
+from libraries.utils.db_types import DOUBLE, TEXT, TIMESTAMP
+from libraries.utils.path_config import DATAFORDELER_CACHE_DIR, DATAFORDELER_JSON_DIR
 
 logger = logging.getLogger(__name__)
 
-def convert_upsert(create_table_if_not_exist=False):
+def with_lon_lat(batch):
+    # pos is UTM32 WKT; parsing and transforming it here keeps st_transform out of the views.
+    longitude, latitude = wkt_utm32_to_lon_lat(batch.column('pos'))
+    return batch.with_column('longitude', longitude).with_column('latitude', latitude)
+
+def convert_upsert(create_table_if_not_exist=False, max_workers=4):
     file_path = DATAFORDELER_JSON_DIR
     file_name = "DAR_Adressepunkt_1.json"
     columns_to_keep = {
@@ -28,11 +33,14 @@ def convert_upsert(create_table_if_not_exist=False):
         'datafordelerOpdateringstid': 'datafordeler_opdateringstid'
     }
 
-    data = load_json_file(file_path, 
-                          file_name)
-    data = select_columns(data_list=data, 
-                                 selected_keys_with_rename=columns_to_keep,
-                                 with_update_and_created_time=True)
+    # Lazy: the file is only read once the upsert starts pulling batches.
+    batches = (with_lon_lat(batch)
+               for batch in iter_projected_batches(file_path,
+                                                   file_name,
+                                                   selected_keys_with_rename=columns_to_keep,
+                                                   batch_size=10000,
+                                                   with_update_and_created_time=True,
+                                                   cache_dir=DATAFORDELER_CACHE_DIR))
     
     db_name='circlek'
     schema_name='datafordeler'
@@ -40,6 +48,8 @@ def convert_upsert(create_table_if_not_exist=False):
     fields_dict = {
         'id': {"type": TEXT(), "primary_key": True, "autoincrement": False},
         'pos': {"type": TEXT()},
+        'longitude': {"type": DOUBLE()},
+        'latitude': {"type": DOUBLE()},
         'oprindelse_kilde': {"type": TEXT()},
         'oprindelse_nojagtighedsklasser': {"type": TEXT()},
         'oprindelse_registrering': {"type": TEXT()},
@@ -67,24 +77,24 @@ def convert_upsert(create_table_if_not_exist=False):
     pk = [col for col, config in fields_dict.items() if isinstance(config, dict) and config.get("primary_key", False)]
     update_fields = [col for col in fields_dict if col not in pk]
     
-    chunk_size = 10000  
-    total_upserted = 0
-
-    for i in tqdm(range(0, len(data), chunk_size)):
-        chunk = data[i:i + chunk_size]
-        update_insert_dw(db_name=db_name,
-                            schema=schema_name,
-                            table=table_name,
-                            new_data=chunk,
-                            pk=pk,
-                            update_fields=update_fields,
-                         not_included_in_update_fields=['createdtime'])
-        total_upserted += len(chunk)
-    logger.info("Data from %s has been inserted/updated in %s.%s.", file_name, schema_name, table_name)
-    return total_upserted
+    report = stream_update_insert_dw(db_name=db_name,
+                                     schema=schema_name,
+                                     table=table_name,
+                                     chunks=batches,
+                                     pk=pk,
+                                     update_fields=update_fields,
+                                     not_included_in_update_fields=['createdtime'],
+                                     max_workers=max_workers,
+                                     skip_unchanged=True)
+    if report["failed_chunks"]:
+        raise RuntimeError(f"{len(report['failed_chunks'])} of {report['chunks']} chunk(s) failed for '{schema_name}.{table_name}'.")
+    logger.info("Data from %s has been inserted/updated in %s.%s: %s inserted, %s updated, %s unchanged.",
+                file_name, schema_name, table_name, report["inserted"], report["updated"], report["unchanged"])
+    return report["rows_written"]
 
-def main(create_table_if_not_exist=False):
-    return convert_upsert(create_table_if_not_exist=create_table_if_not_exist)
+def main(create_table_if_not_exist=False, max_workers=4):
+    return convert_upsert(create_table_if_not_exist=create_table_if_not_exist,
+                          max_workers=max_workers)
 
 if __name__ == "__main__":
     main(True)
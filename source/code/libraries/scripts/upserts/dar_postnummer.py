@@ -1,9 +1,9 @@
 import logging
 
-from libraries.utils.orchestrator import load_json_file, select_columns, update_insert_dw, ensure_table_structure
+from libraries.utils.orchestrator import load_projected_batch, update_insert_dw, ensure_table_structure
 from libraries.utils.db_types import TEXT, TIMESTAMP
 from tqdm import tqdm
-from libraries.utils.path_config import DATAFORDELER_JSON_DIR
+from libraries.utils.path_config import DATAFORDELER_CACHE_DIR, DATAFORDELER_JSON_DIR
 
 logger = logging.getLogger(__name__)
 
@@ -26,11 +26,11 @@ def convert_upsert(create_table_if_not_exist=False):
         'datafordelerOpdateringstid': 'datafordeler_opdateringstid'
     }
 
-    data = load_json_file(file_path, 
-                          file_name)
-    data = select_columns(data_list=data, 
-                                 selected_keys_with_rename=columns_to_keep,
-                                 with_update_and_created_time=True)
+    data = load_projected_batch(file_path,
+                                file_name,
+                                selected_keys_with_rename=columns_to_keep,
+                                with_update_and_created_time=True,
+                                cache_dir=DATAFORDELER_CACHE_DIR)
 
     db_name='circlek'
     schema_name='datafordeler'
@@ -64,17 +64,22 @@ def convert_upsert(create_table_if_not_exist=False):
     update_fields = [col for col in fields_dict if col not in pk]
     chunk_size = 10000  
     total_upserted = 0
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
     for i in tqdm(range(0, len(data), chunk_size)):
         chunk = data[i:i + chunk_size]
-        update_insert_dw(db_name=db_name,
-                         schema=schema_name,
-                            table=table_name,
-                         new_data=chunk,
-                         pk=pk,
-                         update_fields=update_fields,
-                         not_included_in_update_fields=['createdtime'])
+        chunk_counts = update_insert_dw(db_name=db_name,
+                                        schema=schema_name,
+                                        table=table_name,
+                                        new_data=chunk,
+                                        pk=pk,
+                                        update_fields=update_fields,
+                                        not_included_in_update_fields=['createdtime'],
+                                        skip_unchanged=True)
+        for key in counts:
+            counts[key] += chunk_counts[key]
         total_upserted += len(chunk)
-    logger.info("Data from %s has been inserted/updated in %s.%s.", file_name, schema_name, table_name)
+    logger.info("Data from %s has been inserted/updated in %s.%s: %s inserted, %s updated, %s unchanged.",
+                file_name, schema_name, table_name, counts["inserted"], counts["updated"], counts["unchanged"])
     return total_upserted
 
 def main(create_table_if_not_exist=False):
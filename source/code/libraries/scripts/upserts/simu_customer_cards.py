@@ -1,4 +1,5 @@
 from libraries.utils.orchestrator import update_insert_dw, ensure_table_structure
+from libraries.utils.reporting import refresh_reporting_table
 from libraries.utils.db_types import TEXT, BOOLEAN, BIGINT, TIMESTAMP
 from libraries.scripts.simulations import loyality_customer_cards
 
@@ -70,6 +71,23 @@ def upsert(create_table_if_not_exist=False, n_simulations = 1000):
                      update_fields=update_fields,
                      not_included_in_update_fields=[])
     
+    ### REFRESH reporting ###
+    
+    # Transactions carry days_after_signup and cust_id, so they follow both the customers and the cards.
+    loyalty_ids = [customer['loyalty_id'] for customer in customers]
+    refresh_reporting_table(table='loyality_customers_report',
+                            filter_column='loyalty_id',
+                            keys=loyalty_ids,
+                            db_name=db_name)
+    refresh_reporting_table(table='transactions_report',
+                            filter_column='cust_id',
+                            keys=loyalty_ids,
+                            db_name=db_name)
+    refresh_reporting_table(table='transactions_report',
+                            filter_column='card_id',
+                            keys=[card['card_id'] for card in cards],
+                            db_name=db_name)
+    
     return customers, cards
 
 def main(create_table_if_not_exist=False, n_simulations = 10000):
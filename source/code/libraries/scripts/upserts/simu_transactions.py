@@ -1,4 +1,5 @@
 from libraries.utils.orchestrator import update_insert_dw, ensure_table_structure
+from libraries.utils.reporting import refresh_reporting_table
 from libraries.utils.db_types import TEXT, Float, BIGINT, TIMESTAMP, JSONB
 from libraries.scripts.simulations import transactions
 
@@ -95,6 +96,13 @@ def upsert(create_table_if_not_exist=False):
                      update_fields=update_fields,
                      not_included_in_update_fields=[])
     
+    ### REFRESH reporting ###
+    
+    refresh_reporting_table(table='transactions_report',
+                            filter_column='transaction_id',
+                            keys=[row['transaction_id'] for row in transaction],
+                            db_name=db_name)
+    
     return transaction, transaction_lines, campaign_transactions
 
 def main(create_table_if_not_exist=False):
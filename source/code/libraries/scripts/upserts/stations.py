@@ -1,11 +1,40 @@
 import logging
 
+from sqlalchemy.exc import ProgrammingError
+
+from libraries.classes.address_geocoder import AddressGeocoder
 from libraries.utils.orchestrator import load_json_file, select_columns, update_insert_dw, ensure_table_structure
-from libraries.utils.db_types import BIGINT, TEXT
+from libraries.utils.db_types import BIGINT, DOUBLE, TEXT
 from libraries.utils.path_config import CIRCLEK_JSON_DIR
+from libraries.utils.reporting import refresh_reporting_table
 
 logger = logging.getLogger(__name__)
 
+GEOCODE_FIELDS = ['husnummer_id', 'longitude', 'latitude', 'geocode_match']
+
+def geocode_stations(data):
+    # Resolved once per load against DAR, so the views join on stored coordinates instead of a pattern match.
+    # Returns False when DAR is missing or empty; the caller then leaves the stored coordinates as they are.
+    try:
+        geocoder = AddressGeocoder.from_database()
+    except ProgrammingError as e:
+        logger.warning("DAR tables are not available; keeping the stored station coordinates: %s", e.orig)
+        return False
+    if not len(geocoder):
+        logger.warning("DAR has no active addresses; keeping the stored station coordinates.")
+        return False
+    results = geocoder.geocode_many((row['address'], row['zipcode']) for row in data)
+    for row, result in zip(data, results):
+        result = result or {}
+        row.update({'husnummer_id': result.get('husnummer_id'),
+                    'longitude': result.get('longitude'),
+                    'latitude': result.get('latitude'),
+                    'geocode_match': result.get('match')})
+    matched = sum(result is not None for result in results)
+    fuzzy = sum(result is not None and result['match'] == 'fuzzy' for result in results)
+    logger.info("Geocoded %s of %s stations (%s fuzzy).", matched, len(data), fuzzy)
+    return True
+
 def convert_upsert(create_table_if_not_exist=False):
     file_path = CIRCLEK_JSON_DIR
     file_name = "CircleKCompany.json"
@@ -30,7 +59,11 @@ def convert_upsert(create_table_if_not_exist=False):
         'zipcode': {"type": TEXT()},
         'city': {"type": TEXT()},
         'startdate': {"type": TEXT()},
-        'enddate': {"type": TEXT()}
+        'enddate': {"type": TEXT()},
+        'husnummer_id': {"type": TEXT()},
+        'longitude': {"type": DOUBLE()},
+        'latitude': {"type": DOUBLE()},
+        'geocode_match': {"type": TEXT()}
     }
     test_table_structure = ensure_table_structure(db_name=db_name,
                                 schema_name=schema_name,
@@ -40,8 +73,10 @@ def convert_upsert(create_table_if_not_exist=False):
     if not test_table_structure:
         raise RuntimeError(f"Table '{schema_name}.{table_name}' does not exist or has incorrect structure.")
     
+    geocoded = geocode_stations(data)
+
     pk = [col for col, config in fields_dict.items() if isinstance(config, dict) and config.get("primary_key", False)]
-    update_fields = [col for col in fields_dict if col not in pk]
+    update_fields = [col for col in fields_dict if col not in pk and (geocoded or col not in GEOCODE_FIELDS)]
     update_insert_dw(db_name=db_name,
                     schema=schema_name,
                     table=table_name,
@@ -49,6 +84,10 @@ def convert_upsert(create_table_if_not_exist=False):
                     pk=pk,
                     update_fields=update_fields)
     logger.info("Data from %s has been inserted/updated in %s.%s.", file_name, schema_name, table_name)
+    refresh_reporting_table(table='loyality_customers_report',
+                            filter_column='primary_station',
+                            keys=[station['pno'] for station in data],
+                            db_name=db_name)
     return data
 
 def main(create_table_if_not_exist=False):
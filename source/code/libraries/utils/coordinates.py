@@ -0,0 +1,80 @@
+import numpy as np
+
+# UTM zone 32N (EPSG:25832 / EPSG:32632); GRS80 and WGS84 differ by well under a millimetre at this scale.
+_SEMI_MAJOR_AXIS = 6378137.0
+_FLATTENING = 1 / 298.257223563
+_SCALE_FACTOR = 0.9996
+_FALSE_EASTING = 500000.0
+_CENTRAL_MERIDIAN = np.radians(9.0)
+
+_N = _FLATTENING / (2 - _FLATTENING)
+_RECTIFYING_RADIUS = _SEMI_MAJOR_AXIS / (1 + _N) * (1 + _N**2 / 4 + _N**4 / 64)
+# Krüger series to fourth order in n (Karney 2011); sub-millimetre within the zone.
+_BETA = (
+    _N / 2 - 2 * _N**2 / 3 + 37 * _N**3 / 96 - _N**4 / 360,
+    _N**2 / 48 + _N**3 / 15 - 437 * _N**4 / 1440,
+    17 * _N**3 / 480 - 37 * _N**4 / 840,
+    4397 * _N**4 / 161280,
+)
+_DELTA = (
+    2 * _N - 2 * _N**2 / 3 - 2 * _N**3 + 116 * _N**4 / 45,
+    7 * _N**2 / 3 - 8 * _N**3 / 5 - 227 * _N**4 / 45,
+    56 * _N**3 / 15 - 136 * _N**4 / 35,
+    4279 * _N**4 / 630,
+)
+
+
+"""
+Parses WKT point strings such as 'POINT(725025.18 6166264.33)' into x and y arrays.
+Anything that is not a parsable point (None, empty, other geometry types) becomes NaN.
+"""
+
+def parse_wkt_points(values: list) -> tuple[np.ndarray, np.ndarray]:
+    x = np.full(len(values), np.nan)
+    y = np.full(len(values), np.nan)
+    for index, value in enumerate(values):
+        if not isinstance(value, str) or not value.lstrip().upper().startswith("POINT"):
+            continue
+        coordinates = value[value.find("(") + 1:value.rfind(")")].split()
+        if len(coordinates) < 2:
+            continue
+        try:
+            x[index], y[index] = float(coordinates[0]), float(coordinates[1])
+        except ValueError:
+            continue
+    return x, y
+
+
+"""
+Converts UTM zone 32N easting/northing arrays to WGS84 longitude/latitude in degrees (inverse transverse Mercator).
+Works on whole arrays at once; NaN inputs give NaN outputs.
+"""
+
+def utm32_to_wgs84(easting: np.ndarray, northing: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    xi = np.asarray(northing, dtype=np.float64) / (_SCALE_FACTOR * _RECTIFYING_RADIUS)
+    eta = (np.asarray(easting, dtype=np.float64) - _FALSE_EASTING) / (_SCALE_FACTOR * _RECTIFYING_RADIUS)
+
+    xi_prime, eta_prime = xi.copy(), eta.copy()
+    for j, beta in enumerate(_BETA, start=1):
+        xi_prime -= beta * np.sin(2 * j * xi) * np.cosh(2 * j * eta)
+        eta_prime -= beta * np.cos(2 * j * xi) * np.sinh(2 * j * eta)
+
+    chi = np.arcsin(np.sin(xi_prime) / np.cosh(eta_prime))
+    latitude = chi.copy()
+    for j, delta in enumerate(_DELTA, start=1):
+        latitude += delta * np.sin(2 * j * chi)
+    longitude = _CENTRAL_MERIDIAN + np.arctan2(np.sinh(eta_prime), np.cos(xi_prime))
+    return np.degrees(longitude), np.degrees(latitude)
+
+
+"""
+Parses a column of UTM32 WKT points and returns (longitude, latitude) lists in WGS84, with None where the point is missing.
+"""
+
+def wkt_utm32_to_lon_lat(values: list) -> tuple[list, list]:
+    longitude, latitude = utm32_to_wgs84(*parse_wkt_points(values))
+    missing = np.isnan(longitude) | np.isnan(latitude)
+    longitude, latitude = longitude.tolist(), latitude.tolist()
+    for index in np.flatnonzero(missing).tolist():
+        longitude[index] = latitude[index] = None
+    return longitude, latitude
@@ -47,7 +47,25 @@ POSTGRES_USERNAME = os.getenv("POSTGRES_USERNAME") or os.getenv("POSTGRES_USER")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD")
 POSTGRES_DB = os.getenv("POSTGRES_DB", "circlek")
 
+# BULK WRITES
+UPSERT_WRITE_MODE = os.getenv("UPSERT_WRITE_MODE", "copy")
+
+# SQL MIGRATIONS
+# Referenced by the create_table_and_views runtime files ("force" and "dry_run").
+SQL_FORCE = os.getenv("SQL_FORCE", "false")
+SQL_DRY_RUN = os.getenv("SQL_DRY_RUN", "false")
+
+# LANDING CACHE
+# Set to "false" to always parse the source JSON instead of the cached projected columns.
+LANDING_CACHE = os.getenv("LANDING_CACHE", "true")
+
+# PIPELINE RUNS
+# Overrides the runtime "resume" flag when set ("true"/"false").
+PIPELINE_RESUME = os.getenv("PIPELINE_RESUME")
+
 # DATAFORDELER
 DATAFORDELER_USER = os.getenv("DATAFORDELER_USER")
 DATAFORDELER_PASSWORD = os.getenv("DATAFORDELER_PASSWORD")
 DATAFORDELER_API_KEY = os.getenv("DATAFORDELER_API_KEY")
+# Override to point the downloader at a mirror or a local test server.
+DATAFORDELER_BASE_URL = os.getenv("DATAFORDELER_BASE_URL", "https://api.datafordeler.dk")
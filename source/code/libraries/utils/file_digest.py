@@ -0,0 +1,58 @@
+import hashlib
+import json
+import os
+import threading
+
+HASH_READ_BYTES = 1 << 20
+DIGEST_INDEX_FILE = "file_digests.json"
+
+_index_lock = threading.Lock()
+
+
+"""
+Streams a file through sha256 in HASH_READ_BYTES blocks and returns the hex digest.
+"""
+
+def file_digest(path: str | os.PathLike) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(HASH_READ_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _load_index(index_path: str) -> dict:
+    try:
+        with open(index_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+"""
+Returns file_digest(path), remembered in the JSON index at index_path together with the file's size and mtime_ns.
+The file is only read again when its size or modification time changes, so a multi-GB source is hashed once
+instead of on every run. The index is a derived cache; deleting it only costs one rehash per file.
+"""
+
+def cached_file_digest(path: str | os.PathLike, index_path: str | os.PathLike) -> str:
+    path, index_path = os.path.abspath(path), os.fspath(index_path)
+    stat = os.stat(path)
+    signature = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    with _index_lock:
+        entry = _load_index(index_path).get(path)
+    if entry is not None and {key: entry.get(key) for key in signature} == signature:
+        return entry["sha256"]
+
+    sha256 = file_digest(path)
+    with _index_lock:
+        # Reloaded under the lock, so entries written by other steps in the meantime are kept.
+        index = _load_index(index_path)
+        index[path] = {**signature, "sha256": sha256}
+        os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+        temp_path = f"{index_path}.tmp-{os.getpid()}"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(index, file, indent=2, sort_keys=True)
+            file.write("\n")
+        os.replace(temp_path, index_path)
+    return sha256
@@ -1,21 +1,34 @@
+import contextvars
+import hashlib
+import io
 import json
 import logging
 import os
 import csv
 import pandas as pd
-import time
-import threading
 import random
+import re
+import zipfile
 import numpy as np
 
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from time import sleep
 from tqdm import tqdm
 from datetime import datetime, timedelta, date, time
 from pathlib import Path
 from libraries.utils import env
-from sqlalchemy import MetaData, text, Table, Column
-from sqlalchemy.exc import OperationalError, TimeoutError, NoSuchTableError
+from libraries.utils.file_digest import DIGEST_INDEX_FILE, cached_file_digest
+from sqlalchemy import JSON, MetaData, text, Table, Column
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.exc import CompileError, OperationalError, TimeoutError, NoSuchTableError
 from sqlalchemy.schema import CreateSchema
+from libraries.classes.columnar_cache import ColumnarCache
 from libraries.classes.db_engine import DatabaseEngine
+from libraries.classes.reflection_cache import ReflectionCache
+from libraries.classes.row_batch import RowBatch
+from libraries.utils.step_metrics import record_rows_read, record_rows_written
 
 logger = logging.getLogger(__name__)
 
@@ -36,19 +49,56 @@ def _resolve_postgres_defaults(
     )
 
 
+_ARCHIVE_MEMBER_NAME = re.compile(r"^(?P<stem>.+)_(?P<index>\d+)\.json$")
+
+
+def _archive_member(folder_path: str, file_name: str) -> tuple[str, str] | None:
+    # <stem>_<n>.json maps to the n-th JSON member of <stem>.zip, the naming used by the Datafordeler downloader.
+    match = _ARCHIVE_MEMBER_NAME.match(file_name)
+    if match is None:
+        return None
+    archive_path = os.path.join(folder_path, f"{match['stem']}.zip")
+    if not os.path.exists(archive_path):
+        return None
+    with zipfile.ZipFile(archive_path, "r") as archive:
+        members = [name for name in archive.namelist() if name.endswith(".json")]
+    index = int(match["index"]) - 1
+    if index >= len(members):
+        raise FileNotFoundError(f"{archive_path} has no JSON member #{index + 1} for {file_name}")
+    return archive_path, members[index]
+
+
+"""
+Opens a JSON file for reading as text. If folder_path/file_name does not exist but a matching archive does
+(<stem>_<n>.json -> n-th JSON member of <stem>.zip), the member is decompressed as a stream instead of being extracted to disk.
+"""
+
+@contextmanager
+def open_json_source(folder_path: str, file_name: str):
+    file_path = os.path.join(folder_path, file_name)
+    source = None if os.path.exists(file_path) else _archive_member(folder_path, file_name)
+    if source is None:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            yield file
+        return
+    archive_path, member = source
+    with zipfile.ZipFile(archive_path, "r") as archive, archive.open(member, "r") as member_file:
+        yield io.TextIOWrapper(member_file, encoding="utf-8")
+
+
 """
-Loads a JSON file containing a list of dictionaries from the specified folder.  
+Loads a JSON file containing a list of dictionaries from the specified folder, or from its archive (see open_json_source).  
 Returns the data if valid; otherwise prints an error and returns an empty list.  
 Validates that the JSON structure is a list.
 """
 
 def load_json_file(folder_path:str, 
                    file_name:str) -> list[dict]:
-    file_path = os.path.join(folder_path, file_name)
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
+        with open_json_source(folder_path, file_name) as file:
             data = json.load(file)
             if isinstance(data, list):
+                record_rows_read(len(data))
                 return data
             else:
                 raise ValueError("JSON file must contain a list of dictionaries")
@@ -57,6 +107,93 @@ def load_json_file(folder_path:str,
         return []
 
 
+_JSON_DECODER = json.JSONDecoder()
+_JSON_READ_CHARS = 1 << 20
+# A number this close to the buffer edge may be the valid prefix of a longer one.
+_JSON_NUMBER_TAIL_CHARS = 32
+
+
+def _is_json_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _iter_json_array(file) -> Iterator:
+    buffer, pos, eof = "", 0, False
+
+    def fill() -> bool:
+        nonlocal buffer, pos, eof
+        chunk = file.read(_JSON_READ_CHARS)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + chunk, 0
+        return not eof
+
+    def next_token() -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if not fill():
+                raise ValueError("JSON file ended before the top-level list was closed")
+
+    if next_token() != "[":
+        raise ValueError("JSON file must contain a list of dictionaries")
+    pos += 1
+    if next_token() == "]":
+        return
+    while True:
+        next_token()
+        try:
+            value, end = _JSON_DECODER.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        if not eof and (end == len(buffer) or (_is_json_number(value) and len(buffer) - end < _JSON_NUMBER_TAIL_CHARS)):
+            # A scalar cut off at the buffer edge can still decode ("1." decodes as 1, "1.5e" as 1.5);
+            # re-read with more input.
+            fill()
+            continue
+        pos = end
+        yield value
+        separator = next_token()
+        pos += 1
+        if separator == "]":
+            return
+        if separator != ",":
+            raise ValueError(f"Expected ',' or ']' in JSON list, found {separator!r}")
+
+
+"""
+Streams the records of a JSON file containing a list of dictionaries, reading it in 1 MiB blocks (from its archive if the file is not extracted).  
+Yields one record at a time, or lists of up to batch_size records, so large files are never held in memory as a whole.  
+Raises on malformed input instead of returning an empty list, since earlier batches may already have been written.
+"""
+
+def iter_json_records(folder_path: str,
+                      file_name: str,
+                      batch_size: int | None = None) -> Iterator:
+    with open_json_source(folder_path, file_name) as file:
+        records = _iter_json_array(file)
+        if not batch_size:
+            for record in records:
+                record_rows_read(1)
+                yield record
+            return
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                record_rows_read(len(batch))
+                yield batch
+                batch = []
+        if batch:
+            record_rows_read(len(batch))
+            yield batch
+
+
 def load_csvs_as_dicts(
     file_paths: list[str | os.PathLike[str]],
     delimiter: str = ",",
@@ -80,21 +217,28 @@ def load_csvs_as_dicts(
                 rows.append(row)
 
     logger.info("Loaded %s row(s) from %s CSV file(s).", len(rows), len(file_paths))
+    record_rows_read(len(rows))
     return rows
 
 """
 Transforms a list of dictionaries by selecting and renaming keys, 
 optionally adding extra fields and timestamps for creation and update. 
-Returns the processed list of standardized dictionaries.
+Returns the processed list of standardized dictionaries, or a column-oriented RowBatch with as_batch=True, 
+where extra fields and the load timestamp are stamped as whole columns.
 """
 
 def select_columns(data_list: list[dict], 
                    selected_keys_with_rename: dict, 
                    extra_fields=None,
-                   with_update_and_created_time: bool=True) -> list[dict]:
+                   with_update_and_created_time: bool=True,
+                   as_batch: bool=False) -> list[dict] | RowBatch:
     current_time = datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ')
     processed_list = []
     extra_fields = extra_fields or {} 
+    if as_batch:
+        return _stamp_batch(RowBatch.from_records(data_list, selected_keys_with_rename),
+                            extra_fields,
+                            with_update_and_created_time)
     for row in tqdm(data_list):
         if isinstance(row, dict):
             new_row = {new_key: row.get(old_key, None) for old_key, new_key in selected_keys_with_rename.items()}
@@ -106,10 +250,169 @@ def select_columns(data_list: list[dict],
             processed_list.append(new_row)
     return processed_list
 
+
+def _stamp_batch(batch: RowBatch, extra_fields: dict, with_update_and_created_time: bool) -> RowBatch:
+    for key, value in extra_fields.items():
+        batch = batch.with_constant(key, value)
+    if with_update_and_created_time:
+        current_time = datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ')
+        batch = batch.with_constant('updatetime', current_time).with_constant('createdtime', current_time)
+    return batch
+
+
+def _json_source_digest(folder_path: str, file_name: str, index_path: str) -> str:
+    # Digest of what open_json_source would read: the JSON file, or the archive plus the member name.
+    # File digests are remembered by size and mtime in index_path, so an unchanged source is not rehashed.
+    file_path = os.path.join(folder_path, file_name)
+    source = None if os.path.exists(file_path) else _archive_member(folder_path, file_name)
+    if source is None:
+        return cached_file_digest(file_path, index_path)
+    archive_path, member = source
+    return hashlib.sha256(f"{member}\0{cached_file_digest(archive_path, index_path)}".encode("utf-8")).hexdigest()
+
+
+def _landing_cache(folder_path: str, file_name: str, selected_keys_with_rename: dict, cache_dir) -> ColumnarCache | None:
+    if cache_dir is None or env.LANDING_CACHE.strip().lower() in ("0", "false", "no"):
+        return None
+    try:
+        source_digest = _json_source_digest(folder_path, file_name, os.path.join(cache_dir, DIGEST_INDEX_FILE))
+    except FileNotFoundError:
+        # Missing sources keep the uncached behaviour of the readers.
+        return None
+    return ColumnarCache(cache_dir,
+                         source_name=file_name,
+                         source_digest=source_digest,
+                         projection=selected_keys_with_rename)
+
+
+def _projected_batches(folder_path: str,
+                       file_name: str,
+                       selected_keys_with_rename: dict,
+                       batch_size: int | None,
+                       cache_dir) -> Iterator[RowBatch]:
+    cache = _landing_cache(folder_path, file_name, selected_keys_with_rename, cache_dir)
+    if cache is not None and cache.exists():
+        logger.info("Reading %s from the landing cache.", file_name)
+        for batch in cache.read():
+            record_rows_read(len(batch))
+            yield batch
+        return
+    if batch_size:
+        batches = (RowBatch.from_records(records, selected_keys_with_rename)
+                   for records in iter_json_records(folder_path, file_name, batch_size=batch_size))
+    else:
+        records = load_json_file(folder_path, file_name)
+        batches = iter([RowBatch.from_records(records, selected_keys_with_rename)])
+        if not records:
+            # load_json_file also returns [] on read errors, which must not be cached.
+            cache = None
+    if cache is not None:
+        batches = cache.write(batches)
+    yield from batches
+
+
+"""
+Yields the projected columns of a JSON source (file or archive member) as RowBatch objects of up to batch_size rows,
+stamped like select_columns(..., as_batch=True).  
+With cache_dir set (and LANDING_CACHE not "false"), the projected, renamed columns are stored as NumPy parts keyed by
+the source digest and the projection; a later call for the same source and projection reads them back without decoding JSON.  
+Timestamps and extra_fields are applied after the cache, so cached parts never carry a stale load time.
+"""
+
+def iter_projected_batches(folder_path: str,
+                           file_name: str,
+                           selected_keys_with_rename: dict,
+                           batch_size: int = 10000,
+                           extra_fields=None,
+                           with_update_and_created_time: bool = True,
+                           cache_dir: str | Path | None = None) -> Iterator[RowBatch]:
+    extra_fields = extra_fields or {}
+    for batch in _projected_batches(folder_path, file_name, selected_keys_with_rename, batch_size, cache_dir):
+        yield _stamp_batch(batch, extra_fields, with_update_and_created_time)
+
+
+"""
+Loads all projected columns of a JSON source as one RowBatch, using the same landing cache as iter_projected_batches.  
+A cache miss reads the source with load_json_file, so read errors still log and yield an empty batch.
+"""
+
+def load_projected_batch(folder_path: str,
+                         file_name: str,
+                         selected_keys_with_rename: dict,
+                         extra_fields=None,
+                         with_update_and_created_time: bool = True,
+                         cache_dir: str | Path | None = None) -> RowBatch:
+    batches = list(_projected_batches(folder_path, file_name, selected_keys_with_rename, None, cache_dir))
+    if len(batches) == 1:
+        batch = batches[0]
+    else:
+        names = batches[0].keys() if batches else list(selected_keys_with_rename.values())
+        batch = RowBatch({name: [value for part in batches for value in part.column(name)] for name in names},
+                         length=sum(len(part) for part in batches))
+    return _stamp_batch(batch, extra_fields or {}, with_update_and_created_time)
+
+RESULT_FORMATS = ("records", "columns", "dataframe")
+
+
+def _column_array(values: tuple) -> np.ndarray:
+    try:
+        array = np.asarray(values)
+    except ValueError:
+        array = None
+    if array is None or array.ndim != 1:
+        # Array-valued columns (e.g. peak_hours) must stay one object per row.
+        array = np.empty(len(values), dtype=object)
+        array[:] = values
+    return array
+
+
+def _format_result(rows: list, columns: list[str], result_format: str):
+    if result_format == "records":
+        return [dict(zip(columns, row)) for row in rows]
+    if result_format == "dataframe":
+        return pd.DataFrame.from_records(rows, columns=columns)
+    if not rows:
+        return {column: np.empty(0, dtype=object) for column in columns}
+    return {column: _column_array(values) for column, values in zip(columns, zip(*rows))}
+
+
+@contextmanager
+def _statement_timeout(connection, db_type: str, timeout: int | None):
+    # PostgreSQL scopes it to the current transaction; MySQL only has a session setting, which is reset on the
+    # way out, so pooled connections come back without it either way.
+    if not timeout:
+        yield
+        return
+    timeout_ms = int(timeout * 1000)
+    if db_type == 'postgresql':
+        connection.execute(text(f"SET LOCAL statement_timeout = {timeout_ms}"))
+        yield
+    elif db_type == 'mysql':
+        # max_execution_time only applies to read-only SELECT statements.
+        connection.execute(text(f"SET SESSION max_execution_time = {timeout_ms}"))
+        try:
+            yield
+        finally:
+            if not connection.invalidated:
+                connection.execute(text("SET SESSION max_execution_time = DEFAULT"))
+    else:
+        raise ValueError(f"Query timeouts are not supported for db_type '{db_type}'.")
+
+
+def _is_statement_timeout(error: Exception) -> bool:
+    # PostgreSQL 57014 = query_canceled; MySQL 3024 = ER_QUERY_TIMEOUT
+    orig = getattr(error, "orig", None)
+    if getattr(orig, "pgcode", None) == "57014":
+        return True
+    return bool(getattr(orig, "args", None)) and orig.args[0] == 3024
+
+
 """
 Executes a SQL query with optional timeout and retry logic. 
-Handles transient database errors and enforces timeout using a separate thread. 
-Returns the result as a list of dictionaries 
+Handles transient database errors and enforces the timeout on the server (statement_timeout), 
+so a timed-out query is cancelled by the backend instead of running on after the client gives up. 
+Returns the result as a list of dictionaries, or column-oriented as a dict of NumPy arrays ("columns") 
+or a pandas DataFrame ("dataframe") built directly from the fetched rows.
 """
 
 def get_data_from_db(db_name: str,
@@ -121,7 +424,10 @@ def get_data_from_db(db_name: str,
                      db_type: str = 'postgresql',
                      retries: int = 1,  
                      delay: int = 2,
-                     timeout: int = None):  # Timeout in seconds (default: None, no timeout)
+                     timeout: int = None,  # Timeout in seconds (default: None, no timeout)
+                     result_format: str = "records"):
+    if result_format not in RESULT_FORMATS:
+        raise ValueError(f"Unsupported result_format: {result_format}")
     username, password, server, port = _resolve_postgres_defaults(
         username=username,
         password=password,
@@ -139,38 +445,16 @@ def get_data_from_db(db_name: str,
     attempt = 0
     while attempt <= retries:
         try:
-            result_data = []
-            query_exception = None
-
-            def execute_query():
-                nonlocal result_data, query_exception
-                try:
-                    with engine.connect() as connection:
-                        result = connection.execute(text(sql_query))
-                        columns = result.keys()
-                        result_data = [dict(zip(columns, row)) for row in result]
-                except Exception as e:
-                    query_exception = e
-
-            query_thread = threading.Thread(target=execute_query)
-            query_thread.start()
-            query_thread.join(timeout=timeout)
-
-            if query_thread.is_alive():
-                logger.warning(
-                    "Query attempt %s timed out after %s seconds. Retrying...",
-                    attempt + 1,
-                    timeout,
-                )
-                attempt += 1
-                time.sleep(delay)
-                continue
-
-            if query_exception:
-                raise query_exception
-            return result_data
+            with engine.connect() as connection, connection.begin(), _statement_timeout(connection, db_type, timeout):
+                result = connection.execute(text(sql_query))
+                columns = list(result.keys())
+                rows = result.fetchall()
+                record_rows_read(len(rows))
+                return _format_result(rows, columns, result_format)
 
         except (OperationalError, TimeoutError) as e:
+            if _is_statement_timeout(e):
+                logger.warning("Query attempt %s was cancelled after %s seconds.", attempt + 1, timeout)
             if attempt < retries:
                 logger.warning(
                     "Database query failed (attempt %s/%s). Retrying in %s seconds...",
@@ -178,12 +462,75 @@ def get_data_from_db(db_name: str,
                     retries,
                     delay,
                 )
-                time.sleep(delay)
+                sleep(delay)
                 attempt += 1
             else:
                 logger.error("Query failed after %s retries. Raising error.", retries)
                 raise
 
+"""
+Streams the result of a SQL query through a named (server-side) cursor and yields it in batches of dictionaries. 
+At most `itersize` rows are buffered client-side, so large tables can be processed in bounded memory. 
+Transient errors are retried like in get_data_from_db until the first batch has been yielded.
+"""
+
+def iter_data_from_db(db_name: str,
+                      sql_query: str,
+                      username: str = env.POSTGRES_USERNAME,
+                      password: str = env.POSTGRES_PASSWORD,
+                      server: str = env.POSTGRES_HOST,
+                      port: int = env.POSTGRES_PORT,
+                      db_type: str = 'postgresql',
+                      retries: int = 1,
+                      delay: int = 2,
+                      itersize: int = 10000,
+                      timeout: int = None):
+    username, password, server, port = _resolve_postgres_defaults(
+        username=username,
+        password=password,
+        server=server,
+        port=port,
+    )
+    engine = DatabaseEngine(
+        db=db_name,
+        server=server,
+        username=username,
+        password=password,
+        port=port,
+        db_type=db_type,
+    ).get_engine()
+    attempt = 0
+    while True:
+        yielded = False
+        try:
+            with engine.connect() as connection, connection.begin(), _statement_timeout(connection, db_type, timeout):
+                result = connection.execution_options(
+                    stream_results=True,
+                    max_row_buffer=itersize,
+                ).execute(text(sql_query))
+                columns = list(result.keys())
+                for partition in result.partitions(itersize):
+                    yielded = True
+                    record_rows_read(len(partition))
+                    yield [dict(zip(columns, row)) for row in partition]
+            return
+
+        except (OperationalError, TimeoutError) as e:
+            if _is_statement_timeout(e):
+                logger.warning("Streaming query attempt %s was cancelled after %s seconds.", attempt + 1, timeout)
+            # Rows already handed to the caller cannot be replayed.
+            if yielded or attempt >= retries:
+                logger.error("Streaming query failed after %s attempt(s). Raising error.", attempt + 1)
+                raise
+            logger.warning(
+                "Streaming query failed (attempt %s/%s). Retrying in %s seconds...",
+                attempt + 1,
+                retries,
+                delay,
+            )
+            sleep(delay)
+            attempt += 1
+
 """
 Ensures that a table exists in the specified schema with the correct columns and primary key. 
 Creates the schema/table if allowed and validates the structure if it already exists. 
@@ -215,21 +562,19 @@ def ensure_table_structure(db_name: str,
             port=port,
             db_type=db_type,
         ).get_engine()
-    with engine.connect() as connection:
-        result = connection.execute(text("""
-                        SELECT schema_name FROM information_schema.schemata WHERE schema_name = :schema
-                    """), {"schema": schema_name})
-    if result.fetchone() is None:
+    if not ReflectionCache.has_schema(engine, schema_name):
         if not create_table_if_not_exist:
             raise RuntimeError(f"Schema '{schema_name}' does not exist.")
         else:
+            # IF NOT EXISTS: parallel steps on a fresh database may both get here for the same schema.
             with engine.begin() as connection:
-                connection.execute(CreateSchema(schema_name))
+                connection.execute(CreateSchema(schema_name, if_not_exists=True))
+            ReflectionCache.invalidate(engine=engine, schema=schema_name)
             logger.info("Schema '%s' created.", schema_name)
     
     metadata =  MetaData(schema=schema_name)
     try:
-        existing_table = Table(table_name, metadata, autoload_with=engine)
+        existing_table = ReflectionCache.get_table(engine, schema_name, table_name)
         existing_columns = {col.name.lower(): type(col.type) for col in existing_table.columns}
         existing_primary_keys = {col.name.lower() for col in existing_table.primary_key.columns}
 
@@ -269,6 +614,7 @@ def ensure_table_structure(db_name: str,
 
             new_table = Table(table_name, metadata, *columns)
             new_table.create(bind=engine)
+            ReflectionCache.invalidate(engine=engine, schema=schema_name, table=table_name)
             logger.info(
                 "Table '%s.%s' created with fields: %s",
                 schema_name,
@@ -277,16 +623,261 @@ def ensure_table_structure(db_name: str,
             )
             return True
 
+UPSERT_WRITE_MODES = ("values", "copy", "prepared")
+CHANGE_COUNT_KEYS = ("rows", "inserted", "updated", "unchanged")
+_COPY_BUFFER_ROWS = 50000
+_COPY_NULL = "\\N"
+_PREPARED_BATCH_SIZE = 1000
+_MAX_BIND_PARAMETERS = 65535
+
+
+def _resolve_write_mode(write_mode: str | None, db_type: str) -> str:
+    write_mode = (write_mode or env.UPSERT_WRITE_MODE or "values").lower()
+    if write_mode not in UPSERT_WRITE_MODES:
+        raise ValueError(f"Unsupported write_mode: {write_mode}")
+    if db_type != 'postgresql':
+        # COPY and the staging merge are PostgreSQL features.
+        return "values"
+    return write_mode
+
+
+def _build_conflict_clause(pk: list[str],
+                           update_fields: list[str],
+                           not_included_in_update_fields: list,
+                           compare_expressions: list[tuple[str, str]] | None = None) -> str:
+    pk_clause = ", ".join(pk)
+    if not update_fields:
+        return f"ON CONFLICT ({pk_clause}) DO NOTHING"
+    only_update_fields = [item for item in update_fields if item not in not_included_in_update_fields]
+    update_clause = ", ".join([f"{field} = EXCLUDED.{field}" for field in only_update_fields])
+    conflict_clause = f"ON CONFLICT ({pk_clause}) DO UPDATE SET {update_clause}"
+    if compare_expressions:
+        current_values = ", ".join(current for current, _ in compare_expressions)
+        incoming_values = ", ".join(incoming for _, incoming in compare_expressions)
+        conflict_clause += f" WHERE ({current_values}) IS DISTINCT FROM ({incoming_values})"
+    return conflict_clause
+
+
+def _change_compare_expressions(target_table: Table,
+                                update_fields: list[str],
+                                not_included_in_update_fields: list,
+                                change_ignore_fields: list) -> list[tuple[str, str]]:
+    expressions = []
+    for field in update_fields:
+        if field in not_included_in_update_fields or field in change_ignore_fields:
+            continue
+        column_type = target_table.columns[field].type
+        # Plain json has no equality operator; compare it as jsonb.
+        cast = "::jsonb" if isinstance(column_type, JSON) and not isinstance(column_type, JSONB) else ""
+        expressions.append((f"target.{field}{cast}", f"EXCLUDED.{field}{cast}"))
+    return expressions
+
+
+def _merge_statement(insert_stmt: str, count_changes: bool) -> str:
+    if not count_changes:
+        return insert_stmt
+    # xmax is 0 for freshly inserted row versions and set for rows updated by ON CONFLICT.
+    return f"""
+        WITH merged AS ({insert_stmt} RETURNING (xmax = 0) AS inserted)
+        SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM merged
+    """
+
+
+def _copy_array_literal(values: list) -> str:
+    items = []
+    for item in values:
+        if item is None:
+            items.append("NULL")
+        elif isinstance(item, list):
+            items.append(_copy_array_literal(item))
+        elif isinstance(item, bool):
+            items.append("t" if item else "f")
+        else:
+            escaped = str(item).replace("\\", "\\\\").replace('"', '\\"')
+            items.append(f'"{escaped}"')
+    return "{" + ",".join(items) + "}"
+
+
+def _escape_copy_text(text_value: str) -> str:
+    return (text_value.replace("\\", "\\\\")
+                      .replace("\t", "\\t")
+                      .replace("\n", "\\n")
+                      .replace("\r", "\\r"))
+
+
+def _copy_text_value(value) -> str:
+    # Expects values already normalized by RowBatch.normalized().
+    if value is None:
+        return _COPY_NULL
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, list):
+        return _escape_copy_text(_copy_array_literal(value))
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return _escape_copy_text(str(value))
+
+
+def _copy_text_column(values: list) -> list[str]:
+    if set(map(type, values)) <= {str, type(None)}:
+        return [_COPY_NULL if value is None else _escape_copy_text(value) for value in values]
+    return [_copy_text_value(value) for value in values]
+
+
+def _upsert_values(connection,
+                   schema: str,
+                   table: str,
+                   batch: RowBatch,
+                   insert_columns: list[str],
+                   conflict_clause: str,
+                   count_changes: bool = False) -> tuple[int, int] | None:
+    insert_values = ", ".join([
+        f"({', '.join([f':{column}_{i}' for column in insert_columns])})"
+        for i in range(1, len(batch) + 1)
+    ])
+    stmt = _merge_statement(f"""
+        INSERT INTO {schema}.{table} AS target ({", ".join(insert_columns)})
+        VALUES {insert_values}
+        {conflict_clause}
+    """, count_changes)
+    params_insert = {
+        f"{column}_{i}": value
+        for column in insert_columns
+        for i, value in enumerate(batch.column(column), start=1)
+    }
+    result = connection.execute(text(stmt), params_insert)
+    return tuple(result.one()) if count_changes else None
+
+
 """
-Performs bulk UPSERT into a target table using a list of dictionaries as input. 
-Builds a dynamic SQL statement with conflict handling on primary keys, optionally updating specified fields. 
-Handles nested structures and nulls, and returns the number of rows processed.
+Streams the given columns of a RowBatch into an existing table with COPY FROM STDIN, in buffers of
+_COPY_BUFFER_ROWS rows. `connection` is a SQLAlchemy connection on psycopg2; the rows join its transaction.
+"""
+
+def copy_batch(connection, table: str, batch: RowBatch, columns: list[str]) -> None:
+    cursor = connection.connection.cursor()
+    try:
+        copy_stmt = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+        for start in range(0, len(batch), _COPY_BUFFER_ROWS):
+            part = batch[start:start + _COPY_BUFFER_ROWS]
+            encoded_columns = [_copy_text_column(part.column(column)) for column in columns]
+            buffer = io.StringIO()
+            for encoded_row in zip(*encoded_columns):
+                buffer.write("\t".join(encoded_row))
+                buffer.write("\n")
+            buffer.seek(0)
+            cursor.copy_expert(copy_stmt, buffer)
+    finally:
+        cursor.close()
+
+
+def _upsert_copy(connection,
+                 schema: str,
+                 table: str,
+                 batch: RowBatch,
+                 insert_columns: list[str],
+                 conflict_clause: str,
+                 count_changes: bool = False) -> tuple[int, int] | None:
+    column_clause = ", ".join(insert_columns)
+    staging_table = f"_stage_{table}"
+    connection.execute(text(f"""
+        CREATE TEMP TABLE {staging_table} ON COMMIT DROP AS
+        SELECT {column_clause} FROM {schema}.{table} WITH NO DATA
+    """))
+    copy_batch(connection, staging_table, batch, insert_columns)
+    result = connection.execute(text(_merge_statement(f"""
+        INSERT INTO {schema}.{table} AS target ({column_clause})
+        SELECT {column_clause} FROM {staging_table}
+        {conflict_clause}
+    """, count_changes)))
+    return tuple(result.one()) if count_changes else None
+
+
+def _prepared_param_types(connection, target_table: Table, insert_columns: list[str]) -> list[str] | None:
+    try:
+        return [
+            target_table.columns[column].type.compile(dialect=connection.dialect)
+            for column in insert_columns
+        ]
+    except CompileError:
+        # Unknown reflected types (e.g. PostGIS) are left for the server to infer.
+        return None
+
+
+def _prepare_upsert(connection,
+                    cursor,
+                    schema: str,
+                    target_table: Table,
+                    insert_columns: list[str],
+                    conflict_clause: str,
+                    batch_size: int,
+                    count_changes: bool = False) -> str:
+    prepared = connection.connection.info.setdefault("prepared_upserts", set())
+    signature = "|".join([schema, target_table.name, ",".join(insert_columns), conflict_clause,
+                          str(batch_size), str(count_changes)])
+    statement_name = f"upsert_{hashlib.md5(signature.encode('utf-8')).hexdigest()}"
+    if statement_name in prepared:
+        return statement_name
+
+    column_count = len(insert_columns)
+    param_types = _prepared_param_types(connection, target_table, insert_columns)
+    type_clause = " (" + ", ".join(param_types * batch_size) + ")" if param_types else ""
+    placeholders = ", ".join(
+        "(" + ", ".join(f"${row * column_count + position}" for position in range(1, column_count + 1)) + ")"
+        for row in range(batch_size)
+    )
+    insert_stmt = _merge_statement(f"""
+        INSERT INTO {schema}.{target_table.name} AS target ({", ".join(insert_columns)})
+        VALUES {placeholders}
+        {conflict_clause}
+    """, count_changes)
+    cursor.execute(f"PREPARE {statement_name}{type_clause} AS {insert_stmt}")
+    prepared.add(statement_name)
+    return statement_name
+
+
+def _upsert_prepared(connection,
+                     schema: str,
+                     target_table: Table,
+                     batch: RowBatch,
+                     insert_columns: list[str],
+                     conflict_clause: str,
+                     batch_size: int,
+                     count_changes: bool = False) -> tuple[int, int] | None:
+    batch_size = max(1, min(batch_size, _MAX_BIND_PARAMETERS // len(insert_columns)))
+    inserted = updated = 0
+    cursor = connection.connection.cursor()
+    try:
+        for start in range(0, len(batch), batch_size):
+            part = batch[start:start + batch_size]
+            statement_name = _prepare_upsert(connection, cursor, schema, target_table,
+                                             insert_columns, conflict_clause, len(part), count_changes)
+            params = [value for row in part.rows(insert_columns) for value in row]
+            placeholders = ", ".join(["%s"] * len(params))
+            cursor.execute(f"EXECUTE {statement_name} ({placeholders})", params)
+            if count_changes:
+                batch_inserted, batch_updated = cursor.fetchone()
+                inserted += batch_inserted
+                updated += batch_updated
+    finally:
+        cursor.close()
+    return (inserted, updated) if count_changes else None
+
+
+"""
+Performs bulk UPSERT into a target table using a list of dictionaries or a RowBatch as input. 
+Null normalization and JSON encoding of nested structures run once per column on a RowBatch. 
+Rows are sent as one multi-row VALUES statement, streamed with COPY into a temporary staging table 
+and merged with a single INSERT ... SELECT, or executed through server-side prepared statements of a fixed batch size, 
+all with conflict handling on primary keys. 
+With skip_unchanged, rows whose content IS NOT DISTINCT FROM the stored row are left untouched 
+and a dict of inserted/updated/unchanged counts is returned instead of the number of rows processed.
 """
 
 def update_insert_dw(db_name: str,
                      schema: str,
                      table: str,
-                     new_data: list[dict],
+                     new_data: list[dict] | RowBatch,
                      pk: list[str],
                      update_fields: list[str],
                      not_included_in_update_fields: list = [],
@@ -294,7 +885,11 @@ def update_insert_dw(db_name: str,
                      password: str = env.POSTGRES_PASSWORD,
                      server: str = env.POSTGRES_HOST,
                      port: int = env.POSTGRES_PORT,
-                     db_type: str = 'postgresql',) -> int:
+                     db_type: str = 'postgresql',
+                     write_mode: str | None = None,
+                     batch_size: int = _PREPARED_BATCH_SIZE,
+                     skip_unchanged: bool = False,
+                     change_ignore_fields: list = ['updatetime']) -> int | dict:
     username, password, server, port = _resolve_postgres_defaults(
         username=username,
         password=password,
@@ -309,54 +904,151 @@ def update_insert_dw(db_name: str,
                                  port=port,
                                  db_type=db_type)
     source = db_instance.get_engine()
-    meta = MetaData(schema=schema)
-    meta.reflect(bind=source)
 
     if not new_data:
-        return 0
+        return dict.fromkeys(CHANGE_COUNT_KEYS, 0) if skip_unchanged else 0
 
-    Upserts = len(new_data)
-    columns = new_data[0].keys()
-    insert_values = ", ".join([
-        f"({', '.join([f':{column}_{i}' for column in columns])})"
-        for i in range(1, Upserts + 1)
-    ])
-    pk_clause = ", ".join(pk)
-    insert_clause = ", ".join(pk + update_fields)
-    if not update_fields:
-        stmt = f"""
-            INSERT INTO {schema}.{table} ({insert_clause})
-            VALUES {insert_values}
-            ON CONFLICT ({pk_clause})
-            DO NOTHING
-        """
-    else:
-        only_update_fields = [item for item in update_fields if item not in not_included_in_update_fields] 
-        update_clause = ", ".join([f"{field} = EXCLUDED.{field}" for field in only_update_fields])
-        stmt = f"""
-            INSERT INTO {schema}.{table} ({insert_clause})
-            VALUES {insert_values}
-            ON CONFLICT ({pk_clause})
-            DO UPDATE SET {update_clause}
-        """
-    params_insert = {}
-    for i, row in enumerate(new_data, start=1):
-        for column, value in row.items():
-            if isinstance(value, dict):
-                params_insert[f"{column}_{i}"] = json.dumps(value)
-            elif isinstance(value, list):
-                if all(isinstance(item, dict) for item in value):  
-                    params_insert[f"{column}_{i}"] = json.dumps(value)
-                else:
-                    params_insert[f"{column}_{i}"] = value
-            elif pd.isna(value):
-                params_insert[f"{column}_{i}"] = None
-            else:
-                params_insert[f"{column}_{i}"] = value
+    write_mode = _resolve_write_mode(write_mode, db_type)
+    insert_columns = pk + update_fields
+    target_table = ReflectionCache.get_table(source, schema, table)
+    missing_columns = [column for column in insert_columns if column not in target_table.columns]
+    if missing_columns:
+        raise RuntimeError(f"Missing columns {missing_columns} in table '{schema}.{table}'.")
+    compare_expressions = None
+    if skip_unchanged:
+        compare_expressions = _change_compare_expressions(target_table, update_fields,
+                                                          not_included_in_update_fields, change_ignore_fields)
+    conflict_clause = _build_conflict_clause(pk, update_fields, not_included_in_update_fields, compare_expressions)
+    if not isinstance(new_data, RowBatch):
+        new_data = RowBatch.from_records(new_data, {column: column for column in insert_columns})
+    batch = new_data.select(insert_columns).normalized()
     with source.begin() as connection:
-        connection.execute(text(stmt), params_insert)
-        
-    return Upserts
+        if write_mode == "prepared":
+            counts = _upsert_prepared(connection, schema, target_table, batch, insert_columns,
+                                      conflict_clause, batch_size, skip_unchanged)
+        elif write_mode == "copy":
+            counts = _upsert_copy(connection, schema, table, batch, insert_columns, conflict_clause, skip_unchanged)
+        else:
+            counts = _upsert_values(connection, schema, table, batch, insert_columns, conflict_clause, skip_unchanged)
+    record_rows_written(len(new_data))
+
+    if skip_unchanged:
+        inserted, updated = counts
+        return {
+            "rows": len(new_data),
+            "inserted": inserted,
+            "updated": updated,
+            "unchanged": len(new_data) - inserted - updated,
+        }
+    return len(new_data)
+
+def _primary_key_sort_key(pk: list[str]):
+    # None sorts last so mixed NULL/non-NULL keys stay comparable.
+    def sort_key(row: dict):
+        return tuple((row.get(column) is None, row.get(column)) for column in pk)
+    return sort_key
+
+
+def _sort_by_primary_key(data: list[dict] | RowBatch, pk: list[str]) -> list[dict] | RowBatch:
+    if isinstance(data, RowBatch):
+        return data.sort_by(pk)
+    return sorted(data, key=_primary_key_sort_key(pk))
+
+
+def _add_chunk_result(report: dict, result: int | dict) -> None:
+    if isinstance(result, dict):
+        report["rows_written"] += result["rows"]
+        for key in ("inserted", "updated", "unchanged"):
+            report[key] = report.get(key, 0) + result[key]
+    else:
+        report["rows_written"] += result
+
+
+"""
+Performs the UPSERT of update_insert_dw in parallel chunks, each on its own pooled connection and transaction. 
+Rows are sorted by primary key first, so concurrent chunks lock rows in the same order and cannot deadlock. 
+Failed chunks are logged and reported without rolling back the chunks that succeeded.
+"""
+
+def parallel_update_insert_dw(db_name: str,
+                              schema: str,
+                              table: str,
+                              new_data: list[dict] | RowBatch,
+                              pk: list[str],
+                              update_fields: list[str],
+                              not_included_in_update_fields: list = [],
+                              chunk_size: int = 10000,
+                              max_workers: int = 4,
+                              **upsert_kwargs) -> dict:
+    new_data = _sort_by_primary_key(new_data, pk)
+    chunks = [new_data[i:i + chunk_size] for i in range(0, len(new_data), chunk_size)]
+    return stream_update_insert_dw(db_name=db_name,
+                                   schema=schema,
+                                   table=table,
+                                   chunks=chunks,
+                                   pk=pk,
+                                   update_fields=update_fields,
+                                   not_included_in_update_fields=not_included_in_update_fields,
+                                   max_workers=max_workers,
+                                   **upsert_kwargs)
+
+"""
+Performs the UPSERT of update_insert_dw for chunks drawn from any iterable, e.g. batches streamed by iter_json_records. 
+At most max_pending chunks are held in memory at once; the producer is paused until a worker finishes. 
+Each chunk is sorted by primary key, so every transaction locks rows in ascending key order and concurrent chunks cannot deadlock. 
+Returns the same report as parallel_update_insert_dw.
+"""
+
+def stream_update_insert_dw(db_name: str,
+                            schema: str,
+                            table: str,
+                            chunks: Iterable[list[dict] | RowBatch],
+                            pk: list[str],
+                            update_fields: list[str],
+                            not_included_in_update_fields: list = [],
+                            max_workers: int = 4,
+                            max_pending: int | None = None,
+                            **upsert_kwargs) -> dict:
+    max_pending = max(max_pending or max_workers * 2, 1)
+    report = {"rows_written": 0, "chunks": 0, "failed_chunks": []}
+    if upsert_kwargs.get("skip_unchanged"):
+        report.update(dict.fromkeys(("inserted", "updated", "unchanged"), 0))
+    pending = {}
+
+    def upsert_chunk(chunk: list[dict] | RowBatch) -> int | dict:
+        return update_insert_dw(db_name=db_name,
+                                schema=schema,
+                                table=table,
+                                new_data=_sort_by_primary_key(chunk, pk),
+                                pk=pk,
+                                update_fields=update_fields,
+                                not_included_in_update_fields=not_included_in_update_fields,
+                                **upsert_kwargs)
+
+    def collect(futures, progress) -> None:
+        for future in futures:
+            index, rows = pending.pop(future)
+            try:
+                _add_chunk_result(report, future.result())
+            except Exception as e:
+                logger.error("Chunk %s of %s.%s (%s rows) failed: %s", index, schema, table, rows, e)
+                report["failed_chunks"].append({"chunk": index, "rows": rows, "error": str(e)})
+            progress.update(rows)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor, tqdm(unit="rows") as progress:
+        for chunk in chunks:
+            if not len(chunk):
+                continue
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done, progress)
+            # A fresh context copy per chunk lets the workers count rows into the calling step's metrics.
+            pending[executor.submit(contextvars.copy_context().run, upsert_chunk, chunk)] = (report["chunks"], len(chunk))
+            report["chunks"] += 1
+        collect(as_completed(list(pending)), progress)
+
+    report["failed_chunks"].sort(key=lambda failure: failure["chunk"])
+    return report
 
 """
 Generates a list of time intervals between two dates, split into chunks of specified hours.  
@@ -419,3 +1111,57 @@ def get_random_date_with_weekday_bias(date: date, weekday_weights=None) -> datet
     while candidate_date.weekday() != target_weekday:
         candidate_date -= timedelta(days=1)
     return candidate_date
+
+
+"""
+Vectorized random.choices over rows of weights: draw i picks a column of weights[rows[i]] with probability
+proportional to its weight. Rows may be padded with zero weights and do not need to be normalized.
+The cumulative weights of row r are shifted by r and searched as one flat array, so the weights are never
+repeated per draw.
+"""
+
+def weighted_choice_rows(weights: np.ndarray, rows: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    weights = np.asarray(weights, dtype=np.float64)
+    rows = np.asarray(rows, dtype=np.int64)
+    n_columns = weights.shape[1]
+    cumulative = np.cumsum(weights, axis=1)
+    cumulative /= cumulative[:, -1:]
+    # Everything from the last positive weight on is exactly 1.0, so trailing padding can never be drawn.
+    last_positive = n_columns - 1 - np.argmax((weights > 0)[:, ::-1], axis=1)
+    cumulative[np.arange(n_columns) >= last_positive[:, None]] = 1.0
+    flat = (cumulative + np.arange(len(weights))[:, None]).ravel()
+    values = np.minimum(rows + rng.random(len(rows)), np.nextafter(rows + 1.0, 0))
+    return np.searchsorted(flat, values, side="right") - rows * n_columns
+
+
+"""
+Array version of get_random_date_with_weekday_bias: draws a weekday per base day from weekday_weights[rows]
+(Monday first) and steps the base day back to the nearest date on that weekday. Dates are datetime64[D].
+"""
+
+def random_dates_with_weekday_bias(base_days: np.ndarray,
+                                   weekday_weights: np.ndarray,
+                                   rows: np.ndarray,
+                                   rng: np.random.Generator) -> np.ndarray:
+    target_weekday = weighted_choice_rows(weekday_weights, rows, rng)
+    # 1970-01-01 was a Thursday (weekday 3).
+    weekday = (base_days.astype("datetime64[D]").astype(np.int64) + 3) % 7
+    return base_days - ((weekday - target_weekday) % 7).astype("timedelta64[D]")
+
+
+"""
+Array version of generate_multimodal_time_on_date: picks a peak hour per date from peak_hours[rows] with
+hour_weights[rows] (both padded to the same width), draws the minute of day from a normal distribution around it,
+clamps it to 06:00-22:00 and adds a uniform second. Returns datetime64[s].
+"""
+
+def multimodal_times_on_dates(dates: np.ndarray,
+                              peak_hours: np.ndarray,
+                              hour_weights: np.ndarray,
+                              rows: np.ndarray,
+                              rng: np.random.Generator) -> np.ndarray:
+    peak_hour = peak_hours[rows, weighted_choice_rows(hour_weights, rows, rng)].astype(np.float64)
+    std_dev = np.where(peak_hour < 12, 45.0, 60.0)
+    minutes = np.clip(rng.normal(loc=peak_hour * 60, scale=std_dev), 6 * 60, 22 * 60)
+    seconds = np.floor(minutes).astype(np.int64) * 60 + rng.integers(0, 60, size=len(rows))
+    return dates.astype("datetime64[s]") + seconds.astype("timedelta64[s]")
@@ -21,3 +21,10 @@ CSV_DIR = FILES_DIR / 'csv'
 JSON_DIR = FILES_DIR / 'json'
 DATAFORDELER_JSON_DIR = JSON_DIR / 'datafordeler'
 CIRCLEK_JSON_DIR = JSON_DIR / 'circlek'
+
+# Path to derived caches that can be deleted at any time
+CACHE_DIR = FILES_DIR / 'cache'
+DATAFORDELER_CACHE_DIR = CACHE_DIR / 'datafordeler'
+
+# Path to run reports written by the service entry points
+REPORT_DIR = FILES_DIR / 'reports'
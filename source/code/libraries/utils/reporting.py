@@ -0,0 +1,210 @@
+import logging
+
+from sqlalchemy import text
+
+from libraries.utils import env
+from libraries.utils.orchestrator import copy_batch
+from libraries.classes.db_engine import DatabaseEngine
+from libraries.classes.row_batch import RowBatch
+
+logger = logging.getLogger(__name__)
+
+# Touched keys are copied into this temp table; a filtered refresh joins against it.
+KEYS_TABLE = "_reporting_refresh_keys"
+# Above this share of the (estimated) reporting table rows, a full refresh is cheaper than a keyed one.
+FULL_REFRESH_SHARE = 0.25
+
+# Materialized reporting tables in the public schema. "source" is the former view query; "filters" maps a
+# reporting column to the source expression it comes from, so a refresh can be limited to the touched keys.
+REPORTING_TABLES = {
+    "transactions_report": {
+        "key": "transaction_id",
+        "columns": [
+            "transaction_id", "full_timestamp", "days_after_signup", "date_only", "hour_only",
+            "minute_only", "cashier_id", "card_id", "cust_id", "context",
+        ],
+        "source": """
+            SELECT t.transaction_id,
+                   t."timestamp" AS full_timestamp,
+                   EXTRACT(days FROM t."timestamp" - lc.signed_up) AS days_after_signup,
+                   t."timestamp"::date AS date_only,
+                   EXTRACT(hour FROM t."timestamp") AS hour_only,
+                   EXTRACT(minute FROM t."timestamp") AS minute_only,
+                   t.cashier_id,
+                   t.card_id,
+                   lc.loyalty_id AS cust_id,
+                   t.context
+              FROM public.transactions t
+              JOIN public.cards c ON c.card_id = t.card_id
+              JOIN public.loyality_customers lc ON lc.loyalty_id = c.loyalty_id
+        """,
+        "filters": {
+            "transaction_id": "t.transaction_id",
+            "card_id": "t.card_id",
+            "cust_id": "lc.loyalty_id",
+        },
+    },
+    "loyality_customers_report": {
+        "key": "loyalty_id",
+        "columns": [
+            "loyalty_id", "name", "phone", "email", "country", "primary_station", "segmentationgroup",
+            "signed_up", "signup_year", "signup_month", "signup_date", "signup_hour", "signup_minute",
+            "perm_notify", "perm_email", "perm_sms", "perm_survey",
+            "address", "zipcode", "city", "region", "longitude", "latitude",
+        ],
+        "source": """
+            SELECT lc.loyalty_id,
+                   lc.name,
+                   lc.phone,
+                   lc.email,
+                   lc.country,
+                   lc.primary_station,
+                   lc.segmentationgroup,
+                   lc.signed_up,
+                   EXTRACT(year FROM lc.signed_up) AS signup_year,
+                   EXTRACT(month FROM lc.signed_up) AS signup_month,
+                   lc.signed_up::date AS signup_date,
+                   EXTRACT(hour FROM lc.signed_up) AS signup_hour,
+                   EXTRACT(minute FROM lc.signed_up) AS signup_minute,
+                   lc.perm_notify,
+                   lc.perm_email,
+                   lc.perm_sms,
+                   lc.perm_survey,
+                   sta.address,
+                   sta.zipcode,
+                   sta.city,
+                   CASE
+                       WHEN sta.zipcode::bigint BETWEEN 0 AND 2999 THEN 'København'
+                       WHEN sta.zipcode::bigint BETWEEN 3000 AND 3699 THEN 'Sjælland'
+                       WHEN sta.zipcode::bigint BETWEEN 3700 AND 3999 THEN 'Bornholm'
+                       WHEN sta.zipcode::bigint BETWEEN 4000 AND 4999 THEN 'Sjælland'
+                       WHEN sta.zipcode::bigint BETWEEN 5000 AND 5999 THEN 'Fyn'
+                       WHEN sta.zipcode::bigint BETWEEN 6000 AND 7999 THEN 'Sydjylland'
+                       WHEN sta.zipcode::bigint BETWEEN 8000 AND 8999 THEN 'Midtjylland'
+                       WHEN sta.zipcode::bigint BETWEEN 9000 AND 9999 THEN 'Nordjylland'
+                       ELSE 'Ukendt'
+                   END AS region,
+                   sta.longitude,
+                   sta.latitude
+              FROM public.loyality_customers lc
+              JOIN public.stations sta ON sta.pno = lc.primary_station
+             WHERE sta.enddate IS NULL AND sta.husnummer_id IS NOT NULL
+        """,
+        "filters": {
+            "loyalty_id": "lc.loyalty_id",
+            "primary_station": "lc.primary_station",
+        },
+    },
+}
+
+
+def _source_query(spec: dict, filter_column: str | None) -> str:
+    if filter_column is None:
+        return spec["source"]
+    predicate = f"{spec['filters'][filter_column]} IN (SELECT key FROM {KEYS_TABLE})"
+    joiner = "AND" if "WHERE" in spec["source"] else "WHERE"
+    return f"{spec['source'].rstrip()}\n {joiner} {predicate}"
+
+
+def _upsert_statement(table: str, spec: dict, source_query: str) -> str:
+    columns = spec["columns"]
+    update_columns = [column for column in columns if column != spec["key"]]
+    column_list = ", ".join(columns)
+    return f"""
+        INSERT INTO public.{table} AS target ({column_list})
+        SELECT {column_list} FROM ({source_query}) AS source
+        ON CONFLICT ({spec['key']}) DO UPDATE SET
+            {", ".join(f"{column} = EXCLUDED.{column}" for column in update_columns)}
+        WHERE ({", ".join(f"target.{column}" for column in update_columns)})
+              IS DISTINCT FROM ({", ".join(f"EXCLUDED.{column}" for column in update_columns)})
+    """
+
+
+def _delete_statement(table: str, spec: dict, filter_column: str | None) -> str:
+    # Rows whose source row disappeared or no longer joins (e.g. a customer whose station closed). Existence is
+    # checked against the unfiltered source, so a row that merely moved out of the filter is not dropped.
+    scope = f"target.{filter_column} IN (SELECT key FROM {KEYS_TABLE}) AND " if filter_column else ""
+    return f"""
+        DELETE FROM public.{table} AS target
+         WHERE {scope}NOT EXISTS (
+               SELECT 1 FROM ({spec['source']}) AS source
+                WHERE source.{spec['key']} = target.{spec['key']}
+         )
+    """
+
+
+"""
+Names of the reporting tables whose DDL file (table/public__<name>.sql) is among the given SQL file paths.
+"""
+
+def reporting_tables_in(sql_paths: list[str]) -> list[str]:
+    return [table for table in REPORTING_TABLES
+            if any(path.replace("\\", "/").endswith(f"/table/public__{table}.sql") for path in sql_paths)]
+
+
+"""
+Refreshes one reporting table from its source tables. With `filter_column` and `keys`, only reporting rows
+whose filter column is in `keys` are recomputed; the keys are copied into a temp table, the upsert skips rows
+that did not change and rows that no longer have a source row are deleted. Without them, while the reporting
+table is still empty, or when the keys reach FULL_REFRESH_SHARE of its estimated rows, the whole table is
+rebuilt the same way. With only_if_empty=True a table that already has rows is left alone (a backfill).
+Returns {"upserted": n, "deleted": n}, or None if the table does not exist yet.
+"""
+
+def refresh_reporting_table(table: str,
+                            filter_column: str | None = None,
+                            keys: list | None = None,
+                            only_if_empty: bool = False,
+                            db_name: str = env.POSTGRES_DB,
+                            username: str = env.POSTGRES_USERNAME,
+                            password: str = env.POSTGRES_PASSWORD,
+                            server: str = env.POSTGRES_HOST,
+                            port: int = env.POSTGRES_PORT) -> dict | None:
+    spec = REPORTING_TABLES[table]
+    if filter_column is not None and filter_column not in spec["filters"]:
+        raise ValueError(f"'{filter_column}' is not a refresh key of '{table}'.")
+    if filter_column is not None and not keys:
+        return {"upserted": 0, "deleted": 0}
+
+    if not all([username, password, server, port]):
+        env.require_postgres_env()
+    engine = DatabaseEngine(
+        db=db_name,
+        server=server or env.POSTGRES_HOST,
+        username=username or env.POSTGRES_USERNAME,
+        password=password or env.POSTGRES_PASSWORD,
+        port=port or env.POSTGRES_PORT,
+    ).get_engine()
+
+    with engine.begin() as connection:
+        if connection.execute(text("SELECT to_regclass(:name)"), {"name": f"public.{table}"}).scalar() is None:
+            logger.warning("Reporting table public.%s does not exist yet; run create_table_and_views.", table)
+            return None
+        if only_if_empty and connection.execute(text(f"SELECT EXISTS (SELECT 1 FROM public.{table})")).scalar():
+            logger.info("Reporting table public.%s already has rows; no backfill needed.", table)
+            return {"upserted": 0, "deleted": 0}
+        if filter_column is not None:
+            keys = list(dict.fromkeys(keys))
+            estimated_rows = connection.execute(text(
+                "SELECT reltuples FROM pg_class WHERE oid = to_regclass(:name)"), {"name": f"public.{table}"}).scalar()
+            if not connection.execute(text(f"SELECT EXISTS (SELECT 1 FROM public.{table})")).scalar():
+                logger.info("Reporting table public.%s is empty; running a full refresh.", table)
+                filter_column = None
+            elif estimated_rows and estimated_rows > 0 and len(keys) >= FULL_REFRESH_SHARE * estimated_rows:
+                logger.info("%s keys cover a large share of public.%s; running a full refresh.", len(keys), table)
+                filter_column = None
+        if filter_column is not None:
+            # The keys go through COPY into a temp table instead of one bound array literal per statement.
+            connection.execute(text(f"""
+                CREATE TEMP TABLE {KEYS_TABLE} ON COMMIT DROP AS
+                SELECT {filter_column} AS key FROM public.{table} WITH NO DATA
+            """))
+            copy_batch(connection, KEYS_TABLE, RowBatch({"key": keys}), ["key"])
+            connection.execute(text(f"ANALYZE {KEYS_TABLE}"))
+
+        upserted = connection.execute(text(_upsert_statement(table, spec, _source_query(spec, filter_column)))).rowcount
+        deleted = connection.execute(text(_delete_statement(table, spec, filter_column))).rowcount
+
+    logger.info("Refreshed public.%s (%s): %s upserted, %s deleted.",
+                table, f"{len(keys)} {filter_column} key(s)" if filter_column else "full", upserted, deleted)
+    return {"upserted": upserted, "deleted": deleted}
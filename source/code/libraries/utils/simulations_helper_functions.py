@@ -1,12 +1,28 @@
+from bisect import bisect
 from datetime import datetime, timedelta
-import random
+from itertools import accumulate
 import uuid
 
-def generate_electric_transaction_line(transaction: dict, products: list[dict]) -> dict:
-    product = next(p for p in products if p["product_id"] == 3)
+import numpy as np
 
-    price = round(random.uniform(3.5, 6.5), 2)
-    quantity = max(5, round(random.normalvariate(32, 8), 1))  # clamp to min 5 kWh
+from libraries.classes.simulation_context import SimulationContext
+
+# Cumulative weights are computed once instead of on every draw.
+LINE_COUNTS = [1, 2, 3, 4, 5]
+LINE_COUNT_CUM_WEIGHTS = list(accumulate([0.3, 0.3, 0.2, 0.1, 0.1]))
+LINE_QUANTITIES = range(1, 11)
+LINE_QUANTITY_CUM_WEIGHTS = list(accumulate([0.15, 0.25, 0.25, 0.15, 0.1, 0.05, 0.02, 0.015, 0.01, 0.005]))
+
+# Every draw comes from the caller's generator, so a seeded run also reproduces the line contents. Line ids
+# stay uuid.uuid4(), because ids derived from the seed would match the rows of an earlier run on upsert.
+def _weighted_pick(values, cum_weights: list[float], rng: np.random.Generator):
+    return values[bisect(cum_weights, rng.random() * cum_weights[-1])]
+
+def generate_electric_transaction_line(transaction: dict, context: SimulationContext, rng: np.random.Generator) -> dict:
+    product = context.products_by_id[3]
+
+    price = round(rng.uniform(3.5, 6.5), 2)
+    quantity = max(5, round(rng.normal(32, 8), 1))  # clamp to min 5 kWh
 
     # Simulate charge duration: assume ~1 min per 1 kWh
     duration = timedelta(minutes=int(quantity))
@@ -30,13 +46,13 @@ def generate_electric_transaction_line(transaction: dict, products: list[dict])
         }
     }
 
-def generate_gas_transaction_line(transaction: dict, products: list[dict]) -> dict:
-    product_id = random.choice([1, 2])  # 95 or Diesel
-    product = next(p for p in products if p["product_id"] == product_id)
+def generate_gas_transaction_line(transaction: dict, context: SimulationContext, rng: np.random.Generator) -> dict:
+    product_id = (1, 2)[rng.integers(2)]  # 95 or Diesel
+    product = context.products_by_id[product_id]
 
-    price = round(random.uniform(12.5, 14), 2)
+    price = round(rng.uniform(12.5, 14), 2)
     discount = 0.10  # Fixed per liter
-    quantity = max(15, round(random.normalvariate(37, 8), 1))  # clamp to min 15L
+    quantity = max(15, round(rng.normal(37, 8), 1))  # clamp to min 15L
 
     net_price = max(0, price - discount)
     total = round(quantity * net_price, 2)
@@ -56,13 +72,14 @@ def generate_gas_transaction_line(transaction: dict, products: list[dict]) -> di
 
 def generate_service_transaction_line(
     transaction: dict,
-    products: list[dict],
+    context: SimulationContext,
     customer_loyalty_id: str,
     service_counter: dict,
-    campaign_transactions: list[dict]
+    campaign_transactions: list[dict],
+    rng: np.random.Generator
 ) -> dict:
-    product_id = random.choice([5, 6])
-    product = next(p for p in products if p["product_id"] == product_id)
+    product_id = (5, 6)[rng.integers(2)]
+    product = context.products_by_id[product_id]
     price = product["price"]
     quantity = 1
     campaign_id = 8  # Car wash campaign ID
@@ -100,30 +117,27 @@ def generate_service_transaction_line(
 
 def generate_cashier_transaction_lines(
     transaction: dict,
-    products: list[dict],
+    context: SimulationContext,
     customer_loyalty_id: str,
-    campaigns: list[dict],
     campaign_counts: dict,
     campaign_reward_queue: dict,
-    campaign_transactions: list[dict]
+    campaign_transactions: list[dict],
+    rng: np.random.Generator
 ) -> list[dict]:
     lines = []
 
-    cashier_products = [p for p in products if p["type"] == "cashier"]
-    num_lines = random.choices([1, 2, 3, 4, 5], weights=[0.3, 0.3, 0.2, 0.1, 0.1])[0]
+    cashier_products = context.products_by_type["cashier"]
+    num_lines = _weighted_pick(LINE_COUNTS, LINE_COUNT_CUM_WEIGHTS, rng)
 
     for _ in range(num_lines):
-        product = random.choice(cashier_products)
+        product = cashier_products[rng.integers(len(cashier_products))]
         price = product["price"]
         product_id = product["product_id"]
 
-        quantity = random.choices(
-            population=range(1, 11),
-            weights=[0.15, 0.25, 0.25, 0.15, 0.1, 0.05, 0.02, 0.015, 0.01, 0.005]
-        )[0]
+        quantity = _weighted_pick(LINE_QUANTITIES, LINE_QUANTITY_CUM_WEIGHTS, rng)
 
         # Look for campaign tied to this product
-        campaign = next((c for c in campaigns if c["product_id"] == product_id), None)
+        campaign = context.campaigns_by_product.get(product_id)
         free_units = 0
         campaign_transaction_id = None
 
@@ -0,0 +1,173 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from libraries.utils.path_config import REPORT_DIR
+
+logger = logging.getLogger(__name__)
+_RSS_SAMPLE_SECONDS = 0.05
+_current_step = ContextVar("current_step", default=None)
+
+
+def _current_rss_bytes() -> int | None:
+    try:
+        with open("/proc/self/statm", "r") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        # ru_maxrss is the lifetime peak (KiB on Linux, bytes on macOS); the best available without /proc.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return None
+
+
+class RunFailedError(RuntimeError):
+    # Carries the report of a run that stopped on a failed step, so callers can still persist it.
+    def __init__(self, message: str, report: dict):
+        super().__init__(message)
+        self.report = report
+
+
+class StepMetrics:
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.rows_read = 0
+        self.rows_written = 0
+        self.peak_rss_bytes = None
+
+    def add(self, counter: str, rows: int) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + rows)
+
+    def sample_rss(self) -> None:
+        rss = _current_rss_bytes()
+        if rss is not None:
+            with self._lock:
+                self.peak_rss_bytes = max(self.peak_rss_bytes or 0, rss)
+
+
+def record_rows_read(rows: int) -> None:
+    metrics = _current_step.get()
+    if metrics is not None:
+        metrics.add("rows_read", rows)
+
+
+def record_rows_written(rows: int) -> None:
+    metrics = _current_step.get()
+    if metrics is not None:
+        metrics.add("rows_written", rows)
+
+
+"""
+Measures one runner step: wall time, process CPU time, peak RSS and the rows counted through record_rows_read/record_rows_written.
+Counters are bound to the current context, so helpers called from the step record into it without extra arguments;
+worker threads only contribute if they run in a copy of the step's context (contextvars.copy_context()).
+CPU time is process-wide, so it includes concurrently running steps. Yields a dict that is filled in when the step ends.
+"""
+
+@contextmanager
+def measure_step(name: str):
+    metrics = StepMetrics(name)
+    result = {"name": name, "status": "running"}
+    token = _current_step.set(metrics)
+    stop_sampling = threading.Event()
+
+    def sample() -> None:
+        while not stop_sampling.wait(_RSS_SAMPLE_SECONDS):
+            metrics.sample_rss()
+
+    sampler = threading.Thread(target=sample, name=f"rss-sampler-{name}", daemon=True)
+    metrics.sample_rss()
+    sampler.start()
+    started_wall, started_cpu = time.perf_counter(), time.process_time()
+    try:
+        yield result
+        result["status"] = "completed"
+    except BaseException as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise
+    finally:
+        wall_seconds = time.perf_counter() - started_wall
+        cpu_seconds = time.process_time() - started_cpu
+        stop_sampling.set()
+        sampler.join()
+        metrics.sample_rss()
+        _current_step.reset(token)
+        result.update({
+            "wall_seconds": round(wall_seconds, 3),
+            "cpu_seconds": round(cpu_seconds, 3),
+            "peak_rss_mb": round(metrics.peak_rss_bytes / 2**20, 1) if metrics.peak_rss_bytes else None,
+            "rows_read": metrics.rows_read,
+            "rows_written": metrics.rows_written,
+            "rows_per_second": round(metrics.rows_written / wall_seconds, 1) if wall_seconds > 0 else None,
+        })
+
+
+"""
+Writes a run report as JSON to REPORT_DIR, named after the runtime file and the run start time.
+Returns the path of the written file.
+"""
+
+def write_run_report(report: dict, runtime_json_path: str | os.PathLike, report_dir: str | os.PathLike = REPORT_DIR) -> Path:
+    report_dir = Path(report_dir)
+    report_dir.mkdir(parents=True, exist_ok=True)
+    started_at = datetime.fromisoformat(report["started_at"]).strftime("%Y%m%dT%H%M%S")
+    report_path = report_dir / f"{Path(runtime_json_path).stem}_{started_at}.json"
+    with open(report_path, "w", encoding="utf-8") as file:
+        json.dump({"runtime_file": str(runtime_json_path), **report}, file, indent=2, default=str)
+        file.write("\n")
+    return report_path
+
+
+"""
+Formats the steps of a run report as a fixed-width text table, one row per step plus a total row.
+"""
+
+def format_step_summary(report: dict) -> str:
+    headers = ("step", "status", "wall s", "cpu s", "peak rss mb", "rows read", "rows written", "rows/s")
+    rows = [
+        (step["name"], step["status"], step.get("wall_seconds"), step.get("cpu_seconds"), step.get("peak_rss_mb"),
+         step.get("rows_read"), step.get("rows_written"), step.get("rows_per_second"))
+        for step in report.get("steps", [])
+    ]
+    rows.append(("total", report.get("status", ""), report.get("wall_seconds"), report.get("cpu_seconds"),
+                 report.get("peak_rss_mb"), sum(row[5] or 0 for row in rows), sum(row[6] or 0 for row in rows), ""))
+    cells = [[("" if value is None else str(value)) for value in row] for row in [headers, *rows]]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(headers))]
+    lines = []
+    for index, row in enumerate(cells):
+        lines.append("  ".join(value.ljust(width) if i < 2 else value.rjust(width)
+                               for i, (value, width) in enumerate(zip(row, widths))))
+        if index == 0:
+            lines.append("  ".join("-" * width for width in widths))
+    if report.get("resource_scope") == "run":
+        lines.append("cpu s and peak rss mb are process-wide; with concurrent steps they are only reported for the run.")
+    return "\n".join(lines)
+
+
+"""
+Logs the step summary of a run report and writes it to REPORT_DIR (see write_run_report). Used by the service
+entry points for both completed runs and the report carried by RunFailedError. Does nothing for an empty report.
+"""
+
+def save_run_report(report: dict | None, runtime_json_path: str | os.PathLike, report_dir: str | os.PathLike = REPORT_DIR) -> Path | None:
+    if not report:
+        return None
+    logger.info("Step summary for %s:\n%s", Path(runtime_json_path).name, format_step_summary(report))
+    report_path = write_run_report(report, runtime_json_path, report_dir)
+    logger.info("Run report written to %s", report_path)
+    return report_path
@@ -0,0 +1,9 @@
+-- requires: datafordeler.dar_adressepunkt
+-- WGS84 coordinates of DAR address points, written by the dar_adressepunkt loader.
+-- The runner defers this file until the table exists, whether the table file or the loader creates it.
+ALTER TABLE "datafordeler"."dar_adressepunkt"
+    ADD COLUMN IF NOT EXISTS "longitude" double precision,
+    ADD COLUMN IF NOT EXISTS "latitude" double precision;
+ALTER TABLE "datafordeler"."dar_adressepunkt"
+    ADD COLUMN IF NOT EXISTS "geom" geometry(Point,4326) GENERATED ALWAYS AS (st_setsrid(st_makepoint(longitude, latitude), 4326)) STORED;
+CREATE INDEX IF NOT EXISTS dar_adressepunkt_geom_idx ON datafordeler.dar_adressepunkt USING gist (geom);
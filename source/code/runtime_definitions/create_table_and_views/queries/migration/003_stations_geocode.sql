@@ -0,0 +1,8 @@
+-- requires: public.stations
+-- DAR match of each station, resolved by the stations loader (libraries.classes.address_geocoder).
+-- The runner defers this file until the table exists, whether the table file or the loader creates it.
+ALTER TABLE "public"."stations"
+    ADD COLUMN IF NOT EXISTS "husnummer_id" text,
+    ADD COLUMN IF NOT EXISTS "longitude" double precision,
+    ADD COLUMN IF NOT EXISTS "latitude" double precision,
+    ADD COLUMN IF NOT EXISTS "geocode_match" text;
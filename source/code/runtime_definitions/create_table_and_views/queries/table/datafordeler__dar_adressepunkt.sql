@@ -17,5 +17,9 @@ CREATE TABLE IF NOT EXISTS "datafordeler"."dar_adressepunkt"
     "datafordeler_opdateringstid" timestamp without time zone,
     "updatetime" timestamp without time zone,
     "createdtime" timestamp without time zone,
+    "longitude" double precision,
+    "latitude" double precision,
+    "geom" geometry(Point,4326) GENERATED ALWAYS AS (st_setsrid(st_makepoint(longitude, latitude), 4326)) STORED,
     CONSTRAINT "dar_adressepunkt_pkey" PRIMARY KEY (id)
 );
+CREATE INDEX IF NOT EXISTS dar_adressepunkt_geom_idx ON datafordeler.dar_adressepunkt USING gist (geom);
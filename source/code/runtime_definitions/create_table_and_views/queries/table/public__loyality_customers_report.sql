@@ -0,0 +1,31 @@
+CREATE TABLE IF NOT EXISTS "public"."loyality_customers_report"
+(
+    "loyalty_id" text NOT NULL,
+    "name" text,
+    "phone" text,
+    "email" text,
+    "country" text,
+    "primary_station" bigint,
+    "segmentationgroup" bigint,
+    "signed_up" timestamp without time zone,
+    "signup_year" numeric,
+    "signup_month" numeric,
+    "signup_date" date,
+    "signup_hour" numeric,
+    "signup_minute" numeric,
+    "perm_notify" boolean,
+    "perm_email" boolean,
+    "perm_sms" boolean,
+    "perm_survey" boolean,
+    "address" text,
+    "zipcode" text,
+    "city" text,
+    "region" text,
+    "longitude" double precision,
+    "latitude" double precision,
+    CONSTRAINT "loyality_customers_report_pkey" PRIMARY KEY (loyalty_id)
+);
+CREATE INDEX IF NOT EXISTS loyality_customers_report_primary_station_idx ON public.loyality_customers_report USING btree (primary_station);
+CREATE INDEX IF NOT EXISTS loyality_customers_report_region_idx ON public.loyality_customers_report USING btree (region);
+CREATE INDEX IF NOT EXISTS loyality_customers_report_segmentationgroup_idx ON public.loyality_customers_report USING btree (segmentationgroup);
+CREATE INDEX IF NOT EXISTS loyality_customers_report_signup_date_idx ON public.loyality_customers_report USING btree (signup_date);
@@ -8,5 +8,9 @@ CREATE TABLE IF NOT EXISTS "public"."stations"
     "city" text,
     "startdate" text,
     "enddate" text,
+    "husnummer_id" text,
+    "longitude" double precision,
+    "latitude" double precision,
+    "geocode_match" text,
     CONSTRAINT "stations_pkey" PRIMARY KEY (pno)
 );
@@ -0,0 +1,18 @@
+CREATE TABLE IF NOT EXISTS "public"."transactions_report"
+(
+    "transaction_id" text NOT NULL,
+    "full_timestamp" timestamp without time zone,
+    "days_after_signup" numeric,
+    "date_only" date,
+    "hour_only" numeric,
+    "minute_only" numeric,
+    "cashier_id" text,
+    "card_id" text,
+    "cust_id" text,
+    "context" jsonb,
+    CONSTRAINT "transactions_report_pkey" PRIMARY KEY (transaction_id)
+);
+CREATE INDEX IF NOT EXISTS transactions_report_card_id_idx ON public.transactions_report USING btree (card_id);
+CREATE INDEX IF NOT EXISTS transactions_report_cashier_id_idx ON public.transactions_report USING btree (cashier_id);
+CREATE INDEX IF NOT EXISTS transactions_report_cust_id_idx ON public.transactions_report USING btree (cust_id);
+CREATE INDEX IF NOT EXISTS transactions_report_date_only_idx ON public.transactions_report USING btree (date_only);
@@ -16,10 +16,16 @@ RUNTIME_GROUPS = {
     "interview.json": ["interview"],
     "public.json": ["public"],
 }
+# Bookkeeping tables owned by the runners, not part of the exported model.
+EXCLUDED_TABLES = {
+    ("public", "sql_migration_ledger"),
+    ("public", "pipeline_step_state"),
+}
 
 
 def quote_ident(identifier: str) -> str:
-    return f'"{identifier.replace("\"", "\"\"")}"'
+    escaped = identifier.replace('"', '""')
+    return f'"{escaped}"'
 
 
 def schema_sql(schema_name: str) -> str:
@@ -63,87 +69,76 @@ def get_extension_owned_relations(cursor) -> set[tuple[str, str, str]]:
     return {(row[0], row[1], row[2]) for row in cursor.fetchall()}
 
 
-def get_tables(cursor, excluded_relations: set[tuple[str, str, str]]) -> list[tuple[str, str, int]]:
+def get_relations(cursor, relation_kind: str, excluded_relations: set[tuple[str, str, str]]) -> list[tuple[str, str, int]]:
     cursor.execute(
         """
         SELECT
             ns.nspname AS schema_name,
-            cls.relname AS table_name,
+            cls.relname AS relation_name,
             cls.oid
         FROM pg_class cls
         JOIN pg_namespace ns
           ON cls.relnamespace = ns.oid
-        WHERE cls.relkind = 'r'
-          AND ns.nspname NOT IN ('pg_catalog', 'information_schema')
+        WHERE cls.relkind = %s
+          AND ns.nspname = ANY(%s)
         ORDER BY ns.nspname, cls.relname
-        """
+        """,
+        (relation_kind, INCLUDED_SCHEMAS),
     )
     return [
         row
         for row in cursor.fetchall()
-        if row[0] in INCLUDED_SCHEMAS and (row[0], row[1], "r") not in excluded_relations
+        if (row[0], row[1], relation_kind) not in excluded_relations and (row[0], row[1]) not in EXCLUDED_TABLES
     ]
 
 
+def get_tables(cursor, excluded_relations: set[tuple[str, str, str]]) -> list[tuple[str, str, int]]:
+    return get_relations(cursor, "r", excluded_relations)
+
+
 def get_views(cursor, excluded_relations: set[tuple[str, str, str]]) -> list[tuple[str, str, int]]:
-    cursor.execute(
-        """
-        SELECT
-            ns.nspname AS schema_name,
-            cls.relname AS view_name,
-            cls.oid
-        FROM pg_class cls
-        JOIN pg_namespace ns
-          ON cls.relnamespace = ns.oid
-        WHERE cls.relkind = 'v'
-          AND ns.nspname NOT IN ('pg_catalog', 'information_schema')
-        ORDER BY ns.nspname, cls.relname
-        """
-    )
-    return [
-        row
-        for row in cursor.fetchall()
-        if row[0] in INCLUDED_SCHEMAS and (row[0], row[1], "v") not in excluded_relations
-    ]
+    return get_relations(cursor, "v", excluded_relations)
 
 
-def build_table_sql(cursor, table_oid: int, schema_name: str, table_name: str) -> str:
+def get_columns(cursor, table_oids: list[int]) -> dict[int, list[tuple]]:
     cursor.execute(
         """
         SELECT
+            attr.attrelid,
             attr.attname AS column_name,
             pg_catalog.format_type(attr.atttypid, attr.atttypmod) AS data_type,
             attr.attnotnull AS not_null,
-            pg_get_expr(def.adbin, def.adrelid) AS default_expr
+            pg_get_expr(def.adbin, def.adrelid) AS default_expr,
+            attr.attgenerated = 's' AS is_generated
         FROM pg_attribute attr
         LEFT JOIN pg_attrdef def
           ON attr.attrelid = def.adrelid
          AND attr.attnum = def.adnum
-        WHERE attr.attrelid = %s
+        WHERE attr.attrelid = ANY(%s::oid[])
           AND attr.attnum > 0
           AND NOT attr.attisdropped
-        ORDER BY attr.attnum
+        ORDER BY attr.attrelid, attr.attnum
         """,
-        (table_oid,),
+        (table_oids,),
     )
-    column_lines = []
-    for column_name, data_type, not_null, default_expr in cursor.fetchall():
-        parts = [f"{quote_ident(column_name)} {data_type}"]
-        if default_expr:
-            parts.append(f"DEFAULT {default_expr}")
-        if not_null:
-            parts.append("NOT NULL")
-        column_lines.append("    " + " ".join(parts))
+    columns: dict[int, list[tuple]] = defaultdict(list)
+    for table_oid, *column in cursor.fetchall():
+        columns[table_oid].append(tuple(column))
+    return columns
+
 
+def get_constraints(cursor, table_oids: list[int]) -> dict[int, list[tuple]]:
     cursor.execute(
         """
         SELECT
+            con.conrelid,
             con.conname,
             con.contype,
             pg_get_constraintdef(con.oid, true) AS constraint_definition
         FROM pg_constraint con
-        WHERE con.conrelid = %s
+        WHERE con.conrelid = ANY(%s::oid[])
         ORDER BY
+            con.conrelid,
             CASE con.contype
                 WHEN 'p' THEN 1
                 WHEN 'u' THEN 2
@@ -153,11 +148,73 @@ def build_table_sql(cursor, table_oid: int, schema_name: str, table_name: str) -
             END,
             con.conname
         """,
-        (table_oid,),
+        (table_oids,),
+    )
+    constraints: dict[int, list[tuple]] = defaultdict(list)
+    for table_oid, *constraint in cursor.fetchall():
+        constraints[table_oid].append(tuple(constraint))
+    return constraints
+
+
+def get_indexes(cursor, table_oids: list[int]) -> dict[int, list[str]]:
+    # Indexes backing a constraint are already part of the CREATE TABLE statement.
+    cursor.execute(
+        """
+        SELECT idx.indrelid, pg_get_indexdef(idx.indexrelid)
+        FROM pg_index idx
+        JOIN pg_class cls
+          ON cls.oid = idx.indexrelid
+        WHERE idx.indrelid = ANY(%s::oid[])
+          AND NOT EXISTS (
+              SELECT 1 FROM pg_constraint con WHERE con.conindid = idx.indexrelid
+          )
+        ORDER BY idx.indrelid, cls.relname
+        """,
+        (table_oids,),
+    )
+    indexes: dict[int, list[str]] = defaultdict(list)
+    for table_oid, index_definition in cursor.fetchall():
+        indexes[table_oid].append(index_definition)
+    return indexes
+
+
+def index_sql(index_definition: str) -> str:
+    for prefix in ("CREATE UNIQUE INDEX ", "CREATE INDEX "):
+        if index_definition.startswith(prefix):
+            return f"{prefix}IF NOT EXISTS {index_definition[len(prefix):]};\n"
+    return f"{index_definition};\n"
+
+
+def get_view_definitions(cursor, view_oids: list[int]) -> dict[int, str]:
+    cursor.execute(
+        """
+        SELECT view_oid, pg_get_viewdef(view_oid, true)
+        FROM unnest(%s::oid[]) AS view_oid
+        """,
+        (view_oids,),
     )
+    return dict(cursor.fetchall())
+
+
+def build_table_sql(columns: list[tuple],
+                    constraints: list[tuple],
+                    schema_name: str,
+                    table_name: str,
+                    indexes: list[str] | None = None) -> str:
+    column_lines = []
+    for column_name, data_type, not_null, default_expr, is_generated in columns:
+        parts = [f"{quote_ident(column_name)} {data_type}"]
+        if default_expr and is_generated:
+            parts.append(f"GENERATED ALWAYS AS ({default_expr}) STORED")
+        elif default_expr:
+            parts.append(f"DEFAULT {default_expr}")
+        if not_null:
+            parts.append("NOT NULL")
+        column_lines.append("    " + " ".join(parts))
+
     constraint_lines = [
         f"    CONSTRAINT {quote_ident(constraint_name)} {constraint_definition}"
-        for constraint_name, _, constraint_definition in cursor.fetchall()
+        for constraint_name, _, constraint_definition in constraints
     ]
 
     joined_lines = ",\n".join(column_lines + constraint_lines)
@@ -166,12 +223,12 @@ def build_table_sql(cursor, table_oid: int, schema_name: str, table_name: str) -
         "(\n"
         f"{joined_lines}\n"
         ");\n"
+        + "".join(index_sql(index_definition) for index_definition in indexes or [])
     )
 
 
-def build_view_sql(cursor, view_oid: int, schema_name: str, view_name: str) -> str:
-    cursor.execute("SELECT pg_get_viewdef(%s, true)", (view_oid,))
-    view_definition = cursor.fetchone()[0].strip().rstrip(";")
+def build_view_sql(view_definition: str, schema_name: str, view_name: str) -> str:
+    view_definition = view_definition.strip().rstrip(";")
     return (
         f"SET search_path TO {quote_ident(schema_name)}, public;\n"
         f"DROP VIEW IF EXISTS {quote_ident(schema_name)}.{quote_ident(view_name)};\n"
@@ -191,18 +248,23 @@ def runtime_payload(sql_queries: list[str]) -> dict:
             "port": "POSTGRES_PORT",
             "db_type": "DB_TYPE",
         },
+        "force": "SQL_FORCE",
+        "dry_run": "SQL_DRY_RUN",
         "sql_queries": sql_queries,
     }
 
 
-def write_text(path: Path, content: str) -> None:
+def write_text(path: Path, content: str) -> bool:
+    # Unchanged files are left alone so mtimes and the migration ledger checksums stay stable.
+    if path.exists() and path.read_text(encoding="utf-8") == content:
+        return False
     path.parent.mkdir(parents=True, exist_ok=True)
     path.write_text(content, encoding="utf-8")
+    return True
 
 
-def write_json(path: Path, payload: dict) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+def write_json(path: Path, payload: dict) -> bool:
+    return write_text(path, json.dumps(payload, indent=2) + "\n")
 
 
 def main() -> None:
@@ -217,27 +279,38 @@ def main() -> None:
             excluded_relations = get_extension_owned_relations(cursor)
             tables = get_tables(cursor, excluded_relations)
             views = get_views(cursor, excluded_relations)
-
-            write_text(query_root / "migration" / "001_postgis.sql", "CREATE EXTENSION IF NOT EXISTS postgis;\n")
-
-            table_files_by_schema: dict[str, list[str]] = defaultdict(list)
-            view_files_by_schema: dict[str, list[str]] = defaultdict(list)
-
-            for schema_name in INCLUDED_SCHEMAS:
-                if schema_name != "public":
-                    write_text(query_root / "schema" / f"{schema_name}.sql", schema_sql(schema_name))
-
-            for schema_name, table_name, table_oid in tables:
-                file_name = f"{schema_name}__{table_name}.sql"
-                relative_path = f"create_table_and_views/queries/table/{file_name}"
-                write_text(query_root / "table" / file_name, build_table_sql(cursor, table_oid, schema_name, table_name))
-                table_files_by_schema[schema_name].append(relative_path)
-
-            for schema_name, view_name, view_oid in views:
-                file_name = f"{schema_name}__{view_name}.sql"
-                relative_path = f"create_table_and_views/queries/view/{file_name}"
-                write_text(query_root / "view" / file_name, build_view_sql(cursor, view_oid, schema_name, view_name))
-                view_files_by_schema[schema_name].append(relative_path)
+            table_oids = [table_oid for _, _, table_oid in tables]
+            columns = get_columns(cursor, table_oids)
+            constraints = get_constraints(cursor, table_oids)
+            indexes = get_indexes(cursor, table_oids)
+            view_definitions = get_view_definitions(cursor, [view_oid for _, _, view_oid in views])
+
+    written = []
+    if write_text(query_root / "migration" / "001_postgis.sql", "CREATE EXTENSION IF NOT EXISTS postgis;\n"):
+        written.append("migration/001_postgis.sql")
+
+    table_files_by_schema: dict[str, list[str]] = defaultdict(list)
+    view_files_by_schema: dict[str, list[str]] = defaultdict(list)
+
+    for schema_name in INCLUDED_SCHEMAS:
+        if schema_name != "public":
+            if write_text(query_root / "schema" / f"{schema_name}.sql", schema_sql(schema_name)):
+                written.append(f"schema/{schema_name}.sql")
+
+    for schema_name, table_name, table_oid in tables:
+        file_name = f"{schema_name}__{table_name}.sql"
+        relative_path = f"create_table_and_views/queries/table/{file_name}"
+        table_sql = build_table_sql(columns[table_oid], constraints[table_oid], schema_name, table_name, indexes[table_oid])
+        if write_text(query_root / "table" / file_name, table_sql):
+            written.append(f"table/{file_name}")
+        table_files_by_schema[schema_name].append(relative_path)
+
+    for schema_name, view_name, view_oid in views:
+        file_name = f"{schema_name}__{view_name}.sql"
+        relative_path = f"create_table_and_views/queries/view/{file_name}"
+        if write_text(query_root / "view" / file_name, build_view_sql(view_definitions[view_oid], schema_name, view_name)):
+            written.append(f"view/{file_name}")
+        view_files_by_schema[schema_name].append(relative_path)
 
     schema_files = {
         schema_name: f"create_table_and_views/queries/schema/{schema_name}.sql"
@@ -245,8 +318,14 @@ def main() -> None:
         if schema_name != "public"
     }
 
+    # Hand-written migrations (002_... and later) are kept and run in file name order before the schema files.
+    migration_files = [
+        f"create_table_and_views/queries/migration/{path.name}"
+        for path in sorted((query_root / "migration").glob("*.sql"))
+    ]
+
     for runtime_name, schemas in RUNTIME_GROUPS.items():
-        sql_queries = ["create_table_and_views/queries/migration/001_postgis.sql"]
+        sql_queries = list(migration_files)
         for schema_name in schemas:
             if schema_name in schema_files:
                 sql_queries.append(schema_files[schema_name])
@@ -254,9 +333,12 @@ def main() -> None:
             sql_queries.extend(table_files_by_schema.get(schema_name, []))
         for schema_name in schemas:
             sql_queries.extend(view_files_by_schema.get(schema_name, []))
-        write_json(runtime_root / runtime_name, runtime_payload(sql_queries))
+        if write_json(runtime_root / runtime_name, runtime_payload(sql_queries)):
+            written.append(f"runtime/{runtime_name}")
 
-    print("[export] SQL and runtime files generated successfully.")
+    for relative_path in written:
+        print(f"[export] Updated {relative_path}")
+    print(f"[export] SQL and runtime files generated successfully ({len(written)} file(s) changed).")
 
 
 if __name__ == "__main__":
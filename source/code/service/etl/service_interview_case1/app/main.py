@@ -3,7 +3,7 @@ import logging
 import os
 from pathlib import Path
 
-from libraries.utils import runtime
+from libraries.utils import runtime, step_metrics
 
 logger = logging.getLogger(__name__)
 
@@ -26,7 +26,12 @@ def run_runner(module_path: str, runtime_json_path: Path) -> None:
     if not hasattr(module, "main"):
         raise AttributeError(f"Module {module_path} has no 'main' function")
     runtime_vars = runtime.load_runtime_vars(JSON_PATH=runtime_json_path)
-    module.main(runtime_vars)
+    try:
+        report = module.main(runtime_vars)
+    except step_metrics.RunFailedError as e:
+        step_metrics.save_run_report(e.report, runtime_json_path)
+        raise
+    step_metrics.save_run_report(report, runtime_json_path)
     logger.info("Completed runtime file %s", runtime_json_path.name)
 
 
@@ -0,0 +1,48 @@
+from libraries.classes.address_geocoder import AddressGeocoder, normalize_address, street_part, trigrams
+
+ROWS = [
+    {"husnummer_id": "a1", "adresse": "Vesterbrogade 1", "postnr": "1620", "longitude": 12.56, "latitude": 55.67},
+    {"husnummer_id": "a2", "adresse": "Vesterbrogade 10", "postnr": 1620, "longitude": 12.55, "latitude": 55.67},
+    {"husnummer_id": "a3", "adresse": "Nørregade 5", "postnr": 8000, "longitude": 10.21, "latitude": 56.15},
+    {"husnummer_id": "a4", "adresse": "Nørregade 5", "postnr": 8000, "longitude": 0.0, "latitude": 0.0},
+    {"husnummer_id": "a5", "adresse": "Uden postnummer 1", "postnr": None, "longitude": 0.0, "latitude": 0.0},
+]
+
+
+def test_normalization_helpers():
+    assert normalize_address("  VESTERBROGADE,  1. ") == "vesterbrogade 1"
+    assert normalize_address(None) == ""
+    assert street_part("Vesterbrogade 1-3") == "Vesterbrogade 1"
+    assert trigrams("ab") == {"  a", " ab", "ab "}
+
+
+def test_exact_match_ignores_case_punctuation_and_house_number_ranges():
+    geocoder = AddressGeocoder(ROWS)
+    result = geocoder.geocode("vesterbrogade 1-3", "1620")
+    assert result["husnummer_id"] == "a1"
+    assert (result["match"], result["similarity"]) == ("exact", 1.0)
+
+
+def test_first_row_wins_and_rows_without_postcode_are_skipped():
+    geocoder = AddressGeocoder(ROWS)
+    assert len(geocoder) == 3
+    assert geocoder.geocode("Nørregade 5", 8000)["husnummer_id"] == "a3"
+
+
+def test_fuzzy_match_within_the_same_postcode():
+    geocoder = AddressGeocoder(ROWS)
+    result = geocoder.geocode("Vestrebrogade 10", "1620")
+    assert result["husnummer_id"] == "a2"
+    assert result["match"] == "fuzzy" and 0.5 <= result["similarity"] < 1.0
+    assert geocoder.geocode("Vesterbrogade 10", "8000") is None
+    assert geocoder.geocode("Helt anden vej 99", "1620") is None
+    assert geocoder.geocode("Vesterbrogade 1", "ukendt") is None
+
+
+def test_results_are_copies_and_lookups_are_cached():
+    geocoder = AddressGeocoder(ROWS)
+    first = geocoder.geocode_many([("Vesterbrogade 1", 1620), ("Vesterbrogade 1", 1620)])
+    first[0]["husnummer_id"] = "changed"
+    assert first[1]["husnummer_id"] == "a1"
+    assert geocoder.geocode("Vesterbrogade 1", 1620)["husnummer_id"] == "a1"
+    assert geocoder.cache_info().hits >= 2
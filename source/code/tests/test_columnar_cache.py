@@ -0,0 +1,71 @@
+import json
+import os
+
+from libraries.classes.columnar_cache import ColumnarCache
+from libraries.classes.row_batch import RowBatch
+from libraries.utils import orchestrator
+
+COLUMNS = {
+    "text": ["æøå", None, "", "tab\tand\nnewline"],
+    "int": [1, None, -2**63, 2**63 - 1],
+    "big": [1, 2**70, None, 3],
+    "float": [1.5, None, -0.0, 1e300],
+    "bool": [True, False, None, True],
+    "null": [None, None, None, None],
+    "mixed": [1, "1", None, 1.5],
+    "json": [{"a": [1, None]}, [{"b": "c"}], None, {}],
+}
+
+
+def _cache(tmp_path, digest="d1", projection=None):
+    return ColumnarCache(tmp_path, source_name="DAR_Adresse_1.json", source_digest=digest,
+                         projection=projection or {name: name for name in COLUMNS})
+
+
+def test_round_trip_keeps_values_types_and_nulls(tmp_path):
+    batches = [RowBatch(COLUMNS), RowBatch({name: values[:1] for name, values in COLUMNS.items()})]
+    cache = _cache(tmp_path)
+    assert [batch.records() for batch in cache.write(iter(batches))] == [batch.records() for batch in batches]
+    read_back = list(cache.read())
+    assert [len(batch) for batch in read_back] == [4, 1]
+    for name, values in COLUMNS.items():
+        assert read_back[0].column(name) == values
+        assert [type(value) for value in read_back[0].column(name)] == [type(value) for value in values]
+
+
+def test_entry_is_only_visible_after_the_input_is_exhausted(tmp_path):
+    cache = _cache(tmp_path)
+    writer = cache.write(iter([RowBatch({"text": ["a"]}), RowBatch({"text": ["b"]})]))
+    next(writer)
+    assert not cache.exists()
+    list(writer)
+    assert cache.exists()
+
+
+def test_a_new_source_digest_replaces_the_old_entry(tmp_path):
+    list(_cache(tmp_path, "d1").write(iter([RowBatch({"text": ["old"]})])))
+    other_projection = _cache(tmp_path, "d1", {"text": "renamed"})
+    list(other_projection.write(iter([RowBatch({"renamed": ["kept"]})])))
+    list(_cache(tmp_path, "d2").write(iter([RowBatch({"text": ["new"]})])))
+    assert not _cache(tmp_path, "d1").exists()
+    assert other_projection.exists()
+    assert [batch.column("text") for batch in _cache(tmp_path, "d2").read()] == [["new"]]
+
+
+def test_projected_batches_read_back_from_the_landing_cache(tmp_path, monkeypatch):
+    source_dir, cache_dir = tmp_path / "json", tmp_path / "cache"
+    source_dir.mkdir()
+    records = [{"id": i, "navn": f"vej {i}", "extra": i} for i in range(7)]
+    (source_dir / "DAR_Vej_1.json").write_text(json.dumps(records), encoding="utf-8")
+    projection = {"id": "id", "navn": "name"}
+
+    def load():
+        return [batch.select(["id", "name"]).records()
+                for batch in orchestrator.iter_projected_batches(os.fspath(source_dir), "DAR_Vej_1.json", projection,
+                                                                 batch_size=3, cache_dir=cache_dir)]
+
+    first = load()
+    monkeypatch.setattr(orchestrator, "iter_json_records", lambda *args, **kwargs: (_ for _ in ()).throw(AssertionError))
+    assert load() == first
+    assert [len(batch) for batch in first] == [3, 3, 1]
+    assert first[0][1] == {"id": 1, "name": "vej 1"}
@@ -0,0 +1,51 @@
+import math
+
+import numpy as np
+
+from libraries.utils.coordinates import parse_wkt_points, utm32_to_wgs84, wkt_utm32_to_lon_lat
+
+_A = 6378137.0
+_F = 1 / 298.257223563
+
+
+def _wgs84_to_utm32(longitude, latitude):
+    # Forward transverse Mercator (Krüger series, Karney 2011), written independently of the module under test.
+    n = _F / (2 - _F)
+    e = math.sqrt(_F * (2 - _F))
+    radius = _A / (1 + n) * (1 + n**2 / 4 + n**4 / 64)
+    alpha = (n / 2 - 2 * n**2 / 3 + 5 * n**3 / 16 + 41 * n**4 / 180,
+             13 * n**2 / 48 - 3 * n**3 / 5 + 557 * n**4 / 1440,
+             61 * n**3 / 240 - 103 * n**4 / 140,
+             49561 * n**4 / 161280)
+    phi, lam = math.radians(latitude), math.radians(longitude - 9.0)
+    t = math.sinh(math.atanh(math.sin(phi)) - e * math.atanh(e * math.sin(phi)))
+    xi_prime, eta_prime = math.atan2(t, math.cos(lam)), math.atanh(math.sin(lam) / math.sqrt(1 + t * t))
+    xi = xi_prime + sum(a * math.sin(2 * j * xi_prime) * math.cosh(2 * j * eta_prime) for j, a in enumerate(alpha, 1))
+    eta = eta_prime + sum(a * math.cos(2 * j * xi_prime) * math.sinh(2 * j * eta_prime) for j, a in enumerate(alpha, 1))
+    return 500000.0 + 0.9996 * radius * eta, 0.9996 * radius * xi
+
+
+def test_central_meridian_at_the_equator():
+    longitude, latitude = utm32_to_wgs84(np.array([500000.0]), np.array([0.0]))
+    assert np.allclose(longitude, 9.0) and np.allclose(latitude, 0.0)
+
+
+def test_round_trip_across_denmark():
+    # Skagen, Copenhagen, Bornholm (outside zone 32, still within the series accuracy) and Tønder.
+    points = [(10.5917, 57.7209), (12.5683, 55.6761), (14.9167, 55.1000), (8.8631, 54.9331)]
+    eastings, northings = zip(*(_wgs84_to_utm32(lon, lat) for lon, lat in points))
+    longitude, latitude = utm32_to_wgs84(np.array(eastings), np.array(northings))
+    assert np.allclose(longitude, [lon for lon, _ in points], atol=1e-8)
+    assert np.allclose(latitude, [lat for _, lat in points], atol=1e-8)
+
+
+def test_parse_wkt_points_marks_unparsable_values_as_nan():
+    x, y = parse_wkt_points(["POINT(725025.18 6166264.33)", " point (1 2)", None, "", "LINESTRING(0 0, 1 1)", "POINT(a b)"])
+    assert x[:2].tolist() == [725025.18, 1.0] and y[:2].tolist() == [6166264.33, 2.0]
+    assert np.isnan(x[2:]).all() and np.isnan(y[2:]).all()
+
+
+def test_wkt_utm32_to_lon_lat_returns_none_for_missing_points():
+    longitude, latitude = wkt_utm32_to_lon_lat(["POINT(725025.18 6166264.33)", None])
+    assert 12 < longitude[0] < 13 and 55 < latitude[0] < 56
+    assert longitude[1] is None and latitude[1] is None
@@ -0,0 +1,48 @@
+from libraries.runners.create_table_and_views_from_sql import (missing_tables, needs_autocommit, required_tables,
+                                                               split_sql_statements)
+
+
+def test_split_sql_statements_skips_quotes_comments_and_dollar_bodies():
+    sql_text = """
+        -- a comment; with a semicolon
+        CREATE TABLE "a;b" (note text DEFAULT 'x;''y');
+        /* block; comment */
+        DO $$ BEGIN PERFORM 1; END $$;
+        CREATE FUNCTION f() RETURNS int AS $body$ SELECT 1; $body$ LANGUAGE sql
+    """
+    statements = split_sql_statements(sql_text)
+    assert len(statements) == 3
+    assert statements[0] == """CREATE TABLE "a;b" (note text DEFAULT 'x;''y')"""
+    assert statements[1] == "DO $$ BEGIN PERFORM 1; END $$"
+    assert statements[2].endswith("$body$ SELECT 1; $body$ LANGUAGE sql")
+
+
+def test_needs_autocommit_detects_non_transactional_statements():
+    assert needs_autocommit(split_sql_statements(
+        "CREATE TABLE t (id int);\n-- build online\ncreate unique index concurrently t_idx ON t (id);"))
+    assert needs_autocommit(["VACUUM ANALYZE public.transactions"])
+    assert needs_autocommit(["REINDEX (VERBOSE) TABLE CONCURRENTLY public.transactions"])
+    assert not needs_autocommit(split_sql_statements(
+        "CREATE INDEX IF NOT EXISTS t_idx ON t (id); COMMENT ON TABLE t IS 'VACUUM daily'"))
+
+
+def test_required_tables_reads_the_header_lines():
+    sql_text = "-- requires: datafordeler.dar_adressepunkt, public.stations\n-- Requires: public.cards\nALTER TABLE x;"
+    assert required_tables(sql_text) == ["datafordeler.dar_adressepunkt", "public.stations", "public.cards"]
+    assert required_tables("-- WGS84 coordinates; requires nothing\nSELECT 1;") == []
+
+
+class _RegclassCursor:
+    def __init__(self, existing):
+        self.existing = existing
+
+    def execute(self, statement, params):
+        self.result = params[0] if params[0] in self.existing else None
+
+    def fetchone(self):
+        return (self.result,)
+
+
+def test_missing_tables_lists_tables_without_a_regclass():
+    cursor = _RegclassCursor({"public.stations"})
+    assert missing_tables(cursor, ["datafordeler.dar_adressepunkt", "public.stations"]) == ["datafordeler.dar_adressepunkt"]
@@ -0,0 +1,190 @@
+import io
+import json
+import os
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from libraries.scripts.api import dataformidler_download_files as downloader
+
+
+def _zip_bytes():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("DAR_Postnummer.json", json.dumps([{"postnr": n} for n in range(500)]))
+    return buffer.getvalue()
+
+
+PAYLOAD = _zip_bytes()
+ETAG = '"v2"'
+LAST_MODIFIED = "Sat, 17 Oct 2026 08:00:00 GMT"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Serves PAYLOAD with Range/If-Range/If-None-Match handling like the Datafordeler file endpoint.
+    requests_seen = []
+    # Body of a 416 answer; servers commonly send a short error page with its Content-Length.
+    body_416 = b""
+
+    def do_GET(self):
+        self.requests_seen.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_header and if_range in (None, ETAG, LAST_MODIFIED):
+            start = int(range_header.removeprefix("bytes=").rstrip("-"))
+            if start >= len(PAYLOAD):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(PAYLOAD)}")
+                self.send_header("Content-Length", str(len(self.body_416)))
+                self.end_headers()
+                self.wfile.write(self.body_416)
+                return
+            body = PAYLOAD[start:]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(PAYLOAD) - 1}/{len(PAYLOAD)}")
+        else:
+            body = PAYLOAD
+            self.send_response(200)
+        self.send_header("ETag", ETAG)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    _Handler.requests_seen = []
+    _Handler.body_416 = b""
+    monkeypatch.setattr(downloader, "DATAFORDELER_BASE_URL", f"http://127.0.0.1:{httpd.server_port}")
+    monkeypatch.setattr(downloader, "require_datafordeler_env", lambda: None)
+    yield _Handler
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _fetch(zip_path, **kwargs):
+    return downloader.fetch_zip("Postnummer", "DAR", "current", str(zip_path), retries=0, delay=0, **kwargs)
+
+
+def _leave_partial(zip_path, content, validators=None):
+    with open(f"{zip_path}.part", "wb") as file:
+        file.write(content)
+    if validators is not None:
+        with open(f"{zip_path}.part.json", "w", encoding="utf-8") as file:
+            json.dump(validators, file)
+
+
+def test_fresh_download_returns_validators(server, tmp_path):
+    zip_path = tmp_path / "DAR_Postnummer_current"
+    assert _fetch(zip_path) == {"etag": ETAG, "last_modified": LAST_MODIFIED}
+    assert zip_path.read_bytes() == PAYLOAD
+    assert not os.path.exists(f"{zip_path}.part.json")
+
+
+def test_leftover_part_resumes_with_if_range(server, tmp_path):
+    zip_path = tmp_path / "DAR_Postnummer_current"
+    _leave_partial(zip_path, PAYLOAD[:100], {"etag": ETAG, "last_modified": LAST_MODIFIED})
+    assert _fetch(zip_path)["etag"] == ETAG
+    assert server.requests_seen[0]["Range"] == "bytes=100-"
+    assert server.requests_seen[0]["If-Range"] == ETAG
+    assert zip_path.read_bytes() == PAYLOAD
+    assert not os.path.exists(f"{zip_path}.part.json")
+
+
+def test_changed_file_restarts_with_200(server, tmp_path):
+    zip_path = tmp_path / "DAR_Postnummer_current"
+    _leave_partial(zip_path, b"stale bytes of an older archive", {"etag": '"v1"', "last_modified": None})
+    assert _fetch(zip_path) == {"etag": ETAG, "last_modified": LAST_MODIFIED}
+    assert server.requests_seen[0]["If-Range"] == '"v1"'
+    assert zip_path.read_bytes() == PAYLOAD
+
+
+def test_part_without_validators_is_downloaded_again(server, tmp_path):
+    zip_path = tmp_path / "DAR_Postnummer_current"
+    _leave_partial(zip_path, PAYLOAD[:100])
+    _fetch(zip_path)
+    assert "Range" not in server.requests_seen[0]
+    assert zip_path.read_bytes() == PAYLOAD
+
+
+def test_not_modified_returns_none(server, tmp_path):
+    zip_path = tmp_path / "DAR_Postnummer_current"
+    assert _fetch(zip_path, conditional_headers={"If-None-Match": ETAG}) is None
+    assert not zip_path.exists()
+
+
+def test_complete_part_is_accepted_on_416(server, tmp_path):
+    zip_path = tmp_path / "DAR_Postnummer_current"
+    _leave_partial(zip_path, PAYLOAD, {"etag": ETAG, "last_modified": LAST_MODIFIED})
+    assert _fetch(zip_path)["etag"] == ETAG
+    assert len(server.requests_seen) == 1
+    assert zip_path.read_bytes() == PAYLOAD
+
+
+def test_complete_part_is_accepted_on_416_with_a_body(server, tmp_path):
+    server.body_416 = b"<html>Requested Range Not Satisfiable</html>"
+    zip_path = tmp_path / "DAR_Postnummer_current"
+    _leave_partial(zip_path, PAYLOAD, {"etag": ETAG, "last_modified": LAST_MODIFIED})
+    assert _fetch(zip_path)["etag"] == ETAG
+    assert len(server.requests_seen) == 1
+    assert zip_path.read_bytes() == PAYLOAD
+
+
+def test_oversized_part_is_restarted_on_416(server, tmp_path):
+    zip_path = tmp_path / "DAR_Postnummer_current"
+    _leave_partial(zip_path, PAYLOAD + b"trailing bytes", {"etag": ETAG, "last_modified": LAST_MODIFIED})
+    assert _fetch(zip_path)["etag"] == ETAG
+    assert len(server.requests_seen) == 2
+    assert "Range" not in server.requests_seen[1]
+    assert zip_path.read_bytes() == PAYLOAD
+
+
+def test_manifest_entry_makes_the_next_download_conditional(server, tmp_path):
+    entry = downloader.download_and_unzip("Postnummer", "DAR", "current", tmp_path)
+    assert entry["status"] == "downloaded" and entry["etag"] == ETAG
+    assert list(entry["files"]) == ["DAR_Postnummer_1.json"]
+    json_path = tmp_path / "DAR_Postnummer_1.json"
+    modified = json_path.stat().st_mtime_ns
+
+    again = downloader.download_and_unzip("Postnummer", "DAR", "current", tmp_path, manifest_entry=entry)
+    assert again["status"] == "unchanged" and again["files"] == entry["files"]
+    assert server.requests_seen[-1]["If-None-Match"] == ETAG
+    assert json_path.stat().st_mtime_ns == modified
+
+
+def test_manifest_entry_is_ignored_when_its_files_are_gone(server, tmp_path):
+    entry = downloader.download_and_unzip("Postnummer", "DAR", "current", tmp_path)
+    (tmp_path / "DAR_Postnummer_1.json").unlink()
+    again = downloader.download_and_unzip("Postnummer", "DAR", "current", tmp_path, manifest_entry=entry)
+    assert again["status"] == "downloaded"
+    assert "If-None-Match" not in server.requests_seen[-1]
+
+
+def test_archive_is_kept_without_extraction(server, tmp_path):
+    (tmp_path / "DAR_Postnummer_1.json").write_text("[]", encoding="utf-8")
+    entry = downloader.download_and_unzip("Postnummer", "DAR", "current", tmp_path, extract=False)
+    assert list(entry["files"]) == ["DAR_Postnummer.zip"] and entry["extracted"] is False
+    assert (tmp_path / "DAR_Postnummer.zip").read_bytes() == PAYLOAD
+    assert not (tmp_path / "DAR_Postnummer_1.json").exists()
+
+
+def test_unreadable_manifest_is_ignored(tmp_path):
+    manifest_path = tmp_path / downloader.MANIFEST_FILENAME
+    assert downloader.load_manifest(str(manifest_path)) == {}
+    manifest_path.write_text("{not json", encoding="utf-8")
+    assert downloader.load_manifest(str(manifest_path)) == {}
+    downloader.save_manifest(str(manifest_path), {"DAR_Postnummer_current": {"etag": ETAG}})
+    assert downloader.load_manifest(str(manifest_path)) == {"DAR_Postnummer_current": {"etag": ETAG}}
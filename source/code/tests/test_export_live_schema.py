@@ -0,0 +1,70 @@
+import importlib.util
+from pathlib import Path
+
+EXPORT_PATH = (Path(__file__).resolve().parents[1]
+               / "service" / "etl" / "service_create_table_views_from_sql" / "app" / "export_live_schema.py")
+_spec = importlib.util.spec_from_file_location("export_live_schema", EXPORT_PATH)
+export = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(export)
+
+
+class _CatalogCursor:
+    # Answers every catalog query with the given rows and records the parameters.
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    def execute(self, statement, params=None):
+        self.executed.append(params)
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_columns_of_all_tables_come_from_one_query():
+    cursor = _CatalogCursor([(11, "id", "text", True, None, False),
+                             (12, "pno", "integer", True, None, False),
+                             (11, "name", "text", False, "'x'::text", False)])
+    columns = export.get_columns(cursor, [11, 12])
+    assert cursor.executed == [([11, 12],)]
+    assert [column[0] for column in columns[11]] == ["id", "name"]
+    assert columns[12] == [("pno", "integer", True, None, False)]
+    assert export.get_columns(_CatalogCursor([]), [13])[13] == []
+
+
+def test_get_relations_leaves_out_runner_bookkeeping_and_extension_tables():
+    cursor = _CatalogCursor([("public", "stations", 1), ("public", "sql_migration_ledger", 2),
+                             ("public", "pipeline_step_state", 3), ("public", "spatial_ref_sys", 4)])
+    tables = export.get_tables(cursor, {("public", "spatial_ref_sys", "r")})
+    assert tables == [("public", "stations", 1)]
+    assert cursor.executed == [("r", export.INCLUDED_SCHEMAS)]
+
+
+def test_build_table_sql_writes_generated_columns_constraints_and_indexes():
+    sql = export.build_table_sql(
+        [("id", "text", True, None, False),
+         ("geom", "geometry(Point,4326)", False, "st_makepoint(longitude, latitude)", True),
+         ("status", "text", False, "'active'::text", False)],
+        [("dar_adressepunkt_pkey", "p", "PRIMARY KEY (id)")],
+        "datafordeler", "dar_adressepunkt",
+        ["CREATE INDEX dar_adressepunkt_geom_idx ON datafordeler.dar_adressepunkt USING gist (geom)"])
+    assert sql == (
+        'CREATE TABLE IF NOT EXISTS "datafordeler"."dar_adressepunkt"\n'
+        "(\n"
+        '    "id" text NOT NULL,\n'
+        '    "geom" geometry(Point,4326) GENERATED ALWAYS AS (st_makepoint(longitude, latitude)) STORED,\n'
+        '    "status" text DEFAULT \'active\'::text,\n'
+        '    CONSTRAINT "dar_adressepunkt_pkey" PRIMARY KEY (id)\n'
+        ");\n"
+        "CREATE INDEX IF NOT EXISTS dar_adressepunkt_geom_idx ON datafordeler.dar_adressepunkt USING gist (geom);\n"
+    )
+
+
+def test_write_text_leaves_unchanged_files_alone(tmp_path):
+    path = tmp_path / "table" / "public__stations.sql"
+    assert export.write_text(path, "CREATE TABLE x ();\n")
+    modified = path.stat().st_mtime_ns
+    assert not export.write_text(path, "CREATE TABLE x ();\n")
+    assert path.stat().st_mtime_ns == modified
+    assert export.write_json(tmp_path / "all.json", {"sql_queries": []})
+    assert (tmp_path / "all.json").read_text(encoding="utf-8") == '{\n  "sql_queries": []\n}\n'
@@ -0,0 +1,28 @@
+import hashlib
+import os
+
+from libraries.utils import file_digest as digests
+
+
+def test_cached_file_digest_rehashes_only_after_a_change(tmp_path, monkeypatch):
+    source = tmp_path / "DAR_Adresse.zip"
+    source.write_bytes(b"x" * (digests.HASH_READ_BYTES + 10))
+    index_path = tmp_path / "cache" / digests.DIGEST_INDEX_FILE
+    reads = []
+    monkeypatch.setattr(digests, "file_digest", lambda path: reads.append(path) or hashlib.sha256(open(path, "rb").read()).hexdigest())
+
+    expected = hashlib.sha256(source.read_bytes()).hexdigest()
+    assert digests.cached_file_digest(source, index_path) == expected
+    assert digests.cached_file_digest(source, index_path) == expected
+    assert len(reads) == 1
+
+    source.write_bytes(b"y" * 10)
+    assert digests.cached_file_digest(source, index_path) == hashlib.sha256(b"y" * 10).hexdigest()
+    assert len(reads) == 2
+
+
+def test_file_digest_streams_in_blocks(tmp_path):
+    source = tmp_path / "big.json"
+    payload = os.urandom(2 * digests.HASH_READ_BYTES + 3)
+    source.write_bytes(payload)
+    assert digests.file_digest(source) == hashlib.sha256(payload).hexdigest()
@@ -0,0 +1,95 @@
+import threading
+from datetime import date
+
+import pytest
+
+from libraries.runners import module_sequence
+from libraries.runners.module_sequence import build_step_graph, run_resumable_step, run_step_graph, step_result
+
+
+def _step(name, *depends_on):
+    return {"name": name, "module": f"libraries.scripts.upserts.{name}", "depends_on": list(depends_on)}
+
+
+def test_build_step_graph_returns_dependencies():
+    graph = build_step_graph([_step("a"), _step("b", "a"), _step("c", "a", "b")])
+    assert graph == {"a": [], "b": ["a"], "c": ["a", "b"]}
+
+
+def test_build_step_graph_detects_cycles():
+    with pytest.raises(ValueError, match=r"cycle involving: \['b', 'c', 'd', 'e'\]"):
+        build_step_graph([_step("a"), _step("b", "a", "d"), _step("c", "b"), _step("d", "c"), _step("e", "d")])
+    with pytest.raises(ValueError, match="cycle"):
+        build_step_graph([_step("a", "a")])
+
+
+def test_build_step_graph_rejects_unknown_and_duplicate_steps():
+    with pytest.raises(ValueError, match="unknown step"):
+        build_step_graph([_step("a", "missing")])
+    with pytest.raises(ValueError, match="Duplicate step name"):
+        build_step_graph([_step("a"), _step("a")])
+
+
+def test_run_step_graph_respects_dependencies_and_stops_after_a_failure():
+    finished, lock = [], threading.Lock()
+
+    def execute(module_config):
+        if module_config["name"] == "b":
+            raise RuntimeError("b failed")
+        with lock:
+            finished.append(module_config["name"])
+
+    modules = [_step("a"), _step("b", "a"), _step("c", "a"), _step("d", "b")]
+    with pytest.raises(RuntimeError, match="b failed"):
+        run_step_graph(modules, max_workers=2, execute=execute)
+    assert finished[0] == "a"
+    assert "d" not in finished
+
+
+class _StateStore:
+    # In-memory stand-in for StepStateStore.
+    def __init__(self):
+        self.completed = {}
+
+    def table_markers(self, tables):
+        return {}
+
+    def is_completed(self, name, fingerprint):
+        return self.completed.get(name) == fingerprint
+
+    def completed_result(self, name):
+        return None
+
+    def invalidate(self, name):
+        self.completed.pop(name, None)
+
+    def mark_completed(self, name, module, fingerprint, step_report):
+        self.completed[name] = fingerprint
+
+
+def test_steps_with_resume_false_always_run_and_rerun_their_dependents(monkeypatch):
+    runs = []
+    monkeypatch.setattr(module_sequence, "run_step", lambda module_config, step_reports: runs.append(module_config["name"]) or {})
+    state = _StateStore()
+    products = {"name": "products", "module": "libraries.scripts.upserts.simu_products"}
+    cashiers = {"name": "cashiers", "module": "libraries.scripts.upserts.simu_cashier", "resume": False}
+    transactions = {"name": "transactions", "module": "libraries.scripts.upserts.simu_transactions"}
+    for _ in range(2):
+        fingerprints = {}
+        run_resumable_step(products, [], state, fingerprints, [])
+        run_resumable_step(cashiers, [], state, fingerprints, [])
+        run_resumable_step(transactions, ["cashiers"], state, fingerprints, [])
+    assert runs == ["products", "cashiers", "transactions", "cashiers", "transactions"]
+
+
+def test_step_result_keeps_small_json_summaries_only(monkeypatch):
+    assert step_result({"DAR_Adresse": "downloaded", "DAR_Vej": "unchanged"}) == {
+        "DAR_Adresse": "downloaded", "DAR_Vej": "unchanged"}
+    assert step_result({"checked": date(2026, 10, 17)}) == {"checked": "2026-10-17"}
+    assert step_result([{"id": 1}]) is None
+    assert step_result(None) is None
+    circular = {}
+    circular["self"] = circular
+    assert step_result(circular) is None
+    monkeypatch.setattr(module_sequence, "STEP_RESULT_MAX_CHARS", 20)
+    assert step_result({"rows": list(range(100))}) is None
@@ -0,0 +1,325 @@
+import io
+import json
+import zipfile
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+from sqlalchemy import JSON, Column, MetaData, Table, Text, create_engine, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.exc import OperationalError
+
+from libraries.classes.row_batch import RowBatch
+from libraries.utils import orchestrator
+from libraries.utils.orchestrator import _iter_json_array
+
+
+RECORDS = [
+    {"id": 1, "name": "Vesterbrogade 1-3", "tags": ["a", "b"], "nested": {"x": None}},
+    1.5,
+    -0.25e-3,
+    12345678901234567890,
+    True,
+    None,
+    "tekst med æøå og \"citat\"",
+    [],
+    {},
+]
+
+
+@pytest.mark.parametrize("chunk_chars", [1, 2, 3, 5, 7, 64])
+def test_iter_json_array_across_chunk_boundaries(monkeypatch, chunk_chars):
+    monkeypatch.setattr(orchestrator, "_JSON_READ_CHARS", chunk_chars)
+    text = json.dumps(RECORDS, indent=1, ensure_ascii=False)
+    assert list(_iter_json_array(io.StringIO(text))) == RECORDS
+
+
+@pytest.mark.parametrize("text, expected", [("[1.5]", [1.5]), ("[1.5e-3,2]", [1.5e-3, 2]), ("[ ]", []), ("[10]", [10])])
+def test_iter_json_array_numbers_in_three_char_chunks(monkeypatch, text, expected):
+    monkeypatch.setattr(orchestrator, "_JSON_READ_CHARS", 3)
+    assert list(_iter_json_array(io.StringIO(text))) == expected
+
+
+@pytest.mark.parametrize("text", ['{"id": 1}', "[1, 2", "[1; 2]"])
+def test_iter_json_array_rejects_malformed_input(monkeypatch, text):
+    monkeypatch.setattr(orchestrator, "_JSON_READ_CHARS", 2)
+    with pytest.raises(ValueError):
+        list(_iter_json_array(io.StringIO(text)))
+
+
+def test_copy_text_column_escapes_text_format():
+    assert orchestrator._copy_text_column(["a\tb", "line\nbreak\r", "back\\slash", None]) == [
+        "a\\tb", "line\\nbreak\\r", "back\\\\slash", "\\N"]
+
+
+def test_copy_text_column_encodes_typed_values():
+    values = [True, False, 7, 1.25, date(2026, 1, 2), datetime(2026, 1, 2, 3, 4, 5), None]
+    assert orchestrator._copy_text_column(values) == [
+        "t", "f", "7", "1.25", "2026-01-02", "2026-01-02T03:04:05", "\\N"]
+
+
+def test_copy_text_column_encodes_arrays():
+    assert orchestrator._copy_text_column([["a", None, 'q"uote', ["x"], True]]) == [
+        '{"a",NULL,"q\\\\"uote",{"x"},t}']
+
+
+class _CopyCursor:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def copy_expert(self, statement, buffer):
+        self.calls.append((statement, buffer.read()))
+
+    def close(self):
+        pass
+
+
+class _CopyConnection:
+    # Stands in for the DBAPI connection behind a SQLAlchemy connection.
+    def __init__(self):
+        self.calls = []
+        self.connection = self
+
+    def cursor(self):
+        return _CopyCursor(self.calls)
+
+
+def test_copy_batch_streams_buffers_of_copy_rows(monkeypatch):
+    monkeypatch.setattr(orchestrator, "_COPY_BUFFER_ROWS", 2)
+    connection = _CopyConnection()
+    batch = RowBatch({"id": [1, 2, 3], "name": ["a", None, "c\td"], "unused": [0, 0, 0]})
+    orchestrator.copy_batch(connection, "_staging", batch, ["id", "name"])
+    assert connection.calls == [
+        ("COPY _staging (id, name) FROM STDIN", "1\ta\n2\t\\N\n"),
+        ("COPY _staging (id, name) FROM STDIN", "3\tc\\td\n"),
+    ]
+
+
+def test_weighted_choice_rows_never_draws_zero_weights():
+    weights = np.array([[0.0, 1.0, 0.0, 3.0, 0.0, 0.0], [2.0, 0.0, 0.0, 0.0, 0.0, 0.0]])
+    rows = np.array([0, 1] * 5000)
+    choices = orchestrator.weighted_choice_rows(weights, rows, np.random.default_rng(7))
+    assert set(choices[rows == 0].tolist()) == {1, 3}
+    assert set(choices[rows == 1].tolist()) == {0}
+
+
+def test_weighted_choice_rows_follows_the_weights_per_row():
+    weights = np.array([[1.0, 1.0, 2.0], [0.0, 9.0, 1.0]])
+    rows = np.repeat([0, 1], 40000)
+    choices = orchestrator.weighted_choice_rows(weights, rows, np.random.default_rng(11))
+    for row, row_weights in enumerate(weights):
+        shares = np.bincount(choices[rows == row], minlength=3) / np.count_nonzero(rows == row)
+        assert np.allclose(shares, row_weights / row_weights.sum(), atol=0.01)
+
+
+CREDENTIALS = {"username": "reporting", "password": "secret", "server": "localhost", "port": 5432}
+
+
+class _SqliteDatabase:
+    # Stands in for DatabaseEngine; every instance hands out the engine of the test's SQLite file.
+    engine = None
+
+    def __init__(self, **kwargs):
+        pass
+
+    def get_engine(self):
+        return self.engine
+
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    _SqliteDatabase.engine = create_engine(f"sqlite:///{tmp_path / 'reporting.db'}")
+    monkeypatch.setattr(orchestrator, "DatabaseEngine", _SqliteDatabase)
+    yield _SqliteDatabase.engine
+    _SqliteDatabase.engine.dispose()
+
+
+def _create_stations(engine, count=5):
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE stations (pno integer PRIMARY KEY, name text)"))
+        connection.execute(text("INSERT INTO stations VALUES (:pno, :name)"),
+                           [{"pno": pno, "name": f"station {pno}"} for pno in range(count)])
+
+
+def test_iter_data_from_db_yields_batches_of_itersize(sqlite_db):
+    _create_stations(sqlite_db)
+    batches = list(orchestrator.iter_data_from_db("reporting", "SELECT pno, name FROM stations ORDER BY pno",
+                                                  db_type="sqlite", itersize=2, **CREDENTIALS))
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert batches[0][1] == {"pno": 1, "name": "station 1"}
+
+
+def test_iter_data_from_db_retries_before_the_first_batch(sqlite_db, monkeypatch):
+    delays = []
+
+    def create_table_and_wait(delay):
+        delays.append(delay)
+        _create_stations(sqlite_db, count=1)
+
+    monkeypatch.setattr(orchestrator, "sleep", create_table_and_wait)
+    batches = list(orchestrator.iter_data_from_db("reporting", "SELECT pno FROM stations",
+                                                  db_type="sqlite", retries=1, delay=3, **CREDENTIALS))
+    assert delays == [3] and batches == [[{"pno": 0}]]
+
+
+def test_iter_data_from_db_does_not_retry_after_a_batch_was_yielded(sqlite_db, monkeypatch):
+    _create_stations(sqlite_db, count=6)
+    monkeypatch.setattr(orchestrator, "sleep", lambda delay: pytest.fail("retried after rows were yielded"))
+    # Fails with "integer overflow" once the cursor reaches pno 4.
+    query = "SELECT CASE WHEN pno < 4 THEN pno ELSE abs(-9223372036854775807 - 1) END AS pno FROM stations"
+    batches = orchestrator.iter_data_from_db("reporting", query, db_type="sqlite", itersize=2, **CREDENTIALS)
+    assert next(batches) == [{"pno": 0}, {"pno": 1}]
+    with pytest.raises(OperationalError, match="integer overflow"):
+        list(batches)
+
+
+def test_format_result_records_columns_and_dataframe():
+    rows = [(1, "a", 1.5), (2, None, 2.5)]
+    columns = ["pno", "name", "price"]
+    assert orchestrator._format_result(rows, columns, "records") == [
+        {"pno": 1, "name": "a", "price": 1.5}, {"pno": 2, "name": None, "price": 2.5}]
+    result = orchestrator._format_result(rows, columns, "columns")
+    assert result["pno"].dtype == np.int64 and result["price"].tolist() == [1.5, 2.5]
+    assert result["name"].dtype == object and result["name"].tolist() == ["a", None]
+    frame = orchestrator._format_result(rows, columns, "dataframe")
+    assert list(frame.columns) == columns and frame["pno"].tolist() == [1, 2]
+
+
+def test_format_result_keeps_array_values_one_object_per_row():
+    rows = [([8, 17], 1), ([7, 12], 2)]
+    peak_hours = orchestrator._format_result(rows, ["peak_hours", "id"], "columns")["peak_hours"]
+    assert peak_hours.shape == (2,) and peak_hours.dtype == object and peak_hours[0] == [8, 17]
+    ragged = orchestrator._format_result([([8, 17],), ([7],)], ["peak_hours"], "columns")["peak_hours"]
+    assert ragged.shape == (2,) and ragged[1] == [7]
+
+
+def test_format_result_columns_of_an_empty_result():
+    result = orchestrator._format_result([], ["pno", "name"], "columns")
+    assert list(result) == ["pno", "name"] and all(len(values) == 0 for values in result.values())
+    assert orchestrator._format_result([], ["pno"], "dataframe").columns.tolist() == ["pno"]
+
+
+def test_get_data_from_db_result_formats(sqlite_db):
+    _create_stations(sqlite_db, count=3)
+    query = "SELECT pno, name FROM stations ORDER BY pno"
+    columns = orchestrator.get_data_from_db("reporting", query, db_type="sqlite", result_format="columns", **CREDENTIALS)
+    assert columns["pno"].tolist() == [0, 1, 2]
+    with pytest.raises(ValueError, match="result_format"):
+        orchestrator.get_data_from_db("reporting", query, db_type="sqlite", result_format="arrow", **CREDENTIALS)
+
+
+class _SettingsConnection:
+    # Records the statements _statement_timeout sends.
+    def __init__(self):
+        self.statements = []
+        self.invalidated = False
+
+    def execute(self, statement):
+        self.statements.append(str(statement))
+
+
+def test_statement_timeout_is_transaction_local_on_postgresql():
+    connection = _SettingsConnection()
+    with orchestrator._statement_timeout(connection, "postgresql", 2.5):
+        pass
+    assert connection.statements == ["SET LOCAL statement_timeout = 2500"]
+
+
+def test_statement_timeout_is_reset_on_mysql_even_after_an_error():
+    connection = _SettingsConnection()
+    with pytest.raises(RuntimeError):
+        with orchestrator._statement_timeout(connection, "mysql", 3):
+            raise RuntimeError("query failed")
+    assert connection.statements == ["SET SESSION max_execution_time = 3000",
+                                      "SET SESSION max_execution_time = DEFAULT"]
+
+
+def test_statement_timeout_without_a_timeout_or_support():
+    connection = _SettingsConnection()
+    with orchestrator._statement_timeout(connection, "mssql", None):
+        pass
+    assert connection.statements == []
+    with pytest.raises(ValueError, match="not supported"):
+        with orchestrator._statement_timeout(connection, "mssql", 5):
+            pass
+
+
+def test_is_statement_timeout_recognizes_postgresql_and_mysql_codes():
+    postgres_cancel = type("QueryCanceled", (Exception,), {"pgcode": "57014"})()
+    assert orchestrator._is_statement_timeout(OperationalError("SELECT 1", {}, postgres_cancel))
+    assert orchestrator._is_statement_timeout(OperationalError("SELECT 1", {}, Exception(3024, "timeout")))
+    assert not orchestrator._is_statement_timeout(OperationalError("SELECT 1", {}, Exception(2013, "lost")))
+
+
+def test_build_conflict_clause_without_and_with_a_change_guard():
+    assert orchestrator._build_conflict_clause(["id"], [], []) == "ON CONFLICT (id) DO NOTHING"
+    clause = orchestrator._build_conflict_clause(["id", "kind"], ["name", "createdtime"], ["createdtime"])
+    assert clause == "ON CONFLICT (id, kind) DO UPDATE SET name = EXCLUDED.name"
+    guarded = orchestrator._build_conflict_clause(["id"], ["name", "payload"], [],
+                                                  [("target.name", "EXCLUDED.name"),
+                                                   ("target.payload::jsonb", "EXCLUDED.payload::jsonb")])
+    assert guarded == ("ON CONFLICT (id) DO UPDATE SET name = EXCLUDED.name, payload = EXCLUDED.payload"
+                       " WHERE (target.name, target.payload::jsonb) IS DISTINCT FROM (EXCLUDED.name, EXCLUDED.payload::jsonb)")
+
+
+def test_change_compare_expressions_skip_ignored_fields_and_cast_json():
+    table = Table("stations", MetaData(), Column("id", Text, primary_key=True), Column("name", Text),
+                  Column("payload", JSON), Column("context", JSONB), Column("updatetime", Text),
+                  Column("createdtime", Text))
+    expressions = orchestrator._change_compare_expressions(
+        table, ["name", "payload", "context", "updatetime", "createdtime"], ["createdtime"], ["updatetime"])
+    assert expressions == [("target.name", "EXCLUDED.name"),
+                           ("target.payload::jsonb", "EXCLUDED.payload::jsonb"),
+                           ("target.context", "EXCLUDED.context")]
+
+
+def test_merge_statement_counts_inserts_and_updates_only_when_asked():
+    insert = "INSERT INTO public.stations AS target (id) VALUES (:id_1) ON CONFLICT (id) DO NOTHING"
+    assert orchestrator._merge_statement(insert, False) == insert
+    merged = orchestrator._merge_statement(insert, True)
+    assert f"WITH merged AS ({insert} RETURNING (xmax = 0) AS inserted)" in merged
+    assert "count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted)" in merged
+
+
+def test_add_chunk_result_sums_change_counts():
+    report = {"rows_written": 0}
+    orchestrator._add_chunk_result(report, {"rows": 3, "inserted": 1, "updated": 1, "unchanged": 1})
+    orchestrator._add_chunk_result(report, {"rows": 2, "inserted": 0, "updated": 0, "unchanged": 2})
+    assert report == {"rows_written": 5, "inserted": 1, "updated": 1, "unchanged": 3}
+
+
+def _write_archive(folder, stem, members):
+    with zipfile.ZipFile(folder / f"{stem}.zip", "w") as archive:
+        for name, records in members.items():
+            archive.writestr(name, json.dumps(records, ensure_ascii=False))
+
+
+def test_json_members_are_read_straight_from_the_archive(tmp_path):
+    _write_archive(tmp_path, "DAR_Vej", {"readme.txt": [], "a.json": [{"navn": "Ågade"}], "b.json": [{"navn": "Bøgevej"}]})
+    with orchestrator.open_json_source(str(tmp_path), "DAR_Vej_2.json") as file:
+        assert json.load(file) == [{"navn": "Bøgevej"}]
+    assert list(orchestrator.iter_json_records(str(tmp_path), "DAR_Vej_1.json")) == [{"navn": "Ågade"}]
+    assert orchestrator.load_json_file(str(tmp_path), "DAR_Vej_1.json") == [{"navn": "Ågade"}]
+    assert not any(path.suffix == ".json" for path in tmp_path.iterdir())
+
+
+def test_an_extracted_file_takes_precedence_over_the_archive(tmp_path):
+    _write_archive(tmp_path, "DAR_Vej", {"a.json": [{"navn": "archive"}]})
+    (tmp_path / "DAR_Vej_1.json").write_text(json.dumps([{"navn": "extracted"}]), encoding="utf-8")
+    assert list(orchestrator.iter_json_records(str(tmp_path), "DAR_Vej_1.json")) == [{"navn": "extracted"}]
+
+
+def test_missing_archive_members_raise(tmp_path):
+    _write_archive(tmp_path, "DAR_Vej", {"a.json": []})
+    with pytest.raises(FileNotFoundError, match="no JSON member #2"):
+        list(orchestrator.iter_json_records(str(tmp_path), "DAR_Vej_2.json"))
+    with pytest.raises(FileNotFoundError):
+        list(orchestrator.iter_json_records(str(tmp_path), "DAR_Husnummer_1.json"))
+
+
+def test_archive_source_digest_depends_on_the_member(tmp_path):
+    _write_archive(tmp_path, "DAR_Vej", {"a.json": [1], "b.json": [2]})
+    index_path = str(tmp_path / "file_digests.json")
+    first = orchestrator._json_source_digest(str(tmp_path), "DAR_Vej_1.json", index_path)
+    assert first == orchestrator._json_source_digest(str(tmp_path), "DAR_Vej_1.json", index_path)
+    assert first != orchestrator._json_source_digest(str(tmp_path), "DAR_Vej_2.json", index_path)
@@ -0,0 +1,56 @@
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, text
+
+from libraries.classes.reflection_cache import ReflectionCache
+
+
+class _SchemaEngine:
+    # Answers the information_schema lookup from a set of schema names and counts the queries.
+    def __init__(self, schemas):
+        self.schemas = schemas
+        self.queries = 0
+
+    @contextmanager
+    def connect(self):
+        yield self
+
+    def execute(self, statement, params):
+        self.queries += 1
+        found = params["schema"] in self.schemas
+        return type("Result", (), {"fetchone": lambda _: ("schema",) if found else None})()
+
+
+def test_has_schema_caches_hits_but_not_misses():
+    engine = _SchemaEngine(set())
+    assert not ReflectionCache.has_schema(engine, "datafordeler")
+    engine.schemas.add("datafordeler")  # created by a parallel step
+    assert ReflectionCache.has_schema(engine, "datafordeler")
+    assert ReflectionCache.has_schema(engine, "datafordeler")
+    assert engine.queries == 2
+    ReflectionCache.invalidate(engine=engine)
+    assert ReflectionCache.has_schema(engine, "datafordeler") and engine.queries == 3
+
+
+
+def test_get_table_is_cached_until_the_table_is_invalidated():
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE stations (pno integer PRIMARY KEY)"))
+    first = ReflectionCache.get_table(engine, "main", "stations")
+    with engine.begin() as connection:
+        connection.execute(text("ALTER TABLE stations ADD COLUMN region text"))
+    assert ReflectionCache.get_table(engine, "main", "stations") is first
+    ReflectionCache.invalidate(engine=engine, schema="main", table="other")
+    assert ReflectionCache.get_table(engine, "main", "stations") is first
+    ReflectionCache.invalidate(engine=engine, schema="main", table="stations")
+    assert "region" in ReflectionCache.get_table(engine, "main", "stations").columns
+
+
+def test_table_invalidation_keeps_the_schema_entry():
+    engine = _SchemaEngine({"datafordeler"})
+    assert ReflectionCache.has_schema(engine, "datafordeler")
+    ReflectionCache.invalidate(engine=engine, schema="datafordeler", table="dar_adresse")
+    assert ReflectionCache.has_schema(engine, "datafordeler") and engine.queries == 1
+    ReflectionCache.invalidate(engine=engine, schema="datafordeler")
+    assert ReflectionCache.has_schema(engine, "datafordeler") and engine.queries == 2
@@ -0,0 +1,55 @@
+import math
+
+import pytest
+
+from libraries.classes.row_batch import RowBatch
+
+
+def test_from_records_projects_renames_and_skips_non_dicts():
+    batch = RowBatch.from_records([{"id": 1, "navn": "a", "x": 0}, None, {"id": 2}], {"id": "id", "navn": "name"})
+    assert len(batch) == 2
+    assert batch.keys() == ["id", "name"]
+    assert batch.records() == [{"id": 1, "name": "a"}, {"id": 2, "name": None}]
+
+
+def test_from_records_without_projection_keeps_first_record_keys():
+    assert RowBatch.from_records([{"a": 1, "b": 2}]).keys() == ["a", "b"]
+    assert len(RowBatch.from_records([])) == 0
+
+
+def test_columns_must_have_equal_length():
+    with pytest.raises(ValueError):
+        RowBatch({"a": [1, 2], "b": [1]})
+
+
+def test_slicing_and_missing_columns():
+    batch = RowBatch({"a": [1, 2, 3]})
+    part = batch[1:]
+    assert len(part) == 2
+    assert part.column("a") == [2, 3]
+    assert part.column("missing") == [None, None]
+    assert len(batch[5:]) == 0
+    with pytest.raises(TypeError):
+        batch[0]
+
+
+def test_with_constant_select_and_rows():
+    batch = RowBatch({"a": [1, 2]}).with_constant("updatetime", "t").with_column("b", iter("xy"))
+    assert batch.select(["b", "a"]).records() == [{"b": "x", "a": 1}, {"b": "y", "a": 2}]
+    assert list(batch.rows(["updatetime"])) == [("t",), ("t",)]
+
+
+def test_sort_by_puts_none_last():
+    batch = RowBatch({"key": [3, None, 1], "value": ["c", "n", "a"]}).sort_by(["key"])
+    assert batch.column("value") == ["a", "c", "n"]
+
+
+def test_normalized_encodes_json_and_clears_missing_values():
+    batch = RowBatch({
+        "plain": ["a", None],
+        "json": [{"k": 1}, [{"k": 2}]],
+        "float": [1.5, math.nan],
+    }).normalized()
+    assert batch.column("plain") == ["a", None]
+    assert batch.column("json") == ['{"k": 1}', '[{"k": 2}]']
+    assert batch.column("float") == [1.5, None]
@@ -0,0 +1,47 @@
+import numpy as np
+
+from libraries.classes.simulation_context import SimulationContext
+
+CASHIERS = [
+    {"cashier_id": "c1", "pno": 20, "type": "gas"},
+    {"cashier_id": "c2", "pno": 20, "type": "gas"},
+    {"cashier_id": "c3", "pno": 20, "type": "cashier"},
+    {"cashier_id": "c4", "pno": 10, "type": "electric"},
+]
+STATIONS = [{"pno": 10, "region": "Hovedstaden"}, {"pno": 20, "region": "Hovedstaden"}, {"pno": 30, "region": "Sjælland"}]
+PRODUCTS = [{"product_id": 1, "type": "gas"}, {"product_id": 10, "type": "cashier"}, {"product_id": 11, "type": "cashier"}]
+CAMPAIGNS = [{"id": 1, "product_id": 10}, {"id": 2, "product_id": 10}]
+CARDS = [{"loyalty_id": "L1", "card_id": "k1"}, {"loyalty_id": "L1", "card_id": "k2"}, {"loyalty_id": "L2", "card_id": "k3"}]
+
+
+def _context(cashiers=CASHIERS):
+    return SimulationContext(cards=CARDS, cashiers=cashiers, stations=STATIONS, products=PRODUCTS, campaigns=CAMPAIGNS)
+
+
+def test_dict_indexes():
+    context = _context()
+    assert context.card_ids_by_loyalty_id["L1"] == ["k1", "k2"]
+    assert [cashier["cashier_id"] for cashier in context.cashiers_by_station_type[(20, "gas")]] == ["c1", "c2"]
+    assert context.station_pnos_by_region["Hovedstaden"] == [10, 20]
+    assert [product["product_id"] for product in context.products_by_type["cashier"]] == [10, 11]
+    assert context.campaigns_by_product[10]["id"] == 1
+    assert context.region_pnos["Sjælland"].tolist() == [30]
+
+
+def test_cashier_groups_map_station_and_type_to_their_cashier_ids():
+    context = _context()
+    gas, cashier = context.cashier_type_position("gas"), context.cashier_type_position("cashier")
+    groups = context.cashier_groups(np.array([20, 20, 10]), np.array([gas, cashier, gas]))
+    assert groups[2] == -1
+    for group, expected in zip(groups[:2], (["c1", "c2"], ["c3"])):
+        start, size = context.cashier_group_starts[group], context.cashier_group_sizes[group]
+        assert context.cashier_group_ids[start:start + size].tolist() == expected
+
+
+def test_cashier_groups_for_unknown_stations_and_types():
+    context = _context()
+    assert context.cashier_type_position("service") == -1
+    groups = context.cashier_groups(np.array([5, 30, 99, 20]), np.array([0, 0, 0, context.cashier_type_position("service")]))
+    assert groups.tolist() == [-1, -1, -1, -1]
+    empty = _context(cashiers=[])
+    assert empty.cashier_groups(np.array([10, 20]), np.array([0, 0])).tolist() == [-1, -1]
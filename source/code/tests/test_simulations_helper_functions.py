@@ -0,0 +1,57 @@
+import uuid
+
+import numpy as np
+
+from libraries.classes.simulation_context import SimulationContext
+from libraries.scripts.simulations.transactions import _uuid4_strings
+from libraries.utils import simulations_helper_functions as helpers
+
+PRODUCTS = [
+    {"product_id": 1, "name": "95", "type": "gas", "price": 13.0},
+    {"product_id": 2, "name": "Diesel", "type": "gas", "price": 12.0},
+    {"product_id": 3, "name": "El", "type": "electric", "price": 4.0},
+    {"product_id": 5, "name": "Vask", "type": "service", "price": 99.0},
+    {"product_id": 6, "name": "Vask plus", "type": "service", "price": 149.0},
+    {"product_id": 10, "name": "Kaffe", "type": "cashier", "price": 25.0},
+    {"product_id": 11, "name": "Pølse", "type": "cashier", "price": 30.0},
+]
+CAMPAIGNS = [{"id": 1, "product_id": 10, "number": 3}]
+TRANSACTION = {"transaction_id": "t1", "timestamp": "2026-10-17T08:30:00"}
+
+
+def _lines(seed):
+    context = SimulationContext(cards=[], cashiers=[], stations=[], products=PRODUCTS, campaigns=CAMPAIGNS)
+    rng = np.random.default_rng(seed)
+    counts, queue, campaign_transactions = {}, {}, []
+    lines = [helpers.generate_gas_transaction_line(TRANSACTION, context, rng),
+             helpers.generate_electric_transaction_line(TRANSACTION, context, rng),
+             helpers.generate_service_transaction_line(TRANSACTION, context, "L1", {}, campaign_transactions, rng)]
+    for _ in range(20):
+        lines += helpers.generate_cashier_transaction_lines(TRANSACTION, context, "L1", counts, queue,
+                                                            campaign_transactions, rng)
+    return lines, campaign_transactions
+
+
+def test_the_same_seed_gives_the_same_contents_under_new_ids():
+    (first, first_campaigns), (second, second_campaigns) = _lines(3), _lines(3)
+    assert first_campaigns and len(first_campaigns) == len(second_campaigns)
+
+    def contents(lines):
+        return [{key: value for key, value in line.items() if key not in ("id", "campaign_transaction_id")}
+                for line in lines]
+
+    assert contents(first) == contents(second)
+    assert not {line["id"] for line in first} & {line["id"] for line in second}
+    assert contents(_lines(4)[0]) != contents(first)
+
+
+def test_line_values_are_plain_python_types():
+    for line in _lines(5)[0]:
+        assert type(line["product_id"]) is int and type(line["quantity"]) in (int, float)
+        assert type(line["price"]) is float
+
+
+def test_uuid4_strings_are_version_4_and_not_repeated():
+    first, second = _uuid4_strings(1000), _uuid4_strings(1000)
+    assert all(uuid.UUID(value).version == 4 and str(uuid.UUID(value)) == value for value in first)
+    assert len(set(first) | set(second)) == 2000
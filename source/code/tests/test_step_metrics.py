@@ -0,0 +1,67 @@
+import contextvars
+import json
+import threading
+
+import pytest
+
+from libraries.utils.step_metrics import (format_step_summary, measure_step, record_rows_read, record_rows_written,
+                                          save_run_report)
+
+
+def test_measure_step_counts_rows_recorded_in_its_context():
+    with measure_step("load") as report:
+        record_rows_read(10)
+        record_rows_written(4)
+        context = contextvars.copy_context()
+        worker = threading.Thread(target=context.run, args=(record_rows_written, 3))
+        worker.start()
+        worker.join()
+        # A thread started without the step's context does not count.
+        outsider = threading.Thread(target=record_rows_written, args=(100,))
+        outsider.start()
+        outsider.join()
+    assert report["status"] == "completed"
+    assert (report["rows_read"], report["rows_written"]) == (10, 7)
+    assert report["wall_seconds"] >= 0 and report["cpu_seconds"] >= 0
+    record_rows_written(5)
+    assert report["rows_written"] == 7
+
+
+def test_measure_step_reports_a_failed_step():
+    with pytest.raises(ValueError):
+        with measure_step("load") as report:
+            record_rows_written(2)
+            raise ValueError("bad file")
+    assert (report["status"], report["error"], report["rows_written"]) == ("failed", "bad file", 2)
+
+
+def _report(resource_scope):
+    return {
+        "started_at": "2026-10-17T08:00:00",
+        "status": "completed",
+        "wall_seconds": 3.0,
+        "cpu_seconds": 2.0,
+        "peak_rss_mb": 120.0,
+        "resource_scope": resource_scope,
+        "steps": [
+            {"name": "DAR Adresse", "status": "completed", "wall_seconds": 2.0, "cpu_seconds": None,
+             "peak_rss_mb": None, "rows_read": 10, "rows_written": 8, "rows_per_second": 4.0},
+            {"name": "DAR Vej", "status": "skipped"},
+        ],
+    }
+
+
+def test_format_step_summary_totals_rows_and_notes_the_run_scope():
+    lines = format_step_summary(_report("run")).splitlines()
+    assert lines[0].split()[:2] == ["step", "status"]
+    assert lines[-2].split() == ["total", "completed", "3.0", "2.0", "120.0", "10", "8"]
+    assert lines[-1].startswith("cpu s and peak rss mb are process-wide")
+    assert "process-wide" not in format_step_summary(_report("step"))
+
+
+def test_save_run_report_writes_json_named_after_the_runtime_file(tmp_path):
+    assert save_run_report(None, "runtime/all.json", tmp_path) is None
+    report_path = save_run_report(_report("step"), "runtime/all.json", tmp_path)
+    assert report_path.name == "all_20261017T080000.json"
+    saved = json.loads(report_path.read_text(encoding="utf-8"))
+    assert saved["runtime_file"] == "runtime/all.json" and saved["steps"][1]["status"] == "skipped"